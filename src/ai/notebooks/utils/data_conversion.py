@@ -1,7 +1,13 @@
 import os
 import glob
 import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
 import cv2
+import numpy as np
+from tqdm import tqdm
 
 
 def prepare_detection_dataset(annotation_dir="../data/synthetic_data/detection/full_annotation", 
@@ -66,74 +72,134 @@ def prepare_detection_dataset(annotation_dir="../data/synthetic_data/detection/f
     print(f"Processed annotations written to {output_file}")
 
 
+def crop_quad(img, points, rotate_vertical=True):
+    """
+    Cut a (possibly rotated) quadrilateral out of an image and warp it to an upright rectangle.
+    
+    Args:
+        img (np.ndarray): Source image
+        points (list): Four [x, y] corners, clockwise from top-left
+        rotate_vertical (bool): Turn crops at least 1.5 times taller than wide to horizontal
+    """
+    quad = np.asarray(points, dtype=np.float32)
+    width = int(max(np.linalg.norm(quad[0] - quad[1]), np.linalg.norm(quad[3] - quad[2])))
+    height = int(max(np.linalg.norm(quad[0] - quad[3]), np.linalg.norm(quad[1] - quad[2])))
+    target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+    crop = cv2.warpPerspective(img, cv2.getPerspectiveTransform(quad, target), (width, height),
+                               flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+    if rotate_vertical and height >= 1.5 * width:
+        crop = np.rot90(crop)
+    return crop
+
+
+def _bbox_to_points(bbox):
+    x1, y1, x2, y2 = bbox
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def _init_crop_worker():
+    # Parallelism comes from the worker processes; OpenCV's own threads would oversubscribe the CPU
+    cv2.setNumThreads(0)
+
+
+def _crop_samples(samples, images_dir, jpeg_quality):
+    """Decode, crop and save the samples of one task; returns their recognition annotation lines"""
+    lines = []
+    for idx, detection_img_path, crops in samples:
+        img = cv2.imread(detection_img_path)
+        if img is None:
+            print(f"Could not read image: {detection_img_path}")
+            continue
+        for suffix, points, text in crops:
+            output_img_name = f'seq_{idx:07d}{suffix}.jpg'
+            cv2.imwrite(os.path.join(images_dir, output_img_name), crop_quad(img, points),
+                        [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            lines.append(f"images/{output_img_name}\t{text}\n")
+    return lines
+
+
+def _iter_crop_samples(detection_annotations_path, annotation_dir, include_groups):
+    """Lazily turn detection annotation lines into (index, image path, [(suffix, points, text)])"""
+    root = os.path.dirname(detection_annotations_path)
+    with open(detection_annotations_path, 'r') as f:
+        for idx, line in enumerate(f, 1):
+            parts = line.strip().split('\t')
+            if len(parts) != 2:
+                continue
+            img_path = parts[0]
+            annotation = json.loads(parts[1])[0]
+            
+            # Ensure it's a 16-digit number
+            transcription = annotation['transcription']
+            if len(transcription) != 16 or not transcription.isdigit():
+                continue
+            crops = [('', annotation['points'], transcription)]
+            
+            # Digit groups come from the generator's full annotation of the same card
+            if include_groups:
+                base_name = os.path.basename(img_path).replace("_full.png", "")
+                full_annotation_path = os.path.join(annotation_dir, f"{base_name}_annotations.json")
+                if os.path.exists(full_annotation_path):
+                    with open(full_annotation_path, 'r') as fa:
+                        number_parts = json.load(fa).get('number_parts', [])
+                    crops += [(f'_g{k}', _bbox_to_points(part['bbox']), part['text'])
+                              for k, part in enumerate(number_parts) if part['text'].isdigit()]
+            
+            yield idx, os.path.join(root, img_path), crops
+
+
 def prepare_recognition_dataset(detection_annotations_path="../data/synthetic_data/detection/paddle_ocr_det_annotations.txt", 
                                 output_dir="../data/synthetic_data/recognition", 
-                                output_annotations_path="../data/synthetic_data/recognition/paddle_ocr_req_annotations.txt"):
+                                output_annotations_path="../data/synthetic_data/recognition/paddle_ocr_req_annotations.txt",
+                                annotation_dir="../data/synthetic_data/detection/full_annotation",
+                                include_groups=True,
+                                num_workers=None,
+                                chunk_size=64,
+                                jpeg_quality=95):
     """
     Prepare a recognition dataset from detection annotations by cropping card number regions.
     
+    Annotation lines are read lazily and cropped in worker processes, with a bounded number of
+    tasks in flight, so memory stays flat however large the corpus is. Number boxes are
+    perspective-warped from their four points, so rotated quads come out upright.
+    
     Args:
         detection_annotations_path (str): Path to the detection annotations file
         output_dir (str): Directory to save cropped images
         output_annotations_path (str): Path to save recognition annotations
+        annotation_dir (str): Generator's full annotations, used for the digit group crops
+        include_groups (bool): Also crop every digit group from `number_parts`
+        num_workers (int): Worker processes (default: CPU count)
+        chunk_size (int): Annotation lines per worker task
+        jpeg_quality (int): Quality of the saved crops
     """
     # Create output directories
     images_dir = os.path.join(output_dir, 'images')
     os.makedirs(images_dir, exist_ok=True)
     
-    # Read annotations
-    with open(detection_annotations_path, 'r') as f:
-        annotations = f.readlines()
-
-    # Process each annotation
-    train_annotations = []
+    num_workers = num_workers or os.cpu_count() or 1
+    max_in_flight = num_workers * 4
+    samples = _iter_crop_samples(detection_annotations_path, annotation_dir, include_groups)
+    pending = deque()
     processed_count = 0
     
-    for idx, line in enumerate(annotations, 1):
-        # Parse the line
-        parts = line.strip().split('\t')
-        if len(parts) != 2:
-            continue
-            
-        img_path = parts[0]
-        detection_img_path = os.path.join(os.path.dirname(detection_annotations_path), img_path)
-        annotation = json.loads(parts[1])[0]
-        
-        # Read the image
-        img = cv2.imread(detection_img_path)
-        if img is None:
-            print(f"Could not read image: {detection_img_path}")
-            continue
-        
-        # Get coordinates
-        points = annotation['points']
-        x1, y1 = points[0]
-        x2, y2 = points[1]
-        x3, y3 = points[2]
-        x4, y4 = points[3]
-        
-        # Get the transcription
-        transcription = annotation['transcription']
-        
-        # Ensure it's a 16-digit number
-        if len(transcription) != 16 or not transcription.isdigit():
-            continue
-        
-        # Crop the region
-        cropped = img[int(y1):int(y3), int(x1):int(x2)]
-        
-        # Save cropped image
-        output_img_name = f'seq_{idx:03d}.jpg'
-        output_img_path = os.path.join(images_dir, output_img_name)
-        cv2.imwrite(output_img_path, cropped)
-        
-        # Add to training annotations
-        train_annotations.append(f"images/{output_img_name}\t{transcription}\n")
-        processed_count += 1
-
-    # Save training annotations
-    with open(output_annotations_path, 'w', encoding='utf-8') as f:
-        f.writelines(train_annotations)
+    with open(output_annotations_path, 'w', encoding='utf-8') as out_file, \
+            ProcessPoolExecutor(num_workers, initializer=_init_crop_worker) as executor, \
+            tqdm(desc="Cropping", unit="image") as progress:
+        while True:
+            # Keep a bounded window of tasks, writing results in input order
+            while len(pending) < max_in_flight:
+                chunk = list(islice(samples, chunk_size))
+                if not chunk:
+                    break
+                pending.append((len(chunk), executor.submit(_crop_samples, chunk, images_dir, jpeg_quality)))
+            if not pending:
+                break
+            chunk_length, future = pending.popleft()
+            lines = future.result()
+            out_file.writelines(lines)
+            processed_count += len(lines)
+            progress.update(chunk_length)
 
-    print(f"Processed {processed_count} images")
+    print(f"Processed {processed_count} crops")
     return processed_count
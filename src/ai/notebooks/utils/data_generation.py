@@ -1,11 +1,20 @@
 import os
 import random
 import json
-from typing import List, Tuple
+import re
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Set, Tuple
 from faker import Faker
 from PIL import Image, ImageDraw, ImageFont
 
 
+# IIN prefix ranges (inclusive) of the brands issuing 16-digit numbers: Visa, Mastercard, Mir, JCB, Discover and
+# UnionPay, as the backend's postprocessing.BRANDS detects them. Other first digits would make numbers of other
+# lengths (e.g. 34/37 is 15-digit Amex) that the service rejects, so labels could never be matched.
+IIN_RANGES_16 = ((4, 4), (51, 55), (2221, 2720), (2200, 2204), (3528, 3589), (6011, 6011), (644, 649), (65, 65), (62, 62))
+
+
 class CreditCardGenerator:
     def __init__(self, 
                  background_dir: str = "../backgrounds",
@@ -33,21 +42,45 @@ class CreditCardGenerator:
         # Standard card size
         self.card_size = (850, 540)
         
+        # Background file names in a stable order, so seeded picks are reproducible
+        self.background_files = sorted(os.listdir(background_dir))
+        
+        # Backgrounds resized to the card size and fonts by (path, size), loaded once per generator
+        self._backgrounds: Dict[str, Image.Image] = {}
+        self._fonts: Dict[Tuple[str, int], ImageFont.FreeTypeFont] = {}
+        
     def _load_fonts(self, font_dir: str) -> List[str]:
         """Load all .ttf fonts from directory"""
         return [os.path.join(font_dir, f) for f in os.listdir(font_dir) 
                 if f.endswith('.ttf')]
     
+    def _get_font(self, font_path: str, size: int) -> ImageFont.FreeTypeFont:
+        """Load a font at the given size, reusing it for later cards"""
+        key = (font_path, size)
+        if key not in self._fonts:
+            self._fonts[key] = ImageFont.truetype(font_path, size)
+        return self._fonts[key]
+    
     def _generate_mock_data(self) -> dict:
         """Generate random card data"""
         return {
-            'number': f"{random.randint(1000,9999)} {random.randint(1000,9999)} "
-                     f"{random.randint(1000,9999)} {random.randint(1000,9999)}",
+            'number': self._generate_card_number(),
             'valid': f"{random.randint(1,12):02d}/{random.randint(23,30)}",
             'name': self.faker.name().upper(),
             'bank': self.faker.company().upper() + " BANK"
         }
     
+    def _generate_card_number(self) -> str:
+        """Generate a random 16-digit number with a real IIN prefix and a valid Luhn check digit, in groups of 4"""
+        low, high = random.choice(IIN_RANGES_16)
+        digits = [int(d) for d in str(random.randint(low, high))]
+        digits += [random.randint(0, 9) for _ in range(15 - len(digits))]
+        # Luhn: double every second digit from the right, counting the check digit as the first
+        total = sum(d if i % 2 else (d * 2 - 9 if d > 4 else d * 2) for i, d in enumerate(reversed(digits)))
+        digits.append((10 - total % 10) % 10)
+        number = ''.join(map(str, digits))
+        return ' '.join(number[i:i + 4] for i in range(0, 16, 4))
+
     def draw_text_with_shadow(self, 
                             draw: ImageDraw,
                             position: Tuple[int, int],
@@ -94,8 +127,9 @@ class CreditCardGenerator:
                      background_path: str,
                      card_font_size: int = 50,
                      save: bool = True,
-                     show: bool = False) -> Tuple[Image.Image, dict]:
-        """Generate a single credit card with annotations"""
+                     show: bool = False,
+                     file_base: Optional[str] = None) -> Tuple[Image.Image, dict]:
+        """Generate a single credit card with annotations, saved as `file_base` (a random unique name by default)"""
         # Load and resize background
         card = self._prepare_background(background_path)
         
@@ -139,7 +173,7 @@ class CreditCardGenerator:
         )
         
         if save:
-            self._save_card_files(card_groups, card_full, annotations)
+            self._save_card_files(card_groups, card_full, annotations, file_base)
         
         if show:
             card_full.show()
@@ -147,14 +181,16 @@ class CreditCardGenerator:
         return card_groups, annotations
     
     def _prepare_background(self, background_path: str) -> Image.Image:
-        """Load and prepare the card background"""
-        card = Image.open(background_path).convert("RGB")
-        return card.resize(self.card_size)
+        """Load and prepare the card background, reusing the resized image for later cards"""
+        if background_path not in self._backgrounds:
+            with Image.open(background_path) as background:
+                self._backgrounds[background_path] = background.convert("RGB").resize(self.card_size)
+        return self._backgrounds[background_path].copy()
     
     def _draw_bank_name(self, draw_groups, draw_full, bank_name, base_font, card_font_size):
         """Draw bank name on both card versions and return annotations"""
         bank_font_size = card_font_size - 10
-        bank_font = ImageFont.truetype(base_font, bank_font_size)
+        bank_font = self._get_font(base_font, bank_font_size)
         
         # Position bank name in top left, top right, or top middle
         card_width = self.card_size[0]
@@ -178,7 +214,7 @@ class CreditCardGenerator:
     def _draw_card_number(self, draw_groups, draw_full, card_number, base_font, card_font_size):
         """Draw card number on both card versions and return annotations"""
         number_font_size = card_font_size - 10
-        number_font = ImageFont.truetype(base_font, number_font_size)
+        number_font = self._get_font(base_font, number_font_size)
         
         # Draw card number with even spacing
         number_groups = card_number.split()
@@ -226,10 +262,10 @@ class CreditCardGenerator:
     def _draw_expiration_date(self, draw_groups, draw_full, valid_date, base_font, card_font_size):
         """Draw expiration date on both card versions and return annotations"""
         valid_font_size = card_font_size - 30
-        valid_font = ImageFont.truetype(base_font, valid_font_size)
+        valid_font = self._get_font(base_font, valid_font_size)
         
         date_font_size = card_font_size - 30
-        date_font = ImageFont.truetype(base_font, date_font_size)
+        date_font = self._get_font(base_font, date_font_size)
         
         valid_position = (50, 380)
         thru_position = (50, 400)
@@ -251,7 +287,7 @@ class CreditCardGenerator:
     def _draw_cardholder_name(self, draw_groups, draw_full, name, base_font, card_font_size):
         """Draw cardholder name on both card versions and return annotations"""
         name_font_size = card_font_size - 10
-        name_font = ImageFont.truetype(base_font, name_font_size)
+        name_font = self._get_font(base_font, name_font_size)
         
         name_position = (50, 470)
         
@@ -261,16 +297,99 @@ class CreditCardGenerator:
         
         return name_annotation
     
-    def _save_card_files(self, card_groups, card_full, annotations):
+    def _save_card_files(self, card_groups, card_full, annotations, file_base=None):
         """Save card images and annotations to files"""
-        # Generate random filename base
-        file_base = f"card_{random.randint(1000,9999)}"
+        # Random names must not collide across large runs, so they don't come from the seeded generator
+        if file_base is None:
+            file_base = f"card_{uuid.uuid4().hex[:12]}"
         
         # Save images
         #card_groups.save(os.path.join(self.output_dir, f"{file_base}_groups.png"))
         card_full.save(os.path.join(self.output_dir, "images", f"{file_base}_full.png"))
         
-        # Save annotations
-        annotations_filename = f"{file_base}_annotations.json"
-        with open(os.path.join(self.output_dir, "full_annotation", annotations_filename), 'w') as f:
+        # Save annotations last and atomically: a card is complete once its annotation file exists
+        annotations_path = os.path.join(self.output_dir, "full_annotation", f"{file_base}_annotations.json")
+        with open(annotations_path + ".tmp", 'w') as f:
             json.dump(annotations, f, indent=4)
+        os.replace(annotations_path + ".tmp", annotations_path)
+
+    def generate_indexed_card(self,
+                              index: int,
+                              random_seed: int,
+                              card_font_size: int = 50,
+                              save: bool = True) -> Tuple[Image.Image, dict]:
+        """
+        Generate card number `index` of a dataset, saved as `card_<index>` unless `save` is False.
+        
+        The card is seeded from (random_seed, index) alone, so it comes out the same whichever
+        worker draws it and in whatever order.
+        """
+        card_seed = random.Random(f"{random_seed}:{index}").getrandbits(32)
+        random.seed(card_seed)
+        self.faker.seed_instance(card_seed)
+        background_file = os.path.join(self.background_dir, random.choice(self.background_files))
+        return self.generate_card(background_file, card_font_size=card_font_size, save=save, file_base=f"card_{index:07d}")
+
+    def completed_indices(self) -> Set[int]:
+        """Indices of the dataset cards already saved in the output directory"""
+        pattern = re.compile(r"card_(\d{7})_annotations\.json")
+        with os.scandir(os.path.join(self.output_dir, "full_annotation")) as entries:
+            return {int(match.group(1)) for entry in entries if (match := pattern.fullmatch(entry.name))}
+
+    def generate_dataset(self,
+                         num_cards: int,
+                         random_seed: int = 42,
+                         card_font_size: int = 50,
+                         num_workers: Optional[int] = None,
+                         chunk_size: int = 100) -> int:
+        """
+        Generate cards `card_0000000` to `card_<num_cards - 1>` over a process pool.
+        
+        Cards already in the output directory are skipped, so an interrupted run resumes where it
+        stopped when called again with the same arguments.
+        
+        Args:
+            num_cards (int): Size of the dataset
+            random_seed (int): Seed of the dataset; each card derives its own seed from it and its index
+            card_font_size (int): Base font size of every card
+            num_workers (int): Worker processes (default: CPU count); 1 generates in this process
+            chunk_size (int): Cards per task sent to a worker
+        
+        Returns:
+            Number of cards generated by this call
+        """
+        done = self.completed_indices()
+        pending = [index for index in range(num_cards) if index not in done]
+        print(f"{len(done & set(range(num_cards)))} cards already generated, {len(pending)} to go")
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        
+        num_workers = num_workers or os.cpu_count() or 1
+        if num_workers == 1:
+            for chunk in chunks:
+                for index in chunk:
+                    self.generate_indexed_card(index, random_seed, card_font_size)
+            return len(pending)
+        
+        generator_args = (self.background_dir, self.text_fonts_dir, self.output_dir, random_seed)
+        generated = 0
+        with ProcessPoolExecutor(num_workers, initializer=_init_worker, initargs=generator_args) as executor:
+            futures = [executor.submit(_generate_chunk, chunk, random_seed, card_font_size) for chunk in chunks]
+            for future in as_completed(futures):
+                generated += future.result()
+                print(f"Generated {generated}/{len(pending)} cards")
+        return generated
+
+
+# Each pool worker keeps one generator, and with it its background and font caches, for all its chunks
+_worker_generator: Optional[CreditCardGenerator] = None
+
+
+def _init_worker(background_dir: str, text_fonts_dir: str, output_dir: str, random_seed: int) -> None:
+    global _worker_generator
+    _worker_generator = CreditCardGenerator(background_dir, text_fonts_dir, output_dir, random_seed)
+
+
+def _generate_chunk(indices: List[int], random_seed: int, card_font_size: int) -> int:
+    for index in indices:
+        _worker_generator.generate_indexed_card(index, random_seed, card_font_size)
+    return len(indices)
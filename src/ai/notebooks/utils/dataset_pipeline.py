@@ -0,0 +1,154 @@
+import json
+import os
+import random
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from tqdm import tqdm
+
+from utils.data_conversion import _bbox_to_points, crop_quad
+from utils.data_generation import CreditCardGenerator
+
+# Each pool worker keeps one generator, and with it its background and font caches
+_worker_generator: Optional[CreditCardGenerator] = None
+
+
+def _init_worker(background_dir: str, text_fonts_dir: str, detection_dir: str, random_seed: int) -> None:
+    global _worker_generator
+    # Parallelism comes from the worker processes; OpenCV's own threads would oversubscribe the CPU
+    cv2.setNumThreads(0)
+    _worker_generator = CreditCardGenerator(background_dir, text_fonts_dir, detection_dir, random_seed)
+
+
+def _build_cards(indices: List[int],
+                 random_seed: int,
+                 card_font_size: int,
+                 recognition_dir: str,
+                 include_groups: bool,
+                 jpeg_quality: int) -> List[Tuple[int, str, List[str]]]:
+    """
+    Render the cards of one task in memory and write each image once: the card for detection
+    and its number crops for recognition.
+
+    Returns:
+        Per card its index, detection annotation line and recognition annotation lines
+    """
+    results = []
+    for index in indices:
+        card, annotations = _worker_generator.generate_indexed_card(index, random_seed, card_font_size, save=False)
+        image = cv2.cvtColor(np.asarray(card), cv2.COLOR_RGB2BGR)
+
+        file_base = f"card_{index:07d}"
+        cv2.imwrite(os.path.join(_worker_generator.output_dir, "images", f"{file_base}_full.png"), image)
+        number = annotations['number']
+        detection_line = f"images/{file_base}_full.png\t" + json.dumps([{
+            "transcription": number['text'],
+            "points": _bbox_to_points(number['bbox']),
+        }]) + "\n"
+
+        crops = [('', number['bbox'], number['text'])]
+        if include_groups:
+            crops += [(f'_g{k}', part['bbox'], part['text']) for k, part in enumerate(annotations['number_parts'])]
+        recognition_lines = []
+        for suffix, bbox, text in crops:
+            crop_name = f"seq_{index:07d}{suffix}.jpg"
+            cv2.imwrite(os.path.join(recognition_dir, "images", crop_name), crop_quad(image, _bbox_to_points(bbox)),
+                        [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+            recognition_lines.append(f"images/{crop_name}\t{text}\n")
+
+        results.append((index, detection_line, recognition_lines))
+    return results
+
+
+def build_dataset(num_cards: int,
+                  output_dir: str = "../data/synthetic_data",
+                  background_dir: str = "../backgrounds",
+                  text_fonts_dir: str = "../fonts",
+                  random_seed: int = 42,
+                  card_font_size: int = 50,
+                  train_ratio: float = 0.8,
+                  include_groups: bool = True,
+                  num_workers: Optional[int] = None,
+                  chunk_size: int = 64,
+                  jpeg_quality: int = 95) -> int:
+    """
+    Generate cards and write the detection and recognition datasets with their train/val splits in one pass.
+
+    Replaces running CreditCardGenerator, prepare_detection_dataset, prepare_recognition_dataset and
+    split_train_val one after the other: cards stay in memory from rendering to cropping, each image
+    is encoded once, and no intermediate JSON is written or re-read. The files are the same as those
+    steps produce:
+
+        detection/images/card_<index>_full.png
+        detection/{paddle_ocr_det_annotations,train_annotations,val_annotations}.txt
+        recognition/images/seq_<index>[_g<group>].jpg
+        recognition/{paddle_ocr_req_annotations,train_annotations,val_annotations}.txt
+
+    A card and its crops always land in the same split.
+
+    Args:
+        num_cards (int): Number of cards to generate
+        output_dir (str): Directory receiving `detection/` and `recognition/`
+        background_dir (str): Card background images
+        text_fonts_dir (str): Card fonts
+        random_seed (int): Seed of the cards and of the train/val split
+        card_font_size (int): Base font size of every card
+        train_ratio (float): Share of cards in the training split
+        include_groups (bool): Also crop every digit group for recognition
+        num_workers (int): Worker processes (default: CPU count)
+        chunk_size (int): Cards per worker task
+        jpeg_quality (int): Quality of the recognition crops
+
+    Returns:
+        Number of cards generated
+    """
+    detection_dir = os.path.join(output_dir, "detection")
+    recognition_dir = os.path.join(output_dir, "recognition")
+    os.makedirs(os.path.join(detection_dir, "images"), exist_ok=True)
+    os.makedirs(os.path.join(recognition_dir, "images"), exist_ok=True)
+
+    num_workers = num_workers or os.cpu_count() or 1
+    max_in_flight = num_workers * 4
+    chunks = (list(range(start, min(start + chunk_size, num_cards))) for start in range(0, num_cards, chunk_size))
+    # Same split as split_train_val on the card-ordered annotations: a seeded shuffle, the first int(n * ratio) cards for training
+    card_order = list(range(num_cards))
+    random.Random(random_seed).shuffle(card_order)
+    train_cards = set(card_order[:int(num_cards * train_ratio)])
+    pending = deque()
+
+    annotation_files = {
+        (dataset, split): os.path.join(dataset_dir, f"{name}.txt")
+        for dataset, dataset_dir, all_name in (("det", detection_dir, "paddle_ocr_det_annotations"),
+                                               ("rec", recognition_dir, "paddle_ocr_req_annotations"))
+        for split, name in (("all", all_name), ("train", "train_annotations"), ("val", "val_annotations"))
+    }
+    files = {key: open(path, 'w', encoding='utf-8') for key, path in annotation_files.items()}
+    try:
+        with ProcessPoolExecutor(num_workers, initializer=_init_worker,
+                                 initargs=(background_dir, text_fonts_dir, detection_dir, random_seed)) as executor, \
+                tqdm(total=num_cards, desc="Building dataset", unit="card") as progress:
+            while True:
+                # Keep a bounded window of tasks, writing results in card order
+                while len(pending) < max_in_flight:
+                    chunk = next(chunks, None)
+                    if chunk is None:
+                        break
+                    pending.append(executor.submit(_build_cards, chunk, random_seed, card_font_size,
+                                                   recognition_dir, include_groups, jpeg_quality))
+                if not pending:
+                    break
+                for index, detection_line, recognition_lines in pending.popleft().result():
+                    split = "train" if index in train_cards else "val"
+                    for dataset, lines in (("det", [detection_line]), ("rec", recognition_lines)):
+                        files[dataset, "all"].writelines(lines)
+                        files[dataset, split].writelines(lines)
+                    progress.update(1)
+    finally:
+        for f in files.values():
+            f.close()
+
+    print(f"Detection and recognition datasets written to {output_dir}")
+    return num_cards
@@ -0,0 +1,151 @@
+import os
+import random
+from typing import Dict, Iterator, Optional, Tuple
+
+import cv2
+import lmdb
+import numpy as np
+
+
+# Read-only environments by directory: LMDB allows a single environment per database and
+# process, and an environment must not be used across a fork, so children drop the inherited ones
+_environments: Dict[str, lmdb.Environment] = {}
+
+
+def _open_readonly(lmdb_dir: str) -> lmdb.Environment:
+    key = os.path.abspath(lmdb_dir)
+    if key not in _environments:
+        _environments[key] = lmdb.open(lmdb_dir, readonly=True, lock=False, readahead=False, meminit=False)
+    return _environments[key]
+
+
+def _close_inherited_environments() -> None:
+    for env in _environments.values():
+        env.close()
+    _environments.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_close_inherited_environments)
+
+
+def _key(kind: str, index: int) -> bytes:
+    """PaddleOCR's LMDBDataSet keys, e.g. image-000000001; sample indices start at 1"""
+    return f"{kind}-{index:09d}".encode()
+
+
+def pack_lmdb(annotation_file: str,
+              output_dir: str,
+              shuffle_seed: Optional[int] = None,
+              map_size: int = 1 << 30,
+              commit_interval: int = 1000) -> int:
+    """
+    Pack a PaddleOCR annotation file and its images into an LMDB database.
+
+    Works for both the detection (`image<TAB>[{"transcription": ..., "points": ...}]`) and the
+    recognition (`image<TAB>text`) annotation files: images are stored as their encoded file
+    bytes under `image-%09d`, the label column as is under `label-%09d`, and the sample count
+    under `num-samples`, which is the layout PaddleOCR's LMDBDataSet reads.
+
+    Args:
+        annotation_file (str): Annotation file, image paths being relative to its directory
+        output_dir (str): LMDB directory to create
+        shuffle_seed (int): Shuffle samples with this seed before packing, so that key ranges
+            (see LmdbDataset.split) are random splits; keep the file order if None
+        map_size (int): Initial database size in bytes; it is doubled whenever it fills up
+        commit_interval (int): Samples written per transaction
+
+    Returns:
+        Number of samples packed
+    """
+    root = os.path.dirname(annotation_file)
+    with open(annotation_file, 'r', encoding='utf-8') as f:
+        samples = [parts for parts in (line.rstrip('\n').split('\t') for line in f) if len(parts) == 2]
+    if shuffle_seed is not None:
+        random.Random(shuffle_seed).shuffle(samples)
+
+    os.makedirs(output_dir, exist_ok=True)
+    env = lmdb.open(output_dir, map_size=map_size)
+    count = 0
+    batch = []
+
+    def commit(items):
+        while True:
+            try:
+                with env.begin(write=True) as txn:
+                    for key, value in items:
+                        txn.put(key, value)
+                return
+            except lmdb.MapFullError:
+                env.set_mapsize(env.info()['map_size'] * 2)
+
+    for image_path, label in samples:
+        full_path = os.path.join(root, image_path)
+        if not os.path.exists(full_path):
+            print(f"Warning: Image file {full_path} not found, skipping")
+            continue
+        with open(full_path, 'rb') as f:
+            image_bytes = f.read()
+        count += 1
+        batch += [(_key('image', count), image_bytes), (_key('label', count), label.encode('utf-8'))]
+        if count % commit_interval == 0:
+            commit(batch)
+            batch = []
+    commit(batch + [(b'num-samples', str(count).encode())])
+    env.close()
+
+    print(f"Packed {count} samples into {output_dir}")
+    return count
+
+
+class LmdbDataset:
+    def __init__(self, lmdb_dir: str, start: int = 0, stop: Optional[int] = None):
+        """
+        Random access to a dataset packed with pack_lmdb, or to the samples [start, stop) of it.
+
+        The database is opened read-only once per process and shared by all views of it, so a
+        dataset can be handed to DataLoader or multiprocessing workers.
+
+        Args:
+            lmdb_dir (str): LMDB directory
+            start (int): First sample of this view (0-based)
+            stop (int): End of this view (exclusive); the end of the database if None
+        """
+        self.lmdb_dir = lmdb_dir
+        with _open_readonly(lmdb_dir).begin() as txn:
+            num_samples = int(txn.get(b'num-samples'))
+        self.start = start
+        self.stop = num_samples if stop is None else min(stop, num_samples)
+
+    def __len__(self) -> int:
+        return max(self.stop - self.start, 0)
+
+    def __getitem__(self, index: int) -> Tuple[bytes, str]:
+        """Encoded image bytes and label of sample `index` of this view"""
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"Sample {index} out of range for a dataset of {len(self)}")
+        key_index = self.start + index + 1
+        with _open_readonly(self.lmdb_dir).begin() as txn:
+            return txn.get(_key('image', key_index)), txn.get(_key('label', key_index)).decode('utf-8')
+
+    def __iter__(self) -> Iterator[Tuple[bytes, str]]:
+        # One read transaction for the whole pass instead of one per sample
+        with _open_readonly(self.lmdb_dir).begin() as txn:
+            for key_index in range(self.start + 1, self.stop + 1):
+                yield txn.get(_key('image', key_index)), txn.get(_key('label', key_index)).decode('utf-8')
+
+    def get_image(self, index: int) -> Tuple[np.ndarray, str]:
+        """Decoded BGR image and label of sample `index`"""
+        image_bytes, label = self[index]
+        return cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_COLOR), label
+
+    def split(self, train_ratio: float = 0.8) -> Tuple["LmdbDataset", "LmdbDataset"]:
+        """
+        Split this view into train and validation views by key range, without copying any data.
+
+        The split is random only if the samples were shuffled when packing (see pack_lmdb).
+        """
+        split_index = self.start + int(len(self) * train_ratio)
+        return LmdbDataset(self.lmdb_dir, self.start, split_index), LmdbDataset(self.lmdb_dir, split_index, self.stop)
@@ -0,0 +1,76 @@
+"""
+Check that the ONNX Runtime backend reads the same card numbers as the PaddleOCR backend.
+
+Both backends run on the images of a synthetic dataset annotation file; the script reports
+how often they agree, the accuracy of each against the labels and their throughput, and
+exits with status 1 when agreement is below --min-agreement.
+
+Run from src/backend:
+    python -m benchmarks.backend_parity --annotations ../ai/data/synthetic_data/detection/val_annotations.txt \\
+        --det-model-dir models/det --cls-model-dir models/cls --rec-model-dir models/rec --int8
+"""
+import argparse
+import json
+import sys
+import time
+
+from PIL import Image
+
+from benchmarks.datasets import iter_annotations
+from services.card_number import CardNumberExtractor
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotations", required=True, help="PaddleOCR detection annotation file")
+    parser.add_argument("--det-model-dir", required=True, help="Exported ONNX detection model directory")
+    parser.add_argument("--cls-model-dir", required=True, help="Exported ONNX angle classification model directory")
+    parser.add_argument("--rec-model-dir", required=True, help="Exported ONNX recognition model directory")
+    parser.add_argument("--int8", action="store_true", help="Compare against the INT8 quantized ONNX models")
+    parser.add_argument("--threads", type=int, default=1, help="ONNX Runtime intra-op threads")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N images")
+    parser.add_argument("--min-agreement", type=float, default=1.0, help="Lowest accepted share of identical card numbers")
+    args = parser.parse_args()
+
+    extractors = {
+        "paddle": CardNumberExtractor(),
+        "onnx": CardNumberExtractor(
+            ocr_backend="onnx",
+            backend_options={"int8": args.int8, "intra_op_threads": args.threads},
+            det_model_dir=args.det_model_dir,
+            cls_model_dir=args.cls_model_dir,
+            rec_model_dir=args.rec_model_dir,
+        ),
+    }
+    seconds = dict.fromkeys(extractors, 0.0)
+    correct = dict.fromkeys(extractors, 0)
+    total = agreed = 0
+    mismatches = []
+
+    for image_path, label, _ in iter_annotations(args.annotations, args.limit):
+        numbers = {}
+        for name, extractor in extractors.items():
+            with Image.open(image_path) as image:
+                start = time.perf_counter()
+                numbers[name], _, _ = extractor.extract_card_number(image)
+                seconds[name] += time.perf_counter() - start
+            correct[name] += numbers[name] == label
+        total += 1
+        if numbers["paddle"] == numbers["onnx"]:
+            agreed += 1
+        else:
+            mismatches.append(image_path.name)
+
+    agreement = agreed / total if total else 0.0
+    print(json.dumps({
+        "images": total,
+        "agreement": agreement,
+        "mismatches": mismatches[:20],
+        "accuracy": {name: correct[name] / total if total else 0.0 for name in extractors},
+        "images_per_second": {name: total / seconds[name] if seconds[name] else 0.0 for name in extractors},
+    }, indent=2))
+    sys.exit(0 if agreement >= args.min_agreement else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Compare two benchmark result files written by benchmarks.run.
+
+Run from src/backend:
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import json
+
+# Metric path within a run, and whether a higher value is better
+METRICS = (
+    (("images_per_second",), True),
+    (("latency_ms", "p50"), False),
+    (("latency_ms", "p95"), False),
+    (("latency_ms", "p99"), False),
+    (("peak_rss_mb",), False),
+    (("accuracy",), True),
+)
+
+
+def _get(run: dict, path: tuple[str, ...]) -> float | None:
+    for key in path:
+        if not isinstance(run, dict) or key not in run:
+            return None
+        run = run[key]
+    return run
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline", help="Result file of the reference commit")
+    parser.add_argument("candidate", help="Result file to compare against it")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"baseline  {baseline['commit'][:12]}  {baseline['timestamp']}")
+    print(f"candidate {candidate['commit'][:12]}  {candidate['timestamp']}")
+    for mode in ("inprocess", "http"):
+        if mode not in baseline or mode not in candidate:
+            continue
+        print(f"\n{mode}")
+        for path, higher_is_better in METRICS:
+            old, new = _get(baseline[mode], path), _get(candidate[mode], path)
+            if old is None or new is None:
+                continue
+            change = (new - old) / old * 100 if old else 0.0
+            better = change > 0 if higher_is_better else change < 0
+            verdict = "better" if better and abs(change) >= 1 else "worse" if abs(change) >= 1 else ""
+            print(f"  {'.'.join(path):<18} {old:>12.3f} {new:>12.3f} {change:>+8.1f}%  {verdict}".rstrip())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+import json
+import os
+import random
+import sys
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from PIL import Image
+
+AI_DIR = Path(__file__).resolve().parents[2] / "ai"
+DEFAULT_CORPUS_DIR = Path(__file__).resolve().parent / "corpus"
+
+
+@dataclass
+class CorpusSpec:
+    """Everything that determines the images of a corpus; a corpus on disk is reused only if its spec matches"""
+    size: int = 200
+    seed: int = 1234
+    min_scale: float = 0.5
+    max_scale: float = 2.0
+    max_rotation: float = 15.0
+    font_sizes: tuple[int, ...] = (44, 50, 56)
+    jpeg_quality: int = 90
+    # Revision of the notebooks' card generator, bumped when the cards it makes change (2: real IIN prefixes)
+    generator_revision: int = 2
+
+
+def _load_generator_class():
+    """CreditCardGenerator lives with the training notebooks, outside the backend package"""
+    sys.path.insert(0, str(AI_DIR / "notebooks"))
+    try:
+        from utils.data_generation import CreditCardGenerator
+    finally:
+        sys.path.pop(0)
+    return CreditCardGenerator
+
+
+def build_corpus(spec: CorpusSpec, corpus_dir: Path = DEFAULT_CORPUS_DIR) -> list[dict]:
+    """
+    Generate a deterministic set of card images with their labels, or load it if it already exists.
+
+    Each card gets a random background and font from the generator, then a random font size,
+    scale and rotation, and is saved as a JPEG like a phone upload.
+
+    Args:
+        spec: Corpus size, seed and variation ranges
+        corpus_dir: Where images and `manifest.json` are written
+
+    Returns:
+        One entry per image with its `path`, `card_number`, `scale` and `rotation`
+    """
+    manifest_path = corpus_dir / "manifest.json"
+    spec_dict = json.loads(json.dumps(asdict(spec)))
+    if manifest_path.exists():
+        manifest = json.loads(manifest_path.read_text())
+        if manifest["spec"] == spec_dict:
+            return manifest["images"]
+
+    CreditCardGenerator = _load_generator_class()
+    images_dir = corpus_dir / "images"
+    images_dir.mkdir(parents=True, exist_ok=True)
+    # The generator seeds the global random module; variations use their own stream
+    generator = CreditCardGenerator(
+        background_dir=str(AI_DIR / "backgrounds"),
+        text_fonts_dir=str(AI_DIR / "fonts"),
+        output_dir=str(corpus_dir / "generator"),
+        random_seed=spec.seed,
+    )
+    rng = random.Random(spec.seed)
+    backgrounds = sorted(os.listdir(generator.background_dir))
+
+    images = []
+    for index in range(spec.size):
+        background = os.path.join(generator.background_dir, rng.choice(backgrounds))
+        card, annotations = generator.generate_card(background, card_font_size=rng.choice(spec.font_sizes), save=False)
+
+        scale = rng.uniform(spec.min_scale, spec.max_scale)
+        rotation = rng.uniform(-spec.max_rotation, spec.max_rotation)
+        card = card.resize((round(card.width * scale), round(card.height * scale)), Image.Resampling.BILINEAR)
+        fill = tuple(rng.randint(150, 255) for _ in range(3))
+        card = card.rotate(rotation, resample=Image.Resampling.BILINEAR, expand=True, fillcolor=fill)
+
+        path = images_dir / f"card_{index:05d}.jpg"
+        card.save(path, quality=spec.jpeg_quality)
+        images.append({
+            "path": str(path.relative_to(corpus_dir)),
+            "card_number": annotations["number"]["text"],
+            "scale": scale,
+            "rotation": rotation,
+        })
+
+    manifest_path.write_text(json.dumps({"spec": spec_dict, "images": images}, indent=2))
+    return images
@@ -0,0 +1,30 @@
+import json
+from pathlib import Path
+from typing import Iterator
+
+
+def iter_annotations(annotation_file: str, limit: int | None = None) -> Iterator[tuple[Path, str, list[list[int]]]]:
+    """
+    Read a PaddleOCR detection annotation file, e.g. the train/val_annotations.txt written by
+    the notebooks' split_train_val, one line at a time.
+
+    Args:
+        annotation_file: File with `image_path<TAB>[{"transcription": ..., "points": ...}]` lines,
+            image paths being relative to the file's directory
+        limit: Stop after this many entries
+
+    Yields:
+        Image path, card number and its box corners
+    """
+    root = Path(annotation_file).parent
+    count = 0
+    with open(annotation_file, encoding="utf-8") as f:
+        for line in f:
+            parts = line.rstrip("\n").split("\t")
+            if len(parts) != 2:
+                continue
+            annotation = json.loads(parts[1])[0]
+            yield root / parts[0], annotation["transcription"], annotation["points"]
+            count += 1
+            if limit is not None and count >= limit:
+                return
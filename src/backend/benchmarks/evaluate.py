@@ -0,0 +1,203 @@
+"""
+Accuracy and latency evaluation of the extractor on a synthetic validation split, with a regression gate.
+
+Streams a PaddleOCR detection annotation file (e.g. the val_annotations.txt written by the notebooks'
+split_train_val) to a pool of worker processes, each running the extractor configured by the service
+settings, and reports exact-match rate, per-digit accuracy, IoU of the returned box against the
+generator's number box, and latency percentiles. With a stored baseline, exits with status 1 when a
+metric regresses past its limit.
+
+Run from src/backend:
+    python -m benchmarks.evaluate --annotations ../ai/data/synthetic_data/detection/val_annotations.txt --update-baseline
+    OCR_REC_MODEL_DIR=models/rec python -m benchmarks.evaluate --annotations ../ai/data/synthetic_data/detection/val_annotations.txt
+"""
+import argparse
+import json
+import multiprocessing
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from benchmarks.datasets import iter_annotations
+from benchmarks.run import RESULTS_DIR, _git_commit, summarize
+from core.config import settings
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baselines" / "evaluation.json"
+
+# Extractor of the current worker process
+_extractor = None
+
+
+def box_iou(box_a: list, box_b: list) -> float:
+    """Intersection over union of two convex quadrilaterals given by their corners"""
+    a = cv2.convexHull(np.asarray(box_a, dtype=np.float32).reshape(-1, 2))
+    b = cv2.convexHull(np.asarray(box_b, dtype=np.float32).reshape(-1, 2))
+    intersection, _ = cv2.intersectConvexConvex(a, b)
+    union = cv2.contourArea(a) + cv2.contourArea(b) - intersection
+    return float(intersection / union) if union > 0 else 0.0
+
+
+def digit_accuracy(predicted: str | None, label: str) -> float:
+    """Share of the label's digits read correctly at their position; a missing read scores zero"""
+    if not label:
+        return 0.0
+    return sum(p == d for p, d in zip(predicted or "", label)) / len(label)
+
+
+def _init_worker() -> None:
+    """Load the extractor once per worker process and warm it up, so no image pays for it"""
+    global _extractor
+    from PIL import Image
+
+    from services.card_number import CardNumberExtractor
+
+    _extractor = CardNumberExtractor.from_settings(settings)
+    if settings.warm_up:
+        with Image.open(settings.warm_up_image) as image:
+            _extractor.warm_up(image)
+
+
+def _evaluate(entry: tuple[Path, str, list]) -> dict:
+    """Read one annotated image and score the result against its label and box"""
+    from services.image_decoding import open_image
+
+    image_path, label, points = entry
+    label = label.replace(" ", "")
+    data = image_path.read_bytes()
+    start = time.perf_counter()
+    image = open_image(data, settings.max_image_pixels, settings.preprocess_max_side)
+    card_number, bbox, _ = _extractor.extract_card_number(image)
+    latency = time.perf_counter() - start
+    return {
+        "image": str(image_path),
+        "label": label,
+        "card_number": card_number,
+        "latency": latency,
+        "digit_accuracy": digit_accuracy(card_number, label),
+        "iou": box_iou(bbox, points) if bbox is not None else None,
+    }
+
+
+def evaluate(annotation_file: str, workers: int, limit: int | None = None) -> tuple[dict, list[dict]]:
+    """
+    Run the extractor over every annotated image.
+
+    Args:
+        annotation_file: PaddleOCR detection annotation file
+        workers: Worker processes, each with its own models
+        limit: Only use the first N images
+
+    Returns:
+        Aggregate metrics and the misread images
+    """
+    latencies, correct, digit_scores, ious, misreads = [], 0, [], [], []
+    # Spawned workers don't inherit runtime thread pools or locks from this process
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(workers, initializer=_init_worker) as pool:
+        started = time.perf_counter()
+        results = pool.imap_unordered(_evaluate, iter_annotations(annotation_file, limit), chunksize=4)
+        for count, result in enumerate(results, 1):
+            latencies.append(result["latency"])
+            correct += result["card_number"] == result["label"]
+            digit_scores.append(result["digit_accuracy"])
+            if result["iou"] is not None:
+                ious.append(result["iou"])
+            if result["card_number"] != result["label"]:
+                misreads.append({key: result[key] for key in ("image", "label", "card_number")})
+            if count % 100 == 0:
+                print(f"Evaluated {count} images, {correct / count:.1%} exact matches so far")
+        elapsed = time.perf_counter() - started
+        # Let the workers exit on their own: terminating them mid-teardown makes the Paddle runtime report a crash
+        pool.close()
+        pool.join()
+
+    metrics = summarize(latencies, correct, elapsed)
+    metrics["exact_match"] = metrics.pop("accuracy")
+    metrics["digit_accuracy"] = float(np.mean(digit_scores)) if digit_scores else 0.0
+    # IoU is averaged over the images a box was returned for; found_rate says how many those are
+    metrics["found_rate"] = len(ious) / len(latencies) if latencies else 0.0
+    metrics["mean_iou"] = float(np.mean(ious)) if ious else 0.0
+    metrics["iou_at_0_5"] = sum(iou >= 0.5 for iou in ious) / len(latencies) if latencies else 0.0
+    return metrics, misreads
+
+
+def find_regressions(metrics: dict, baseline: dict, limits: dict) -> list[str]:
+    """Metrics that got worse than the baseline by more than their limit"""
+    regressions = []
+    for key in ("exact_match", "digit_accuracy", "mean_iou"):
+        drop = baseline[key] - metrics[key]
+        if drop > limits[key]:
+            regressions.append(f"{key} dropped from {baseline[key]:.4f} to {metrics[key]:.4f} (limit {limits[key]})")
+    for key in ("p50", "p95"):
+        old, new = baseline["latency_ms"][key], metrics["latency_ms"][key]
+        if old and (new - old) / old > limits["latency"]:
+            regressions.append(f"{key} latency rose from {old:.1f} ms to {new:.1f} ms (limit +{limits['latency']:.0%})")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--annotations", required=True, help="PaddleOCR detection annotation file")
+    parser.add_argument("--workers", type=int, default=settings.inference_workers, help="Worker processes, each loading the models")
+    parser.add_argument("--limit", type=int, default=None, help="Only use the first N images")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline result file")
+    parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline instead of comparing")
+    parser.add_argument("--max-exact-match-drop", type=float, default=0.01, help="Largest accepted drop of the exact-match rate")
+    parser.add_argument("--max-digit-accuracy-drop", type=float, default=0.01, help="Largest accepted drop of the per-digit accuracy")
+    parser.add_argument("--max-iou-drop", type=float, default=0.02, help="Largest accepted drop of the mean box IoU")
+    parser.add_argument("--max-latency-increase", type=float, default=0.2,
+                        help="Largest accepted relative rise of p50/p95 latency; only meaningful on the baseline's machine")
+    parser.add_argument("--output", type=Path, default=None, help="Result file (default: results/evaluation-<commit>.json)")
+    args = parser.parse_args()
+
+    metrics, misreads = evaluate(args.annotations, args.workers, args.limit)
+    commit, dirty = _git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "annotations": args.annotations,
+        "limit": args.limit,
+        "settings": settings.public_dump(),
+        "metrics": metrics,
+        "misreads": misreads,
+    }
+    print(json.dumps(metrics, indent=2))
+
+    output = args.output or RESULTS_DIR / f"evaluation-{commit[:12]}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+    if args.update_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({key: report[key] for key in ("commit", "annotations", "limit", "metrics")}, indent=2))
+        print(f"Baseline written to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"No baseline at {args.baseline}, nothing to compare against (store one with --update-baseline)")
+        return
+
+    baseline = json.loads(args.baseline.read_text())
+    if (baseline["annotations"], baseline["limit"]) != (args.annotations, args.limit):
+        print(f"Warning: the baseline was measured on {baseline['annotations']} (limit {baseline['limit']})")
+    limits = {
+        "exact_match": args.max_exact_match_drop,
+        "digit_accuracy": args.max_digit_accuracy_drop,
+        "mean_iou": args.max_iou_drop,
+        "latency": args.max_latency_increase,
+    }
+    regressions = find_regressions(metrics, baseline["metrics"], limits)
+    if regressions:
+        print(f"Regressions against the baseline of {baseline['commit'][:12]}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        sys.exit(1)
+    print(f"No regression against the baseline of {baseline['commit'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Time the line clusterer on synthetic OCR results with many boxes.
+
+Each synthetic image holds several cards (four 4-digit groups on a line, slightly
+rotated) plus filler text boxes, the way statements and screenshots look to OCR.
+The previous pairwise matcher is timed alongside for comparison.
+
+Run from src/backend:
+    python -m benchmarks.line_clustering --boxes 50 100 200 500 1000
+"""
+import argparse
+import math
+import random
+import time
+
+from services.line_clustering import find_card_candidates
+
+
+def synthetic_ocr_result(n_boxes: int, rng: random.Random) -> tuple[list, set[str]]:
+    """OCR result with roughly `n_boxes` boxes; returns it with the card numbers it contains"""
+    result = []
+    numbers = set()
+    # The whole page is tilted; lines only deviate slightly from it
+    page_angle = rng.uniform(-8, 8)
+    origin_y = 50.0
+    while len(result) < n_boxes:
+        height = rng.uniform(20, 60)
+        angle = math.radians(page_angle + rng.uniform(-1, 1))
+        origin_x = rng.uniform(0, 200)
+        origin_y += height * 2.5
+
+        if rng.random() < 0.4:
+            groups = ["".join(rng.choice("0123456789") for _ in range(4)) for _ in range(4)]
+            numbers.add("".join(groups))
+            texts = groups
+        else:
+            texts = [rng.choice(["VALID", "THRU", "12/29", "JOHN", "SMITH", "BANK", "DEBIT"]) for _ in range(rng.randint(1, 5))]
+
+        x = 0.0
+        for text in texts:
+            width = height * 0.6 * len(text)
+            corners = [(x, 0), (x + width, 0), (x + width, height), (x, height)]
+            box = [[origin_x + cx * math.cos(angle) - cy * math.sin(angle),
+                    origin_y + cx * math.sin(angle) + cy * math.cos(angle)] for cx, cy in corners]
+            result.append([box, (text, rng.uniform(0.8, 1.0))])
+            x += width + height * rng.uniform(0.5, 1.5)
+
+    rng.shuffle(result)
+    return result, numbers
+
+
+def pairwise_reference(ocr_result: list, threshold: float = 10) -> list[str]:
+    """The previous matcher, kept going until every 4-digit group is used: compare each group with every other one"""
+    digits = [(text, sum(p[1] for p in box) / 4, box, conf) for box, (text, conf) in ocr_result if len(text) == 4 and text.isdigit()]
+    used = set()
+    numbers = []
+    for i, (text1, y1, box1, _) in enumerate(digits):
+        if i in used:
+            continue
+        group = [(text1, box1)]
+        used.add(i)
+        for j, (text2, y2, box2, _) in enumerate(digits):
+            if j != i and j not in used and abs(y1 - y2) <= threshold:
+                group.append((text2, box2))
+                used.add(j)
+        if len(group) == 4:
+            numbers.append("".join(text for text, _ in sorted(group, key=lambda g: g[1][0][0])))
+    return numbers
+
+
+def time_call(fn, repeat: int) -> float:
+    """Best of `repeat` runs, in milliseconds"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[25, 50, 100, 200, 500, 1000, 2000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    print(f"{'boxes':>6} {'clusterer ms':>13} {'pairwise ms':>12} {'cards':>6} {'found':>6} {'pairwise found':>15}")
+    for n_boxes in args.boxes:
+        ocr_result, numbers = synthetic_ocr_result(n_boxes, rng)
+        candidates = find_card_candidates(ocr_result)
+        found = len(numbers & {candidate.number for candidate in candidates})
+        pairwise_found = len(numbers & set(pairwise_reference(ocr_result)))
+        clusterer_ms = time_call(lambda: find_card_candidates(ocr_result), args.repeat)
+        pairwise_ms = time_call(lambda: pairwise_reference(ocr_result), args.repeat)
+        print(f"{len(ocr_result):>6} {clusterer_ms:>13.2f} {pairwise_ms:>12.2f} {len(numbers):>6} {found:>6} {pairwise_found:>15}")
+
+
+if __name__ == "__main__":
+    main()
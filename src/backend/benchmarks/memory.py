@@ -0,0 +1,133 @@
+"""
+Memory footprint of multi-worker serving: serve.py (models loaded once, then forked) against `uvicorn --workers`.
+
+Starts the server, waits until it is ready, sends a few /predict requests so every worker has run
+inference, then reports for every process of the server its RSS, USS (memory no other process shares)
+and PSS (shared pages divided among the processes sharing them), in megabytes. The USS of a worker is
+what one more worker costs.
+
+Run from src/backend:
+    python -m benchmarks.memory --mode both --workers 4
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.corpus import DEFAULT_CORPUS_DIR, CorpusSpec, build_corpus
+from benchmarks.run import BACKEND_DIR, RESULTS_DIR, _free_port, _git_commit, _load, wait_ready
+from core.config import settings
+
+
+def _command(mode: str, workers: int, port: int) -> list[str]:
+    if mode == "prefork":
+        return [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers)]
+    return [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port),
+            "--workers", str(workers), "--log-level", "warning"]
+
+
+def _role(process, pid: int) -> str:
+    if process.pid == pid:
+        return "parent"
+    # multiprocessing's resource tracker, started by uvicorn's supervisor, serves no requests
+    if any("resource_tracker" in arg for arg in process.cmdline()):
+        return "helper"
+    return "worker"
+
+
+def measure_tree(pid: int) -> dict:
+    """RSS, USS and PSS of a process and each of its children, and their totals, in megabytes"""
+    import psutil
+
+    root = psutil.Process(pid)
+    processes = []
+    for process in [root] + root.children(recursive=True):
+        try:
+            info = process.memory_full_info()
+            role = _role(process, pid)
+        except psutil.Error:
+            continue
+        processes.append({
+            "pid": process.pid,
+            "role": role,
+            "rss_mb": info.rss / 1024 / 1024,
+            "uss_mb": info.uss / 1024 / 1024,
+            "pss_mb": getattr(info, "pss", 0) / 1024 / 1024,  # Linux only
+        })
+    # uvicorn serves requests in its own process when it runs a single worker
+    workers = [p for p in processes if p["role"] == "worker"] or processes[:1]
+    return {
+        "processes": processes,
+        "total_rss_mb": sum(p["rss_mb"] for p in processes),
+        "total_uss_mb": sum(p["uss_mb"] for p in processes),
+        "total_pss_mb": sum(p["pss_mb"] for p in processes),
+        "worker_uss_mb": sum(p["uss_mb"] for p in workers) / len(workers) if workers else 0.0,
+    }
+
+
+def run_mode(mode: str, workers: int, corpus: list[tuple[bytes, str]], requests: int, ready_timeout: float = 600) -> dict:
+    """Start the server in one mode, load it, and measure its processes"""
+    import psutil  # noqa: F401 - fail before the server starts
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    env = {**os.environ, "INFERENCE_EXECUTOR": "thread"}
+    started = time.perf_counter()
+    server = subprocess.Popen(_command(mode, workers, port), cwd=BACKEND_DIR, env=env)
+    try:
+        # Connections are spread over the workers by the kernel, so several readies in a row make it
+        # likely that every worker has loaded its models
+        wait_ready(base_url, server, ready_timeout, consecutive=4 * workers)
+        startup = time.perf_counter() - started
+        load = asyncio.run(_load(base_url, corpus, requests, concurrency=workers)) if requests else None
+        result = measure_tree(server.pid)
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+    result.update(mode=mode, workers=workers, startup_seconds=startup)
+    if load is not None:
+        result["images_per_second"] = load["images_per_second"]
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["prefork", "uvicorn", "both"], default="both")
+    parser.add_argument("--workers", type=int, default=4, help="HTTP worker processes")
+    parser.add_argument("--requests", type=int, default=None, help="/predict requests before measuring (default: 8 per worker)")
+    parser.add_argument("--size", type=int, default=20, help="Number of corpus images")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus seed")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--output", type=Path, default=None, help="Result file (default: results/memory-<commit>.json)")
+    args = parser.parse_args()
+
+    spec = CorpusSpec(size=args.size, seed=args.seed)
+    images = build_corpus(spec, args.corpus_dir)
+    corpus = [((args.corpus_dir / entry["path"]).read_bytes(), entry["card_number"]) for entry in images]
+    requests = 8 * args.workers if args.requests is None else args.requests
+
+    commit, dirty = _git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "settings": settings.public_dump(),
+    }
+    modes = ["prefork", "uvicorn"] if args.mode == "both" else [args.mode]
+    for mode in modes:
+        report[mode] = run_mode(mode, args.workers, corpus, requests)
+        print(f"{mode:>8}: total PSS {report[mode]['total_pss_mb']:.0f} MB, "
+              f"total USS {report[mode]['total_uss_mb']:.0f} MB, per-worker USS {report[mode]['worker_uss_mb']:.0f} MB")
+
+    output = args.output or RESULTS_DIR / f"memory-{commit[:12]}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Throughput and latency benchmark on a seeded synthetic card corpus.
+
+Runs the extractor in-process, and/or the FastAPI app started with uvicorn under a local
+load generator, then writes images/sec, latency percentiles, peak RSS and accuracy as JSON.
+Service settings come from the usual environment variables (see core/config.py).
+
+Run from src/backend:
+    python -m benchmarks.run --mode both --size 200 --concurrency 8
+    python -m benchmarks.compare benchmarks/results/<old>.json benchmarks/results/<new>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.corpus import DEFAULT_CORPUS_DIR, CorpusSpec, build_corpus
+from core.config import settings
+
+BACKEND_DIR = Path(__file__).resolve().parents[1]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def summarize(latencies: list[float], correct: int, elapsed: float) -> dict:
+    """Throughput, latency percentiles in milliseconds and exact-match accuracy"""
+    latencies_ms = np.asarray(latencies) * 1000
+    return {
+        "images": len(latencies),
+        "images_per_second": len(latencies) / elapsed if elapsed else 0.0,
+        "latency_ms": {
+            "mean": float(latencies_ms.mean()) if len(latencies) else 0.0,
+            "p50": float(np.percentile(latencies_ms, 50)) if len(latencies) else 0.0,
+            "p95": float(np.percentile(latencies_ms, 95)) if len(latencies) else 0.0,
+            "p99": float(np.percentile(latencies_ms, 99)) if len(latencies) else 0.0,
+        },
+        "accuracy": correct / len(latencies) if latencies else 0.0,
+    }
+
+
+def run_inprocess(corpus: list[tuple[bytes, str]]) -> dict:
+    """Decode and extract every image sequentially, the way one inference worker does"""
+    from services.card_number import CardNumberExtractor
+    from services.image_decoding import open_image
+
+    extractor = CardNumberExtractor.from_settings(settings)
+    extractor.extract_card_number(open_image(corpus[0][0], settings.max_image_pixels, settings.preprocess_max_side))
+
+    latencies, correct = [], 0
+    started = time.perf_counter()
+    for data, label in corpus:
+        start = time.perf_counter()
+        image = open_image(data, settings.max_image_pixels, settings.preprocess_max_side)
+        card_number, _, _ = extractor.extract_card_number(image)
+        latencies.append(time.perf_counter() - start)
+        correct += card_number == label
+    result = summarize(latencies, correct, time.perf_counter() - started)
+    # ru_maxrss is in kilobytes on Linux
+    result["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return result
+
+
+class RssSampler(threading.Thread):
+    """Track the peak resident memory of a process and all of its children (e.g. inference workers)"""
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        super().__init__(daemon=True)
+        import psutil
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self._stopped = threading.Event()
+
+    def run(self) -> None:
+        import psutil
+        while not self._stopped.is_set():
+            try:
+                processes = [self.process] + self.process.children(recursive=True)
+                self.peak = max(self.peak, sum(p.memory_info().rss for p in processes))
+            except psutil.Error:
+                pass
+            self._stopped.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self.join()
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_ready(base_url: str, server: subprocess.Popen, timeout: float, consecutive: int = 1) -> None:
+    """Poll /ready until it answers 200 `consecutive` times in a row; with several workers each may need to be hit"""
+    import httpx
+
+    deadline = time.monotonic() + timeout
+    streak = 0
+    while streak < consecutive:
+        try:
+            streak = streak + 1 if httpx.get(f"{base_url}/ready").status_code == 200 else 0
+        except httpx.TransportError:
+            streak = 0
+        if server.poll() is not None or time.monotonic() > deadline:
+            raise RuntimeError("Server did not become ready")
+        if streak == 0:
+            time.sleep(0.5)
+
+
+async def _load(base_url: str, corpus: list[tuple[bytes, str]], requests: int, concurrency: int) -> dict:
+    """Closed-loop load: `concurrency` clients each send their next request as soon as the previous one returns"""
+    import httpx
+
+    jobs: asyncio.Queue = asyncio.Queue()
+    for index in range(requests):
+        jobs.put_nowait(corpus[index % len(corpus)])
+    latencies, counts = [], {"correct": 0, "rejected": 0, "errors": 0}
+
+    async def client(http: httpx.AsyncClient) -> None:
+        while not jobs.empty():
+            data, label = jobs.get_nowait()
+            start = time.perf_counter()
+            response = await http.post("/predict", files={"file": ("card.jpg", data, "image/jpeg")})
+            if response.status_code == 503:
+                counts["rejected"] += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 200:
+                counts["correct"] += response.json()["card_number"] == label
+            elif response.status_code != 400:
+                counts["errors"] += 1
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    result = summarize(latencies, counts["correct"], elapsed)
+    result.update(concurrency=concurrency, rejected=counts["rejected"], errors=counts["errors"])
+    return result
+
+
+def run_http(corpus: list[tuple[bytes, str]], requests: int, concurrency: int, ready_timeout: float = 600) -> dict:
+    """Start the app with uvicorn, wait until it is ready, and drive /predict with the load generator"""
+    import psutil  # noqa: F401 - fail before the server starts, the sampler needs it
+
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR, env=os.environ.copy(),
+    )
+    sampler = RssSampler(server.pid)
+    sampler.start()
+    try:
+        wait_ready(base_url, server, ready_timeout)
+        result = asyncio.run(_load(base_url, corpus, requests, concurrency))
+    finally:
+        sampler.stop()
+        server.terminate()
+        server.wait(timeout=30)
+    result["peak_rss_mb"] = sampler.peak / 1024 / 1024
+    return result
+
+
+def _git_commit() -> tuple[str, bool]:
+    """Current commit and whether the working tree has uncommitted changes"""
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return git("rev-parse", "HEAD") or "unknown", bool(git("status", "--porcelain", "--untracked-files=no"))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "http", "both"], default="both")
+    parser.add_argument("--size", type=int, default=200, help="Number of corpus images")
+    parser.add_argument("--seed", type=int, default=1234, help="Corpus seed")
+    parser.add_argument("--corpus-dir", type=Path, default=DEFAULT_CORPUS_DIR)
+    parser.add_argument("--requests", type=int, default=None, help="HTTP requests to send (default: one per image)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent HTTP clients")
+    parser.add_argument("--output", type=Path, default=None, help="Result file (default: results/<commit>.json)")
+    args = parser.parse_args()
+
+    spec = CorpusSpec(size=args.size, seed=args.seed)
+    images = build_corpus(spec, args.corpus_dir)
+    corpus = [((args.corpus_dir / entry["path"]).read_bytes(), entry["card_number"]) for entry in images]
+
+    commit, dirty = _git_commit()
+    report = {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "host": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "settings": settings.public_dump(),
+        "corpus": json.loads(json.dumps(asdict(spec))),
+    }
+    if args.mode in ("inprocess", "both"):
+        report["inprocess"] = run_inprocess(corpus)
+    if args.mode in ("http", "both"):
+        report["http"] = run_http(corpus, args.requests or len(corpus), args.concurrency)
+
+    output = args.output or RESULTS_DIR / f"{commit[:12]}{'-dirty' if dirty else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(json.dumps({key: report[key] for key in ("inprocess", "http") if key in report}, indent=2))
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import os
+from pathlib import Path
+from typing import Literal
+
+from pydantic import BaseModel
+
+
+ASSETS_DIR = Path(__file__).resolve().parents[1] / "assets"
+
+
+# Fields holding keys, never written out with the other settings
+SECRET_FIELDS = {"cache_encryption_key", "jobs_encryption_key"}
+
+
+class Settings(BaseModel):
+    """Service settings, overridable through upper-cased environment variables."""
+
+    # Logging: level, "text" or "json" output, and the share of requests whose raw OCR result is logged at DEBUG level
+    log_level: str = "INFO"
+    log_format: Literal["text", "json"] = "text"
+    ocr_debug_sample_rate: float = 0.0
+
+    # Inference executor
+    inference_executor: Literal["thread", "process"] = "thread"
+    inference_workers: int = 1
+    inference_max_queue: int = 8
+
+    # Model warm-up: one inference per worker on a bundled synthetic card before reporting ready
+    warm_up: bool = True
+    warm_up_image: str = str(ASSETS_DIR / "warmup_card.jpg")
+
+    # Upload limits: bytes per image, bytes per request body and decoded pixels per image
+    max_upload_bytes: int = 10 * 1024 * 1024
+    max_batch_request_bytes: int = 1024 * 1024 * 1024
+    max_image_pixels: int = 40_000_000
+
+    # Preprocessing: downscale to a maximum side and optionally crop to the card rectangle
+    preprocess_max_side: int = 1600
+    preprocess_detect_card: bool = False
+
+    # Text detection input size and box thresholds chosen per image from its size (services/detection_profiles.py);
+    # off uses the backend's defaults for every image. Off by default until benchmarks.evaluate shows no regression against
+    # the baseline on real scans
+    adaptive_detection: bool = False
+
+    # OCR backend: "paddle" (PaddleOCR on the Paddle runtime) or "onnx" (exported models on ONNX Runtime)
+    ocr_backend: Literal["paddle", "onnx"] = "paddle"
+    # OCR model directories; unset uses the PaddleOCR English models (paddle backend only)
+    ocr_det_model_dir: str | None = None
+    ocr_cls_model_dir: str | None = None
+    ocr_rec_model_dir: str | None = None
+    # ONNX backend: INT8 dynamic quantization, threads per worker and recognition dictionary
+    onnx_int8: bool = False
+    onnx_intra_op_threads: int = 1
+    onnx_inter_op_threads: int = 1
+    onnx_char_dict_path: str | None = None
+
+    # Cascade: a fast pass without angle classification (optionally with lighter models) first, and the
+    # full pipeline only for images whose fast read is below the confidence threshold or fails the checksum
+    cascade_enabled: bool = False
+    cascade_min_confidence: float = 0.9
+    cascade_fast_det_model_dir: str | None = None
+    cascade_fast_rec_model_dir: str | None = None
+
+    # Card numbers failing the Luhn or brand-length check: "off" accepts them, "reject" drops them,
+    # "repair" first tries to fix the least confident digit from the recognizer's top-k alternatives
+    luhn_policy: Literal["off", "reject", "repair"] = "reject"
+
+    # Micro-batching across concurrent requests (1 disables batching)
+    batch_max_size: int = 1
+    batch_max_wait_ms: float = 5.0
+
+    # Result cache keyed by a hash of the uploaded bytes; entries are encrypted with a Fernet key
+    cache_enabled: bool = False
+    cache_max_entries: int = 1024
+    cache_ttl_seconds: float = 3600
+    cache_encryption_key: str | None = None
+
+    # Images of a /predict/batch request processed concurrently
+    predict_batch_concurrency: int = 4
+
+    # Offline jobs (/jobs): directory of the SQLite store and unpacked archives, directory that manifest paths are
+    # resolved in (unset disables manifests), images read at once, reads per image before it fails, and the Fernet key
+    # encrypting stored results (generated into the jobs directory if unset)
+    jobs_dir: str = "jobs"
+    jobs_input_dir: str | None = None
+    jobs_concurrency: int = 2
+    jobs_max_attempts: int = 3
+    jobs_encryption_key: str | None = None
+    # Seconds a running job item stays claimed by its process without renewal; a dead process's items run again after it
+    jobs_lease_seconds: float = 60
+
+    # /predict/stream: frames read per stream at most, dHash bits under which a frame counts as a
+    # duplicate of the last one read, and readings in a row the fused number must survive to be final
+    stream_max_frames: int = 60
+    stream_duplicate_distance: int = 4
+    stream_stable_frames: int = 3
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables named after the fields"""
+        overrides = {
+            name: os.environ[name.upper()]
+            for name in cls.model_fields
+            if name.upper() in os.environ
+        }
+        return cls(**overrides)
+
+    def public_dump(self) -> dict:
+        """Settings without the secret keys, e.g. to store next to benchmark results"""
+        return self.model_dump(exclude=SECRET_FIELDS)
+
+
+# Create a singleton instance
+settings = Settings.from_env()
@@ -1,12 +1,114 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import re
+from logging.handlers import QueueHandler, QueueListener
+
+from core.config import settings
+
+
+# Runs of 13-19 digits, optionally separated by single spaces or dashes (decimal fractions excluded)
+_PAN_PATTERN = re.compile(r"(?<![\d.])\d(?:[ -]?\d){12,18}(?!\d)")
+# String literals in the repr of an OCR result, and runs of 4 or more digits, such as a card number read as separate groups
+_QUOTED_PATTERN = re.compile(r"'[^']*'|\"[^\"]*\"")
+_DIGIT_GROUP_PATTERN = re.compile(r"\d{4,}")
+
+_listener: QueueListener | None = None
+
+
+def mask_pan(card_number: str) -> str:
+    """Keep the first and last four digits of a card number"""
+    digits = re.sub(r"\D", "", card_number)
+    return f"{digits[:4]}****{digits[-4:]}"
+
+
+def mask_pans(text: str) -> str:
+    """Mask every card number found in a piece of text"""
+    return _PAN_PATTERN.sub(lambda match: mask_pan(match.group()), text)
+
+
+def mask_digit_groups(text: str) -> str:
+    """Mask every run of 4 or more digits in the strings of a repr, leaving numbers such as box coordinates readable"""
+    return _QUOTED_PATTERN.sub(lambda match: _DIGIT_GROUP_PATTERN.sub(lambda group: "*" * len(group.group()), match.group()), text)
+
+
+class PanMaskingQueueHandler(QueueHandler):
+    """Queue handler that masks card numbers once the message, arguments and traceback are merged"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = super().prepare(record)
+        record.msg = mask_pans(record.msg)
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps({
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        })
+
+
+def configure_logging() -> None:
+    """
+    Route all records through a queue so that writing to stdout happens on a
+    background thread. Messages are merged, and card numbers masked, only for
+    records that pass the level check.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler()
+    if settings.log_format == "json":
+        stream_handler.setFormatter(JsonFormatter())
+    else:
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(name)s: %(message)s"))
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = PanMaskingQueueHandler(log_queue)
+    # Only merges message and traceback; the layout is applied by the stream handler
+    queue_handler.setFormatter(logging.Formatter("%(message)s"))
+    logging.basicConfig(level=settings.log_level.upper(), handlers=[queue_handler], force=True)
+
+    _listener = QueueListener(log_queue, stream_handler)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the background writer"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
+
+
+def _stop_listener_before_fork() -> None:
+    """Write out queued records first, or the forked process (see serve.py) would write them again from its copy of the queue"""
+    shutdown_logging()
+
+
+def _restart_listener_after_fork() -> None:
+    """A stopped listener can't be restarted, and a forked process doesn't inherit the thread writing the queue out"""
+    global _listener
+    if _listener is None:
+        return
+    _listener = QueueListener(_listener.queue, *_listener.handlers)
+    _listener.start()
+
+
+os.register_at_fork(before=_stop_listener_before_fork, after_in_parent=_restart_listener_after_fork,
+                    after_in_child=_restart_listener_after_fork)
 
 
 def get_logger(name: str) -> logging.Logger:
     """
     Logger creation.
     """
-    logging.basicConfig(
-        level="INFOR",
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s"
-    )
+    configure_logging()
     return logging.getLogger(name)
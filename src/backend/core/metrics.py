@@ -0,0 +1,179 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable
+
+# Seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Observations made while a job runs in an inference worker, handed back to the serving process
+_collected: ContextVar[list | None] = ContextVar("collected_observations", default=None)
+
+
+def _format_labels(labelnames: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(labelnames, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    record = inc
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}_total{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: non-cumulative bucket counts (last one is +Inf), sum and count
+        self._series: dict[tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    record = observe
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time"""
+
+    def __init__(self, name: str, documentation: str, read: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.read = read
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {_format_value(self.read())}"]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+
+    def register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def get(self, name: str):
+        return self._metrics[name]
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def record(metric: Counter | Histogram, value: float, **labels) -> None:
+    """Record an observation, deferring it to the serving process when running inside a worker job"""
+    collected = _collected.get()
+    if collected is not None:
+        collected.append((metric.name, value, labels))
+    else:
+        metric.record(value, **labels)
+
+
+@contextmanager
+def timed_stage(stage: str):
+    """Time a block of the inference pipeline into the stage latency histogram"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(STAGE_LATENCY, time.perf_counter() - start, stage=stage)
+
+
+@contextmanager
+def collect_observations():
+    """Collect the observations of the current job instead of recording them"""
+    collected = []
+    token = _collected.set(collected)
+    try:
+        yield collected
+    finally:
+        _collected.reset(token)
+
+
+def apply_observations(collected: list) -> None:
+    """Record observations collected in a worker"""
+    for name, value, labels in collected:
+        registry.get(name).record(value, **labels)
+
+
+registry = MetricsRegistry()
+
+STAGE_LATENCY = registry.register(Histogram(
+    "card_extractor_stage_seconds", "Time spent in each stage of the inference pipeline", ("stage",)))
+QUEUE_WAIT = registry.register(Histogram(
+    "card_extractor_queue_wait_seconds", "Time requests wait before an inference worker picks them up", ("queue",)))
+REQUEST_LATENCY = registry.register(Histogram(
+    "card_extractor_request_seconds", "End-to-end latency of extraction requests", ("endpoint",)))
+IMAGE_BYTES = registry.register(Histogram(
+    "card_extractor_image_bytes", "Size of uploaded images in bytes",
+    buckets=(16e3, 64e3, 256e3, 1e6, 2e6, 4e6, 8e6, 16e6)))
+IMAGE_PIXELS = registry.register(Histogram(
+    "card_extractor_image_pixels", "Size of decoded images in pixels",
+    buckets=(1e5, 3e5, 1e6, 2e6, 4e6, 8e6, 12e6, 24e6)))
+BATCH_SIZE = registry.register(Histogram(
+    "card_extractor_batch_size", "Number of images per OCR batch", buckets=(1, 2, 4, 8, 16, 32, 64)))
+OUTCOMES = registry.register(Counter(
+    "card_extractor_outcomes", "Extraction outcomes: full_match, group_assembly, multi_match, stream_match, not_found, error", ("outcome",)))
+VALIDATION = registry.register(Counter(
+    "card_extractor_validation", "Luhn and brand checks of candidate numbers: valid, repaired, rejected", ("result",)))
+CASCADE_TIERS = registry.register(Counter(
+    "card_extractor_cascade", "Images settled or escalated by each cascade tier: accepted, not_found, escalated", ("tier", "result")))
+DETECTION_PROFILE_RUNS = registry.register(Counter(
+    "card_extractor_detection_profiles", "Text detection runs by the size profile chosen for the image: small, medium, large", ("profile",)))
+JOB_ITEMS = registry.register(Counter(
+    "card_extractor_job_items", "Images of offline jobs: done, not_found, retried, failed", ("result",)))
+STREAM_FRAMES = registry.register(Counter(
+    "card_extractor_stream_frames", "Frames received on /predict/stream: read, duplicate, busy, invalid", ("result",)))
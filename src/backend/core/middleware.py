@@ -0,0 +1,42 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects request bodies over a size limit with 413, using Content-Length when it is
+    sent and counting bytes while the body streams in otherwise, so an oversized upload
+    is cut off before it is buffered.
+    """
+
+    def __init__(self, app: ASGIApp, default_limit: int, path_limits: dict[str, int] | None = None):
+        self.app = app
+        self.default_limit = default_limit
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        limit = self.path_limits.get(scope["path"], self.default_limit)
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse(status_code=413, content={"message": f"Request body is larger than {limit} bytes"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # FastAPI lets HTTPException through body parsing, so this becomes a 413 response
+                    raise HTTPException(status_code=413, detail=f"Request body is larger than {limit} bytes")
+            return message
+
+        await self.app(scope, limited_receive, send)
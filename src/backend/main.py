@@ -1,19 +1,48 @@
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from routers import card_number, utils
+from core.config import settings
+from core.middleware import BodySizeLimitMiddleware
+from routers import card_number, jobs, utils
+from services.inference_pool import inference_pool
+from services.jobs import job_manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    inference_pool.start()
+    # Models load in the background so the health check answers right away; /ready reports when they are warm
+    loading = asyncio.create_task(inference_pool.load())
+    job_manager.start()
+    yield
+    await job_manager.stop()
+    loading.cancel()
+    inference_pool.shutdown()
 
 
 app = FastAPI(title="Image Prediction API",
               description="A simple image prediction API",
-              version="1.0.0")
+              version="1.0.0",
+              lifespan=lifespan)
 
 
 app.include_router(card_number.router)
+app.include_router(jobs.router)
 app.include_router(utils.router)
 
 
+# Multipart overhead on top of a single image is small, so /predict gets a little headroom
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    default_limit=settings.max_upload_bytes + 64 * 1024,
+    path_limits={"/predict/batch": settings.max_batch_request_bytes, "/jobs/upload": settings.max_batch_request_bytes},
+)
+
+# Added last so that CORS headers are set on every response, 413s included
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000"],  # Frontend URL
@@ -1,12 +1,22 @@
+import asyncio
+import time
 from io import BytesIO
+from typing import BinaryIO, Iterator, Literal
 
-from fastapi import APIRouter, File, UploadFile
-from fastapi.responses import JSONResponse
-from PIL import Image
+from fastapi import APIRouter, File, Query, UploadFile, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
 
-from core.logging_config import get_logger
-from schemas.card_number import CardNumberOutput
-from services.card_number import card_number_extractor
+from core.config import settings
+from core.logging_config import get_logger, mask_pan
+from core.metrics import IMAGE_BYTES, OUTCOMES, REQUEST_LATENCY, STREAM_FRAMES
+from schemas.card_number import CardNumberBatchItem, CardNumberOutput, CardNumbersOutput, StreamFrameResult, StreamResult
+from services.archives import is_archive, iter_archive
+from services.frame_fusion import DuplicateFrameFilter, FrameFusion, dhash
+from services.image_decoding import ImageValidationError, open_image, read_limited, read_upload
+from services.inference_pool import InferencePoolSaturatedError, inference_pool
+from services.postprocessing import luhn_valid
+from services.result_cache import result_cache
 
 
 router = APIRouter()
@@ -15,19 +25,24 @@ logger = get_logger(__name__)
 
 
 @router.post("/predict", response_model=CardNumberOutput)
-async def predict(file: UploadFile = File(...)):
-    logger.info(f"Received request to predict card number from file: {file.filename}")
+async def predict(
+    file: UploadFile = File(...),
+    mode: Literal["full", "strip"] = Query("full", description="`full` runs detection, angle classification and recognition; "
+                                                               "`strip` runs recognition only on an image pre-cropped to the number line"),
+    split_groups: bool = Query(False, description="In `strip` mode, read the strip as four equal 4-digit windows"),
+):
+    logger.info("Received request to predict card number from file: %s", file.filename)
+    started = time.perf_counter()
     try:
-        # Read the image file
+        # Read the image file, rejecting non-images and oversized files before buffering them
         logger.debug("Reading uploaded file contents")
-        image = Image.open(BytesIO(await file.read()))
+        data = await read_upload(file, settings.max_upload_bytes)
 
-        # Process the image using the singleton extractor
+        # Process the image on the inference pool so the event loop stays free
         logger.info("Processing image with card number extractor")
-        card_number, bbox, confidence = card_number_extractor.extract_card_number(image)
-        print(card_number, bbox, confidence)
+        card_number, bbox, confidence = await _run_extraction(data, mode, split_groups)
         if card_number:
-            logger.info(f"Successfully extracted card number: {card_number[:4]}****{card_number[-4:]}")
+            logger.info("Successfully extracted card number: %s", mask_pan(card_number))
             return CardNumberOutput(
                 card_number=card_number,
                 bbox=bbox,
@@ -40,9 +55,255 @@ async def predict(file: UploadFile = File(...)):
                 content={"message": "No valid card number found in the image"}
             )
 
+    except ImageValidationError as e:
+        logger.warning("Rejecting upload: %s", e)
+        OUTCOMES.inc(outcome="error")
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"message": str(e)}
+        )
+
+    except InferencePoolSaturatedError as e:
+        logger.warning("Rejecting request: %s", e)
+        return JSONResponse(
+            status_code=503,
+            content={"message": "Server is busy, please retry later"},
+            headers={"Retry-After": "1"}
+        )
+
     except Exception as e:
-        logger.error(f"Error processing image: {str(e)}", exc_info=True)
+        logger.error("Error processing image: %s", e, exc_info=True)
+        OUTCOMES.inc(outcome="error")
         return JSONResponse(
             status_code=400,
             content={"message": f"Error processing image: {str(e)}"}
         )
+
+    finally:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint="predict")
+
+
+@router.post("/predict/multi", response_model=CardNumbersOutput, summary="Multi-card extraction",
+             description="Returns every card number found in the image, e.g. a scanned page holding several cards, from one OCR pass")
+async def predict_multi(file: UploadFile = File(...)):
+    logger.info("Received request to predict all card numbers from file: %s", file.filename)
+    started = time.perf_counter()
+    try:
+        data = await read_upload(file, settings.max_upload_bytes)
+        cards = await _run_extraction(data, mode="multi")
+        logger.info("Extracted %d card number(s)", len(cards))
+        return CardNumbersOutput(cards=[
+            CardNumberOutput(card_number=card_number, bbox=bbox, confidence=confidence)
+            for card_number, bbox, confidence in cards
+        ])
+
+    except ImageValidationError as e:
+        logger.warning("Rejecting upload: %s", e)
+        OUTCOMES.inc(outcome="error")
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"message": str(e)}
+        )
+
+    except InferencePoolSaturatedError as e:
+        logger.warning("Rejecting request: %s", e)
+        return JSONResponse(
+            status_code=503,
+            content={"message": "Server is busy, please retry later"},
+            headers={"Retry-After": "1"}
+        )
+
+    except Exception as e:
+        logger.error("Error processing image: %s", e, exc_info=True)
+        OUTCOMES.inc(outcome="error")
+        return JSONResponse(
+            status_code=400,
+            content={"message": f"Error processing image: {str(e)}"}
+        )
+
+    finally:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint="predict_multi")
+
+
+@router.websocket("/predict/stream")
+async def predict_stream(websocket: WebSocket):
+    """
+    Card number from a burst of camera frames, each sent as one binary message.
+
+    Every frame gets a StreamFrameResult reply. Frames nearly identical to the last one read are
+    skipped, the others are read and their digits voted across frames. The stream ends with a
+    StreamResult as soon as the fused number is stable and Luhn-valid, when the client sends the
+    text message `end`, or after `STREAM_MAX_FRAMES` frames.
+    """
+    await websocket.accept()
+    logger.info("Opened frame stream")
+    started = time.perf_counter()
+    fusion = FrameFusion(settings.stream_stable_frames)
+    duplicates = DuplicateFrameFilter(settings.stream_duplicate_distance)
+    frames = 0
+    try:
+        while frames < settings.stream_max_frames and not fusion.stable:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            if message.get("bytes") is None:
+                if message.get("text") == "end":
+                    break
+                continue
+
+            frames += 1
+            status = await _read_stream_frame(message["bytes"], fusion, duplicates)
+            STREAM_FRAMES.inc(result=status)
+            await websocket.send_text(StreamFrameResult(frame=frames, status=status, card_number=fusion.number).model_dump_json())
+
+        card_number = fusion.number
+        if card_number and luhn_valid(card_number):
+            logger.info("Fused card number %s from %d frame(s)", mask_pan(card_number), frames)
+            OUTCOMES.inc(outcome="stream_match")
+            result = StreamResult(status="done", frames=frames, stable=fusion.stable, result=CardNumberOutput(
+                card_number=card_number, bbox=fusion.bbox, confidence=fusion.confidence))
+        else:
+            logger.warning("No valid card number found in %d frame(s)", frames)
+            OUTCOMES.inc(outcome="not_found")
+            result = StreamResult(status="not_found", frames=frames, stable=False)
+        await websocket.send_text(result.model_dump_json())
+        await websocket.close()
+
+    except WebSocketDisconnect:
+        logger.info("Client closed frame stream after %d frame(s)", frames)
+
+    finally:
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint="predict_stream")
+
+
+async def _read_stream_frame(data: bytes, fusion: FrameFusion, duplicates: DuplicateFrameFilter) -> str:
+    """Read one stream frame into the fusion unless it is invalid, a duplicate, or the pool is busy"""
+    if len(data) > settings.max_upload_bytes:
+        return "invalid"
+    IMAGE_BYTES.observe(len(data))
+    try:
+        image = open_image(data, settings.max_image_pixels, settings.preprocess_max_side)
+        # Hashing decodes the frame, so keep it off the event loop
+        frame_hash = await asyncio.to_thread(dhash, image)
+    except (ImageValidationError, OSError) as e:
+        logger.warning("Skipping stream frame: %s", e)
+        return "invalid"
+    if duplicates.is_duplicate(frame_hash):
+        fusion.repeat()
+        return "duplicate"
+
+    try:
+        # A frame that finds the pool saturated is dropped, and doesn't make the next similar frames duplicates
+        digits, bbox, confidences = await inference_pool.read_frame(image)
+    except InferencePoolSaturatedError:
+        return "busy"
+    duplicates.remember(frame_hash)
+    if digits:
+        fusion.add(digits, bbox, confidences)
+    else:
+        fusion.add_miss()
+    return "read"
+
+
+async def _run_extraction(data: bytes, mode: str = "full", split_groups: bool = False, block: bool = False):
+    """
+    Extract card numbers from uploaded bytes, going through the result cache when it is enabled.
+    Returns one (card_number, bbox, confidence) result, or a list of them in `multi` mode.
+    """
+    IMAGE_BYTES.observe(len(data))
+    cache_key = None
+    if result_cache.enabled:
+        cache_key = result_cache.key_for(data, f"{mode}:{split_groups}")
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("Serving result from cache")
+            return cached
+
+    # Detection + recognition downscales anyway, so JPEGs can be decoded straight at the inference resolution
+    image = open_image(data, settings.max_image_pixels, settings.preprocess_max_side if mode != "strip" else None)
+    if mode == "strip":
+        result = await inference_pool.extract_card_number_from_strip(image, split_groups, block=block)
+    elif mode == "multi":
+        result = await inference_pool.extract_all_card_numbers(image, block=block)
+    else:
+        result = await inference_pool.extract_card_number(image, block=block)
+
+    if cache_key is not None:
+        result_cache.set(cache_key, result)
+    return result
+
+
+@router.post("/predict/batch", summary="Batch card number extraction",
+             description="Accepts many images and/or zip/tar archives of images and streams one NDJSON line per image as results finish")
+async def predict_batch(files: list[UploadFile] = File(...)):
+    logger.info("Received batch prediction request with %d upload(s)", len(files))
+    # FastAPI closes form files before a streaming response is sent, so take ownership of them here
+    uploads = [(file.filename or "", file.content_type, _detach_upload(file)) for file in files]
+    return StreamingResponse(_stream_batch_results(uploads), media_type="application/x-ndjson")
+
+
+def _detach_upload(file: UploadFile) -> BinaryIO:
+    fileobj = file.file
+    file.file = BytesIO()
+    return fileobj
+
+
+def _iter_batch_images(uploads: list[tuple[str, str | None, BinaryIO]]) -> Iterator[tuple[str, bytes | None]]:
+    """
+    Yield (name, bytes) for every image, expanding archives member by member.
+    Files over the upload size limit are not read and come with None instead of bytes.
+    """
+    for filename, content_type, fileobj in uploads:
+        if is_archive(filename, content_type):
+            for member_name, data in iter_archive(fileobj, settings.max_upload_bytes):
+                yield f"{filename}/{member_name}", data
+        else:
+            try:
+                yield filename, read_limited(fileobj, settings.max_upload_bytes)
+            except ImageValidationError:
+                yield filename, None
+
+
+async def _stream_batch_results(uploads: list[tuple[str, str | None, BinaryIO]]):
+    in_flight = set()
+    try:
+        # Reading and decompressing archive members blocks, so each one is read in the threadpool
+        async for filename, data in iterate_in_threadpool(_iter_batch_images(uploads)):
+            # Bound the number of decoded images held at once
+            if len(in_flight) >= settings.predict_batch_concurrency:
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result().model_dump_json() + "\n"
+            in_flight.add(asyncio.create_task(_predict_batch_item(filename, data)))
+
+        while in_flight:
+            done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result().model_dump_json() + "\n"
+    finally:
+        for task in in_flight:
+            task.cancel()
+        for _, _, fileobj in uploads:
+            fileobj.close()
+
+
+async def _predict_batch_item(filename: str, data: bytes | None) -> CardNumberBatchItem:
+    if data is None:
+        return CardNumberBatchItem(filename=filename, error=f"File is larger than {settings.max_upload_bytes} bytes")
+
+    started = time.perf_counter()
+    try:
+        # Batch items wait for a free worker instead of being rejected
+        card_number, bbox, confidence = await _run_extraction(data, block=True)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, endpoint="predict_batch_item")
+    except Exception as e:
+        logger.error("Error processing image %s: %s", filename, e)
+        OUTCOMES.inc(outcome="error")
+        return CardNumberBatchItem(filename=filename, error=f"Error processing image: {str(e)}")
+
+    if not card_number:
+        return CardNumberBatchItem(filename=filename, error="No valid card number found in the image")
+    return CardNumberBatchItem(
+        filename=filename,
+        result=CardNumberOutput(card_number=card_number, bbox=bbox, confidence=confidence)
+    )
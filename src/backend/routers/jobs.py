@@ -0,0 +1,86 @@
+import asyncio
+
+from fastapi import APIRouter, File, Query, UploadFile
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from core.logging_config import get_logger
+from schemas.card_number import CardNumberOutput, JobManifest, JobResultItem, JobStatus
+from services.archives import is_archive
+from services.jobs import JobSubmissionError, job_manager
+
+
+router = APIRouter(prefix="/jobs")
+
+logger = get_logger(__name__)
+
+# Seconds between store polls while following the results of a running job
+FOLLOW_INTERVAL = 0.5
+
+
+@router.post("", response_model=JobStatus, status_code=202, summary="Submit a manifest job",
+             description="Queues the images at the given paths, relative to JOBS_INPUT_DIR, for offline extraction")
+async def submit_manifest(manifest: JobManifest):
+    try:
+        job_id = await job_manager.submit_manifest(manifest.paths)
+    except JobSubmissionError as e:
+        logger.warning("Rejecting job: %s", e)
+        return JSONResponse(status_code=e.status_code, content={"message": str(e)})
+    return JobStatus(job_id=job_id, **await job_manager.get_job(job_id))
+
+
+@router.post("/upload", response_model=JobStatus, status_code=202, summary="Submit an archive job",
+             description="Queues every image of an uploaded zip/tar archive for offline extraction")
+async def submit_archive(file: UploadFile = File(...)):
+    if not is_archive(file.filename, file.content_type):
+        return JSONResponse(status_code=415, content={"message": "Expected a zip or tar archive"})
+    try:
+        job_id = await job_manager.submit_archive(file.file, file.filename or "archive")
+    except JobSubmissionError as e:
+        logger.warning("Rejecting job: %s", e)
+        return JSONResponse(status_code=e.status_code, content={"message": str(e)})
+    return JobStatus(job_id=job_id, **await job_manager.get_job(job_id))
+
+
+@router.get("/{job_id}", response_model=JobStatus, summary="Job progress")
+async def get_job(job_id: str):
+    job = await job_manager.get_job(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    return JobStatus(job_id=job_id, **job)
+
+
+@router.get("/{job_id}/results", summary="Job results",
+            description="Streams the finished images of a job as NDJSON in completion order, from the `after` cursor on")
+async def get_job_results(
+    job_id: str,
+    after: int = Query(0, description="Cursor of the last result already received; each line carries its own"),
+    follow: bool = Query(False, description="Keep the stream open and send results as they finish until the job completes"),
+):
+    if await job_manager.get_job(job_id) is None:
+        return JSONResponse(status_code=404, content={"message": "Job not found"})
+    return StreamingResponse(_stream_results(job_id, after, follow), media_type="application/x-ndjson")
+
+
+async def _stream_results(job_id: str, after: int, follow: bool):
+    while True:
+        # Read the status first, so that results finishing in between are still sent before the stream ends
+        completed = (await job_manager.get_job(job_id))["status"] == "completed"
+        results = await job_manager.results(job_id, after)
+        for item in results:
+            after = item["cursor"]
+            yield _result_item(item).model_dump_json() + "\n"
+        if results:
+            continue
+        if completed or not follow:
+            return
+        await asyncio.sleep(FOLLOW_INTERVAL)
+
+
+def _result_item(item: dict) -> JobResultItem:
+    """Same line format as /predict/batch, plus the item's cursor"""
+    if item["result"] is not None:
+        card_number, bbox, confidence = item["result"]
+        return JobResultItem(filename=item["name"], cursor=item["cursor"],
+                             result=CardNumberOutput(card_number=card_number, bbox=bbox, confidence=confidence))
+    return JobResultItem(filename=item["name"], cursor=item["cursor"],
+                         error=item["error"] or "No valid card number found in the image")
@@ -1,4 +1,9 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from core.metrics import registry
+from services.inference_pool import inference_pool
+from services.result_cache import result_cache
 
 
 router = APIRouter()
@@ -7,3 +12,23 @@ router = APIRouter()
 @router.get("/", summary="Health Check endpoint", description="Returns the health status of the API")
 async def health_check():
     return {"status": "healthy"}
+
+
+@router.get("/ready", summary="Readiness check endpoint", description="Returns 200 once every inference worker has loaded and warmed up its model")
+async def readiness_check():
+    if inference_pool.ready:
+        return {"status": "ready"}
+    if inference_pool.load_error:
+        return JSONResponse(status_code=503, content={"status": "failed", "message": inference_pool.load_error})
+    return JSONResponse(status_code=503, content={"status": "loading"})
+
+
+@router.get("/cache/stats", summary="Result cache statistics", description="Returns hit/miss counters of the result cache")
+async def cache_stats():
+    return result_cache.stats()
+
+
+@router.get("/metrics", summary="Prometheus metrics", description="Returns inference pipeline metrics in the Prometheus text format",
+            response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic import BaseModel
 
 
@@ -5,3 +7,46 @@ class CardNumberOutput(BaseModel):
     bbox: list[list[int]]
     card_number: str
     confidence: float
+
+
+class CardNumbersOutput(BaseModel):
+    cards: list[CardNumberOutput]
+
+
+class CardNumberBatchItem(BaseModel):
+    filename: str
+    result: CardNumberOutput | None = None
+    error: str | None = None
+
+
+class StreamFrameResult(BaseModel):
+    frame: int
+    status: Literal["read", "duplicate", "busy", "invalid"]
+    card_number: str | None = None  # Number fused from the frames read so far
+
+
+class StreamResult(BaseModel):
+    status: Literal["done", "not_found"]
+    frames: int
+    stable: bool
+    result: CardNumberOutput | None = None
+
+
+class JobManifest(BaseModel):
+    paths: list[str]  # Image paths relative to JOBS_INPUT_DIR
+
+
+class JobStatus(BaseModel):
+    job_id: str
+    status: Literal["queued", "running", "completed"]
+    source: str
+    created_at: float
+    total: int
+    pending: int
+    running: int
+    done: int
+    failed: int
+
+
+class JobResultItem(CardNumberBatchItem):
+    cursor: int  # Pass as `after` to resume the results from this item on
@@ -0,0 +1,119 @@
+"""
+Pre-forking server: load the OCR models once in a parent process, then fork the HTTP workers.
+
+Forked workers share the parent's memory pages, model weights included, until they write to them,
+so each extra worker costs its own activations and buffers rather than a full copy of the models.
+All workers accept connections on one socket bound by the parent. Workers that die are forked
+again from the loaded parent, without reloading anything.
+
+Run from src/backend:
+    python serve.py --workers 4 --port 8000
+"""
+import argparse
+import gc
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from core.config import settings
+from core.logging_config import get_logger, shutdown_logging
+
+
+logger = get_logger(__name__)
+
+
+def _bind(host: str, port: int, backlog: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _run_worker(app, sock: socket.socket) -> None:
+    """Serve requests in a forked process until uvicorn is told to stop"""
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # Frozen objects are never scanned, so the collector doesn't touch (and copy) the shared pages
+    gc.enable()
+    config = uvicorn.Config(app, log_level=settings.log_level.lower(), log_config=None)
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def _fork_worker(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        code = 0
+        try:
+            _run_worker(app, sock)
+        except BaseException:
+            logger.exception("Worker %d crashed", os.getpid())
+            code = 1
+        finally:
+            shutdown_logging()
+            os._exit(code)
+    logger.info("Started worker %d", pid)
+    return pid
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="HTTP worker processes")
+    parser.add_argument("--backlog", type=int, default=2048)
+    args = parser.parse_args()
+
+    if settings.inference_executor != "thread":
+        sys.exit("serve.py shares models loaded in the parent with thread workers; set INFERENCE_EXECUTOR=thread")
+
+    sock = _bind(args.host, args.port, args.backlog)
+
+    # Import the whole app and load the models before forking, so that code and weights are shared.
+    # Nothing runs inference here: runtimes start their thread pools on the first run, which must happen
+    # after the fork, so the warm-up stays in the workers.
+    from main import app
+    from services.inference_pool import preload_extractors
+    started = time.perf_counter()
+    preload_extractors(settings.inference_workers)
+    logger.info("Loaded models in %.1f s", time.perf_counter() - started)
+
+    # Move everything loaded so far out of the collector's reach before the pages get shared
+    gc.collect()
+    gc.disable()
+    gc.freeze()
+
+    workers = {_fork_worker(app, sock) for _ in range(args.workers)}
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        workers.discard(pid)
+        if not stopping:
+            logger.warning("Worker %d exited with status %d, starting a new one", pid, os.waitstatus_to_exitcode(status))
+            workers.add(_fork_worker(app, sock))
+    logger.info("All workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+import os
+import tarfile
+import zipfile
+from typing import BinaryIO, Iterator
+
+ARCHIVE_SUFFIXES = (".zip", ".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+ARCHIVE_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed", "application/x-tar", "application/gzip", "application/x-gzip"}
+
+
+def is_archive(filename: str | None, content_type: str | None = None) -> bool:
+    """Tell whether an upload is a zip/tar archive rather than a single image"""
+    if content_type in ARCHIVE_CONTENT_TYPES:
+        return True
+    return bool(filename) and filename.lower().endswith(ARCHIVE_SUFFIXES)
+
+
+def _is_hidden(path: str) -> bool:
+    return any(part.startswith(".") or part == "__MACOSX" for part in path.split("/"))
+
+
+def iter_archive(fileobj: BinaryIO, max_member_bytes: int) -> Iterator[tuple[str, bytes | None]]:
+    """
+    Lazily yield (member name, bytes) for every regular file of a zip or tar archive.
+    Members larger than `max_member_bytes` are not extracted and come with None instead of bytes.
+    """
+    if zipfile.is_zipfile(fileobj):
+        fileobj.seek(0)
+        with zipfile.ZipFile(fileobj) as archive:
+            for info in archive.infolist():
+                if info.is_dir() or _is_hidden(info.filename):
+                    continue
+                if info.file_size > max_member_bytes:
+                    yield info.filename, None
+                    continue
+                yield info.filename, archive.read(info)
+        return
+
+    fileobj.seek(0)
+    # Stream mode reads members one at a time without building the full index
+    with tarfile.open(fileobj=fileobj, mode="r|*") as archive:
+        for member in archive:
+            if not member.isfile() or _is_hidden(member.name):
+                continue
+            if member.size > max_member_bytes:
+                yield os.path.normpath(member.name), None
+                continue
+            yield os.path.normpath(member.name), archive.extractfile(member).read()
@@ -0,0 +1,115 @@
+import asyncio
+import time
+
+from core.logging_config import get_logger
+from core.metrics import BATCH_SIZE, QUEUE_WAIT
+
+
+logger = get_logger(__name__)
+
+
+class MicroBatcher:
+    """
+    Collects concurrent extraction requests into batches.
+
+    A batch is dispatched once `max_batch_size` images are waiting or `max_wait_ms`
+    has passed since its first image arrived. At most `max_in_flight` batches run
+    at a time; while all of them are busy new requests keep accumulating, so batches
+    grow with load.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int, max_wait_ms: float, max_in_flight: int, max_queue_size: int):
+        self._run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue_size = max(1, max_queue_size)
+        self._queue: asyncio.Queue | None = None
+        self._in_flight: asyncio.Semaphore | None = None
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._task = asyncio.get_running_loop().create_task(self._collect())
+
+    def stop(self) -> None:
+        """Stop collecting; requests still waiting in the queue fail instead of hanging"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        self._task = None
+        self._fail_queued()
+
+    def _fail_queued(self) -> None:
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Micro-batcher is stopped"))
+
+    async def submit(self, image, block: bool = False):
+        """
+        Queue an image and wait for its result.
+        Raises asyncio.QueueFull when saturated unless `block` is set, in which case it waits for room.
+        """
+        future = asyncio.get_running_loop().create_future()
+        item = (image, future, time.perf_counter())
+        if block:
+            await self._queue.put(item)
+        else:
+            self._queue.put_nowait(item)
+        if self._task is None:
+            # Stopped while waiting for room in the queue
+            self._fail_queued()
+        return await future
+
+    async def _collect(self) -> None:
+        loop = asyncio.get_running_loop()
+        batch = []
+        try:
+            while True:
+                # Wait for a free slot first so requests pile up while workers are busy
+                await self._in_flight.acquire()
+                batch = [await self._queue.get()]
+                deadline = loop.time() + self.max_wait
+                while len(batch) < self.max_batch_size:
+                    if not self._queue.empty():
+                        batch.append(self._queue.get_nowait())
+                        continue
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                    except asyncio.TimeoutError:
+                        break
+                loop.create_task(self._dispatch(batch))
+                batch = []
+        except asyncio.CancelledError:
+            # The batch being collected was already taken off the queue
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Micro-batcher is stopped"))
+            raise
+
+    async def _dispatch(self, batch: list) -> None:
+        logger.debug("Dispatching batch of %d image(s)", len(batch))
+        now = time.perf_counter()
+        for _, _, queued_at in batch:
+            QUEUE_WAIT.observe(now - queued_at, queue="batch")
+        BATCH_SIZE.observe(len(batch))
+        try:
+            results = await self._run_batch([image for image, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._in_flight.release()
+
+        for (_, future, _), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
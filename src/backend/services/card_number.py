@@ -1,122 +1,320 @@
-import re
+import logging
+import random
+from dataclasses import replace
 
+import cv2
 import numpy as np
-from paddleocr import PaddleOCR
 
-from core.logging_config import get_logger
+from core.config import Settings
+from core.logging_config import get_logger, mask_digit_groups, mask_pan
+from core.metrics import CASCADE_TIERS, DETECTION_PROFILE_RUNS, OUTCOMES, record, timed_stage
+from services.detection_profiles import select_detection_profile
+from services.line_clustering import CardCandidate, find_card_candidates, select_disjoint
+from services.ocr_backend import OcrBackend, create_ocr_backend
+from services.postprocessing import PAN_LENGTHS, CardNumberValidator, fits_layout, luhn_valid, match_layout, normalize_digits
+from services.preprocessing import preprocess_image
 
 
 logger = get_logger(__name__)
 
 
 class CardNumberExtractor:
-    def __init__(self, threshold: int = 10):
-        self.threshold: int = threshold  # Acceptable Y-difference for grouping digits
-        self.ocr = PaddleOCR(use_angle_cls=True, lang='en')
+    def __init__(self, line_tolerance: float = 0.5, max_side: int | None = None, detect_card: bool = False, debug_sample_rate: float = 0.0,
+                 luhn_policy: str = "reject", ocr_backend: str = "paddle", backend_options: dict | None = None,
+                 det_model_dir: str | None = None, cls_model_dir: str | None = None, rec_model_dir: str | None = None,
+                 cascade: bool = False, cascade_min_confidence: float = 0.9,
+                 fast_det_model_dir: str | None = None, fast_rec_model_dir: str | None = None, adaptive_detection: bool = False):
+        self.line_tolerance = line_tolerance  # Acceptable offset between digit groups of a line, relative to text height
+        self.debug_sample_rate = debug_sample_rate  # Share of raw OCR results written to the DEBUG log
+        self.max_side = max_side  # Uploads are downscaled to this longest side before OCR
+        self.detect_card = detect_card  # Crop to the card rectangle before OCR
+        self.adaptive_detection = adaptive_detection  # Detection size and thresholds chosen per image from its size
+        self.validator = CardNumberValidator(luhn_policy)  # Luhn and brand checks of candidate numbers
+
+        self.cascade_min_confidence = cascade_min_confidence  # Fast-tier reads below this go to the full tier
+
+        # Full pipeline with angle classification; Paddle model dirs default to the PaddleOCR English models
+        backend_options = backend_options or {}
+        self.ocr: OcrBackend = create_ocr_backend(ocr_backend, use_angle_cls=True, det_model_dir=det_model_dir,
+                                                  cls_model_dir=cls_model_dir, rec_model_dir=rec_model_dir, **backend_options)
+        # Cascade tiers, cheapest first: the fast tier skips angle classification and uses lighter models if given
+        self.tiers = [("full", self.ocr)]
+        if cascade:
+            fast_ocr = create_ocr_backend(ocr_backend, use_angle_cls=False, det_model_dir=fast_det_model_dir or det_model_dir,
+                                          rec_model_dir=fast_rec_model_dir or rec_model_dir, **backend_options)
+            self.tiers.insert(0, ("fast", fast_ocr))
+
+    @classmethod
+    def from_settings(cls, settings: Settings) -> "CardNumberExtractor":
+        """Build the extractor configured by the service settings"""
+        backend_options = {}
+        if settings.ocr_backend == "onnx":
+            backend_options = {
+                "int8": settings.onnx_int8,
+                "intra_op_threads": settings.onnx_intra_op_threads,
+                "inter_op_threads": settings.onnx_inter_op_threads,
+                "char_dict_path": settings.onnx_char_dict_path,
+            }
+        return cls(
+            max_side=settings.preprocess_max_side,
+            detect_card=settings.preprocess_detect_card,
+            debug_sample_rate=settings.ocr_debug_sample_rate,
+            luhn_policy=settings.luhn_policy,
+            ocr_backend=settings.ocr_backend,
+            backend_options=backend_options,
+            det_model_dir=settings.ocr_det_model_dir,
+            cls_model_dir=settings.ocr_cls_model_dir,
+            rec_model_dir=settings.ocr_rec_model_dir,
+            cascade=settings.cascade_enabled,
+            cascade_min_confidence=settings.cascade_min_confidence,
+            fast_det_model_dir=settings.cascade_fast_det_model_dir,
+            fast_rec_model_dir=settings.cascade_fast_rec_model_dir,
+            adaptive_detection=settings.adaptive_detection,
+        )
+
+    def warm_up(self, image) -> None:
+        """Run every cascade tier once so that none of them pays its first-call cost on a request"""
+        prep = preprocess_image(image, self.max_side, self.detect_card)
+        for _, ocr in self.tiers:
+            self._run_ocr([prep.image], ocr)
 
     def extract_card_number(self, image) -> tuple[str | None, list | None, float | None]:
         """Extract credit card number from image bytes"""
+        return self.extract_card_numbers([image])[0]
+
+    def extract_card_numbers(self, images: list) -> list[tuple[str | None, list | None, float | None]]:
+        """Extract credit card numbers from several images with one batched OCR pass"""
+        logger.debug("Running OCR on batch of %d image(s)", len(images))
+        preprocessed = [preprocess_image(image, self.max_side, self.detect_card) for image in images]
 
-        logger.debug("Running OCR on image")
+        outputs = [(None, None, None)] * len(images)
+        pending = list(range(len(images)))
+        for tier, ocr in self.tiers:
+            final = tier == self.tiers[-1][0]
+            results, alternatives = self._run_ocr([preprocessed[i].image for i in pending], ocr)
+            escalated = []
+            for index, result, options in zip(pending, results, alternatives):
+                card_number, bbox, confidence, outcome, repaired = self._read_result(result, options)
+                # Earlier tiers only keep confident reads that pass the checksum as read: a digit repaired from the
+                # recognizer's alternatives (LUHN_POLICY=repair) is a guess, which the full pipeline may read without guessing
+                confident = card_number and not repaired and confidence >= self.cascade_min_confidence and luhn_valid(card_number)
+                if not final and not confident:
+                    escalated.append(index)
+                    continue
+                if len(self.tiers) > 1:
+                    record(CASCADE_TIERS, 1, tier=tier, result="accepted" if card_number else "not_found")
+                record(OUTCOMES, 1, outcome=outcome)
+                if bbox is not None:
+                    # Report the box in the coordinates of the uploaded image
+                    bbox = preprocessed[index].map_box(bbox)
+                outputs[index] = (card_number, bbox, confidence)
+
+            if escalated:
+                logger.debug("Escalating %d image(s) from the %s tier", len(escalated), tier)
+                record(CASCADE_TIERS, len(escalated), tier=tier, result="escalated")
+            pending = escalated
+            if not pending:
+                break
+        return outputs
+
+    def extract_all_card_numbers(self, image) -> list[tuple[str, list, float]]:
+        """
+        Extract every card number in an image, e.g. a scanned page holding several cards,
+        with a single OCR pass. Results are ranked by confidence.
+        """
+        # Cropping to one card rectangle would hide the others
+        prep = preprocess_image(image, self.max_side, detect_card=False)
+        results, alternatives = self._run_ocr([prep.image])
+        with timed_stage("postprocess"):
+            candidates = select_disjoint(self._valid_candidates(self._normalize(results[0]), alternatives[0]))
+        logger.info("Found %d card number(s) in the image", len(candidates))
+        record(OUTCOMES, 1, outcome="multi_match" if candidates else "not_found")
+        return [(c.number, prep.map_box(c.bbox), c.confidence) for c in candidates]
+
+    def read_frame(self, image) -> tuple[str | None, list | None, list[float] | None]:
+        """
+        Read the digits of the most likely card number in one frame of a stream, without validation,
+        so that a frame with a misread digit still contributes its other digits to cross-frame voting.
+        Uses the cheapest cascade tier: the vote across frames makes up for single-frame errors.
+
+        Returns:
+            Digits, box in the frame's coordinates and one confidence per digit
+        """
+        prep = preprocess_image(image, self.max_side, self.detect_card)
+        results, _ = self._run_ocr([prep.image], self.tiers[0][1])
+        result = self._normalize(results[0])
+        with timed_stage("postprocess"):
+            for box, (text, conf) in result:
+                digits = match_layout(text)
+                if digits:
+                    return digits, prep.map_box(box), [conf] * len(digits)
+            for candidate in find_card_candidates(result, PAN_LENGTHS, self.line_tolerance):
+                if fits_layout([len(text) for text, _ in candidate.groups]):
+                    confidences = [conf for text, conf in candidate.groups for _ in text]
+                    return candidate.number, prep.map_box(candidate.bbox), confidences
+        return None, None, None
+
+    def extract_card_number_from_strip(self, image, split_groups: bool = False) -> tuple[str | None, list | None, float | None]:
+        """
+        Read the card number from an image already cropped to the number line.
+        Only the recognition model runs: no text detection and no angle classification.
+        With `split_groups` the strip is cut into four equal windows, one per 4-digit group.
+        """
         if image.mode != 'RGB':
-            logger.debug("Converting image to RGB mode")
             image = image.convert('RGB')
+        strip = np.array(image)
+        height, width = strip.shape[:2]
 
-        image_np = np.array(image)
-        result = self.ocr.ocr(image_np, cls=True)[0]
-        print(result)
-        logger.info(f"OCR result: {result}")
-        # First try to find a complete 16-digit number
-        logger.debug("Searching for complete 16-digit card number")
-        full_card_number, bbox, confidence = self._find_full_card_number(result)
-        if full_card_number:
-            logger.info(f"Found complete 16-digit card number: {full_card_number[:4]}****{full_card_number[-4:]}")
-            return full_card_number, bbox, confidence
-
-        # If no complete number found, try to assemble from 4-digit groups
-        logger.debug("No complete number found, attempting to assemble from 4-digit groups")
-        return self._assemble_from_digit_groups(result)
-
-    def _find_full_card_number(self, ocr_result: list) -> tuple[str | None, list | None, float | None]:
-        """Look for a complete 16-digit number in the OCR results"""
-        for box, (text, conf) in ocr_result:
-            # Remove spaces and check if it's a 16-digit number
-            cleaned_text = text.replace(" ", "")
-            if re.fullmatch(r'\d{16}', cleaned_text):
-                logger.debug(f"Detected complete 16-digit card number with confidence: {conf}")
-                return cleaned_text, box, conf
-        return None, None, None
+        windows = 4 if split_groups else 1
+        edges = [round(i * width / windows) for i in range(windows + 1)]
+        boxes = [[[left, 0], [right, 0], [right, height], [left, height]] for left, right in zip(edges, edges[1:])]
+        crops = [strip[:, left:right] for left, right in zip(edges, edges[1:])]
+
+        logger.debug("Running recognition only on %d strip window(s)", len(crops))
+        with timed_stage("recognition"):
+            rec_res = self.ocr.recognize(crops)
+        # Same layout as a detection + recognition result, so the usual post-processing applies
+        result = [[box, (text.replace(" ", ""), conf)] for box, (text, conf, _) in zip(boxes, rec_res)]
+        alternatives = [[choices for char, choices in zip(text, options) if char != " "] if len(options) == len(text) else []
+                        for text, _, options in rec_res]
+        return self._postprocess(result, alternatives)
 
-    def _assemble_from_digit_groups(self, ocr_result: list) -> tuple[str | None, list | None, float | None]:
-        """Assemble card number from 4-digit groups"""
-        # Extract 4-digit numbers with their vertical positions
-        digits_with_y = self._extract_digit_groups(ocr_result)
-        logger.debug(f"Found {len(digits_with_y)} 4-digit groups")
-
-        if len(digits_with_y) < 4:
-            logger.warning("Not enough 4-digit groups found to form a card number")
-            return None, None, None
-
-        # Group digits on the same line and assemble card number
-        return self._group_digits_by_position(digits_with_y)
-
-    def _extract_digit_groups(self, ocr_result: list) -> list[tuple[str, float, list, float]]:
-        """Extract all 4-digit groups with their vertical center positions"""
-        digits_with_y = []
-        for box, (text, conf) in ocr_result:
-            if re.fullmatch(r'\d{4}', text):
-                # Calculate average Y center of bounding box
-                y_coords = [point[1] for point in box]
-                avg_y = sum(y_coords) / len(y_coords)
-                logger.debug(f"Found 4-digit group: {text} at y-position: {avg_y:.2f}")
-                digits_with_y.append((text, avg_y, box, conf))
-        return digits_with_y
-
-    def _group_digits_by_position(self, digits_with_y: list[tuple[str, float, list, float]]) -> tuple[str | None, list | None, float | None]:
-        """Group 4-digit numbers that appear on the same line"""
-        used = set()
-
-        for i, (text1, y1, box1, conf1) in enumerate(digits_with_y):
-            if i in used:
+    def _run_ocr(self, images_np: list[np.ndarray], ocr: OcrBackend | None = None) -> tuple[list[list], list[list]]:
+        """
+        Run text detection on each image, then angle classification and recognition
+        on the text crops of all images at once so the models see a full batch.
+        Detection stays per image because inputs have different shapes, and with adaptive detection
+        its input size and box thresholds follow each image's size.
+        `ocr` is the backend of a cascade tier, the full pipeline by default.
+
+        Returns:
+            OCR result of each image, as [box, (text, confidence)] items, and the per-character
+            alternatives of each of those items (see `ctc_decode`)
+        """
+        ocr = ocr or self.ocr
+        crops, owners, boxes = [], [], []
+        for index, image_np in enumerate(images_np):
+            profile = None
+            if self.adaptive_detection:
+                profile = select_detection_profile(image_np.shape[1], image_np.shape[0])
+                record(DETECTION_PROFILE_RUNS, 1, profile=profile.name)
+            with timed_stage("detection"):
+                dt_boxes = ocr.detect(image_np, profile)
+            if dt_boxes is None:
                 continue
+            # Reading order: top to bottom, then left to right
+            for box in sorted(dt_boxes, key=lambda b: (b[0][1], b[0][0])):
+                crops.append(self._crop_text_region(image_np, box))
+                owners.append(index)
+                boxes.append(box)
 
-            # Build a group with matching Y positions
-            group = [(text1, box1, conf1)]
-            used.add(i)
+        results = [[] for _ in images_np]
+        alternatives = [[] for _ in images_np]
+        if not crops:
+            return results, alternatives
 
-            # Find all other digits on the same line
-            for j, (text2, y2, box2, conf2) in enumerate(digits_with_y):
-                if j != i and j not in used and abs(y1 - y2) <= self.threshold:
-                    group.append((text2, box2, conf2))
-                    used.add(j)
+        if ocr.use_angle_cls:
+            with timed_stage("classification"):
+                crops = ocr.classify(crops)
+        with timed_stage("recognition"):
+            rec_res = ocr.recognize(crops)
 
-            if len(group) == 4:
-                # Sort left to right by the X of the first corner
-                group_sorted = sorted(group, key=lambda x: x[1][0][0])
-                card_number = ''.join([g[0] for g in group_sorted])
+        for index, box, (text, conf, options) in zip(owners, boxes, rec_res):
+            if conf >= ocr.drop_score:
+                results[index].append([box.tolist(), (text, conf)])
+                alternatives[index].append(options)
+        return results, alternatives
 
-                # Combine all bounding boxes
-                all_points = []
-                for _, box, _ in group_sorted:
-                    all_points.extend(box)
+    @staticmethod
+    def _crop_text_region(image_np: np.ndarray, box: np.ndarray) -> np.ndarray:
+        """Warp a detected quadrilateral to an upright rectangle"""
+        points = box.astype(np.float32)
+        width = int(max(np.linalg.norm(points[0] - points[1]), np.linalg.norm(points[2] - points[3])))
+        height = int(max(np.linalg.norm(points[0] - points[3]), np.linalg.norm(points[1] - points[2])))
+        target = np.float32([[0, 0], [width, 0], [width, height], [0, height]])
+        matrix = cv2.getPerspectiveTransform(points, target)
+        crop = cv2.warpPerspective(image_np, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE, flags=cv2.INTER_CUBIC)
+        # Vertical text lines are rotated to read horizontally
+        if height > 0 and height / max(width, 1) >= 1.5:
+            crop = np.rot90(crop)
+        return crop
 
-                # Create a bounding box that encompasses all digit groups
-                min_x = min(point[0] for point in all_points)
-                min_y = min(point[1] for point in all_points)
-                max_x = max(point[0] for point in all_points)
-                max_y = max(point[1] for point in all_points)
+    def _postprocess(self, result: list, alternatives: list | None = None) -> tuple[str | None, list | None, float | None]:
+        """Find the card number in the OCR result of a single image"""
+        card_number, bbox, confidence, outcome, _ = self._read_result(result, alternatives)
+        record(OUTCOMES, 1, outcome=outcome)
+        return card_number, bbox, confidence
 
-                combined_bbox = [[min_x, min_y], [max_x, min_y], [max_x, max_y], [min_x, max_y]]
+    def _read_result(self, result: list, alternatives: list | None = None) -> tuple[str | None, list | None, float | None, str, bool]:
+        """
+        Find the card number in the OCR result of a single image.
+        Also returns how it was found and whether a digit was repaired to pass validation.
+        `alternatives` holds the per-character alternatives of each OCR item, used by the `repair` policy.
+        """
+        if self.debug_sample_rate and logger.isEnabledFor(logging.DEBUG) and random.random() < self.debug_sample_rate:
+            # Card numbers may be read as separate 4-digit boxes, which the card number masking doesn't recognize
+            logger.debug("OCR result: %s", mask_digit_groups(str(result)))
+        with timed_stage("postprocess"):
+            result = self._normalize(result)
+            # First try to find a complete number in a single box
+            logger.debug("Searching for complete card number")
+            full_card_number, bbox, confidence, repaired = self._find_full_card_number(result, alternatives)
+            if full_card_number:
+                logger.info("Found complete card number: %s", mask_pan(full_card_number))
+                return full_card_number, bbox, confidence, "full_match", repaired
 
-                # Calculate mean confidence
-                mean_confidence = sum(g[2] for g in group_sorted) / len(group_sorted)
+            # If no complete number found, try to assemble from digit groups on one line
+            logger.debug("No complete number found, attempting to assemble from digit groups")
+            card_number, bbox, confidence, repaired = self._assemble_from_digit_groups(result, alternatives)
+            return card_number, bbox, confidence, "group_assembly" if card_number else "not_found", repaired
 
-                logger.info(f"Assembled 16-digit card number: {card_number[:4]}****{card_number[-4:]} with confidence: {mean_confidence:.4f}")
-                return card_number, combined_bbox, mean_confidence
+    def _normalize(self, ocr_result: list) -> list:
+        """Turn letters read in place of digits back into digits"""
+        return [[box, (normalize_digits(text), conf)] for box, (text, conf) in ocr_result]
 
-        logger.warning("Could not assemble a complete card number from 4-digit groups")
-        return None, None, None
+    def _find_full_card_number(self, ocr_result: list, alternatives: list | None = None) -> tuple[str | None, list | None, float | None, bool]:
+        """Look for a complete card number, in one of the standard layouts, in a single OCR box; also returns whether it was repaired"""
+        for index, (box, (text, conf)) in enumerate(ocr_result):
+            digits = match_layout(text)
+            if digits is None:
+                continue
+            card_number = self.validator.check(digits, self._digit_alternatives(text, alternatives[index]) if alternatives else None)
+            if card_number:
+                logger.debug("Detected complete card number with confidence: %s", conf)
+                return card_number, box, conf, card_number != digits
+        return None, None, None, False
+
+    def _assemble_from_digit_groups(self, ocr_result: list, alternatives: list | None = None) -> tuple[str | None, list | None, float | None, bool]:
+        """Assemble card number from digit groups read on the same text line; also returns whether it was repaired"""
+        candidates = self._valid_candidates(ocr_result, alternatives)
+        logger.debug("Found %d valid candidate card number(s) from digit groups", len(candidates))
+        if not candidates:
+            logger.warning("Could not assemble a valid card number from digit groups")
+            return None, None, None, False
 
+        best = candidates[0]
+        logger.info("Assembled card number: %s with confidence: %.4f", mask_pan(best.number), best.confidence)
+        # The groups keep the digits as read
+        return best.number, best.bbox, best.confidence, best.number != "".join(text for text, _ in best.groups)
+
+    def _valid_candidates(self, ocr_result: list, alternatives: list | None = None) -> list[CardCandidate]:
+        """Numbers from digit groups split like a standard layout that pass validation, best first"""
+        valid = []
+        for candidate in find_card_candidates(ocr_result, PAN_LENGTHS, self.line_tolerance):
+            if not fits_layout([len(text) for text, _ in candidate.groups]):
+                continue
+            options = None
+            if alternatives:
+                groups = [self._digit_alternatives(ocr_result[i][1][0], alternatives[i]) for i in candidate.box_indices]
+                options = None if None in groups else [choices for group in groups for choices in group]
+            card_number = self.validator.check(candidate.number, options)
+            if card_number:
+                valid.append(replace(candidate, number=card_number))
+        return valid
 
-# Create a singleton instance
-card_number_extractor = CardNumberExtractor()
+    @staticmethod
+    def _digit_alternatives(text: str, options: list) -> list | None:
+        """Alternatives of the digits of a recognized text, without those of separators; None when the backend gave none"""
+        if not options or len(options) != len(text):
+            return None
+        return [choices for char, choices in zip(text, options) if char.isdigit()]
@@ -0,0 +1,33 @@
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class DetectionProfile:
+    """Text detection input size and DB box thresholds used for images up to a given size"""
+    name: str
+    max_side: int | None  # Longest image side the profile applies to; None for any larger image
+    limit_side_len: int  # Images are downscaled so that their longest side is at most this before detection
+    thresh: float = 0.3  # Probability above which a pixel is text
+    box_thresh: float = 0.6  # Lowest mean probability of a kept text box
+    unclip_ratio: float = 1.5  # How much detected text regions are expanded
+
+
+# Smallest first. PaddleOCR's defaults (960, 0.3, 0.6, 1.5) are the medium profile.
+DETECTION_PROFILES = (
+    # Pre-cropped cards and number strips, detected at their own size: looser boxes, since a few-pixel-high
+    # embossed digit scores lower and loses its edges to a tight unclip
+    DetectionProfile("small", max_side=640, limit_side_len=640, box_thresh=0.5, unclip_ratio=1.8),
+    DetectionProfile("medium", max_side=1280, limit_side_len=960),
+    # Photos of a card on a desk or in a hand: the card number stays legible at 960, and a stricter box score
+    # drops the faint background text that would otherwise each cost a recognition crop
+    DetectionProfile("large", max_side=None, limit_side_len=960, box_thresh=0.65),
+)
+
+
+def select_detection_profile(width: int, height: int) -> DetectionProfile:
+    """First profile whose size bound covers the longest side of the image"""
+    longest = max(width, height)
+    for profile in DETECTION_PROFILES:
+        if profile.max_side is None or longest <= profile.max_side:
+            return profile
+    return DETECTION_PROFILES[-1]
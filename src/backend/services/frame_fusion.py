@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from PIL import Image
+
+from services.postprocessing import luhn_valid
+
+
+def dhash(image: Image.Image, hash_size: int = 8) -> int:
+    """Difference hash: brightness gradients of a tiny grayscale thumbnail, as a hash_size² bit integer"""
+    thumbnail = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BILINEAR)
+    pixels = list(thumbnail.getdata())
+    bits = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            bits = (bits << 1) | (left > pixels[row * (hash_size + 1) + col + 1])
+    return bits
+
+
+class DuplicateFrameFilter:
+    """Flags frames that look like the last frame read by OCR, so a still camera costs one read"""
+
+    def __init__(self, max_distance: int = 4):
+        self.max_distance = max_distance  # Hash bits that may differ for two frames to count as duplicates
+        self._last_hash: int | None = None
+
+    def is_duplicate(self, frame_hash: int) -> bool:
+        return self._last_hash is not None and bin(frame_hash ^ self._last_hash).count("1") <= self.max_distance
+
+    def remember(self, frame_hash: int) -> None:
+        """Record the hash of a frame once it was read; frames that were never read don't make later ones duplicates"""
+        self._last_hash = frame_hash
+
+
+class FrameFusion:
+    """
+    Fuses card number readings of successive frames by confidence-weighted voting, digit by digit.
+
+    Readings vote within their length only, since a missed or extra digit shifts every later position.
+    The fused number is stable once it came out the same after `stable_frames` readings in a row
+    and passes the Luhn check.
+    """
+
+    def __init__(self, stable_frames: int = 3):
+        self.stable_frames = stable_frames
+        # votes[length][position][digit] = summed confidence
+        self._votes: dict[int, list[dict[str, float]]] = {}
+        self._readings: dict[int, int] = defaultdict(int)
+        self._bboxes: dict[str, list] = {}  # Latest box of each number read
+        self._last_bbox: list | None = None
+        self._number: str | None = None
+        self._streak = 0
+        self._last_read_found = False  # Whether the latest frame read had digits
+
+    def add(self, digits: str, bbox: list, confidences: list[float]) -> None:
+        """Add the reading of one frame: its digits, box and one confidence per digit"""
+        votes = self._votes.setdefault(len(digits), [defaultdict(float) for _ in digits])
+        for position, (digit, confidence) in enumerate(zip(digits, confidences)):
+            votes[position][digit] += confidence
+        self._readings[len(digits)] += 1
+        self._bboxes[digits] = bbox
+        self._last_bbox = bbox
+
+        self._last_read_found = True
+
+        number = self.number
+        self._streak = self._streak + 1 if number == self._number else 1
+        self._number = number
+
+    def add_miss(self) -> None:
+        """Note a frame read without finding digits, so that its duplicates don't count as readings"""
+        self._last_read_found = False
+
+    def repeat(self) -> None:
+        """
+        Count a frame that duplicates the latest frame read: it would be read the same, so it extends the
+        streak of the fused number without voting again
+        """
+        if self._last_read_found:
+            self._streak += 1
+
+    @property
+    def number(self) -> str | None:
+        """Current fused number: the most voted digit at each position of the most read length"""
+        if not self._votes:
+            return None
+        length = max(self._votes, key=lambda n: (self._readings[n], n))
+        return "".join(max(position, key=position.get) for position in self._votes[length])
+
+    @property
+    def confidence(self) -> float | None:
+        """Mean per-frame confidence of the winning digits, counting frames that read another digit as zero"""
+        number = self.number
+        if number is None:
+            return None
+        votes, readings = self._votes[len(number)], self._readings[len(number)]
+        return sum(position[digit] for position, digit in zip(votes, number)) / (readings * len(number))
+
+    @property
+    def bbox(self) -> list | None:
+        """Box of the latest frame read exactly as the fused number, or of the latest reading"""
+        number = self.number
+        if number is None:
+            return None
+        return self._bboxes.get(number, self._last_bbox)
+
+    @property
+    def stable(self) -> bool:
+        return self._streak >= self.stable_frames and luhn_valid(self._number)
@@ -0,0 +1,94 @@
+from io import BytesIO
+from typing import BinaryIO
+
+from fastapi import UploadFile
+from PIL import Image
+
+from core.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Leading bytes of the image formats accepted for extraction
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "JPEG"),
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"BM", "BMP"),
+    (b"II*\x00", "TIFF"),
+    (b"MM\x00*", "TIFF"),
+)
+
+
+class ImageValidationError(Exception):
+    """Upload rejected before decoding; `status_code` is the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def sniff_image_format(head: bytes) -> str | None:
+    """Identify the image format from the first bytes of a file"""
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "WEBP"
+    for signature, image_format in _SIGNATURES:
+        if head.startswith(signature):
+            return image_format
+    return None
+
+
+async def read_upload(file: UploadFile, max_bytes: int) -> bytes:
+    """Read an uploaded image chunk by chunk, rejecting non-images and oversized files early"""
+    if file.size is not None and file.size > max_bytes:
+        raise ImageValidationError(f"File is larger than {max_bytes} bytes", status_code=413)
+
+    head = await file.read(16)
+    if sniff_image_format(head) is None:
+        raise ImageValidationError("Unsupported file type, expected an image", status_code=415)
+
+    chunks = [head]
+    total = len(head)
+    while chunk := await file.read(CHUNK_SIZE):
+        total += len(chunk)
+        if total > max_bytes:
+            raise ImageValidationError(f"File is larger than {max_bytes} bytes", status_code=413)
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def read_limited(fileobj: BinaryIO, max_bytes: int) -> bytes:
+    """Read a file object, refusing to hold more than `max_bytes` in memory"""
+    data = fileobj.read(max_bytes + 1)
+    if len(data) > max_bytes:
+        raise ImageValidationError(f"File is larger than {max_bytes} bytes", status_code=413)
+    return data
+
+
+def open_image(data: bytes, max_pixels: int, target_side: int | None = None) -> Image.Image:
+    """
+    Open an image without decoding its pixels yet.
+
+    Args:
+        data: Encoded image
+        max_pixels: Largest accepted width * height, checked from the header before decoding
+        target_side: Longest side needed for inference; JPEGs are decoded at the smallest
+            DCT scale that still covers it (draft mode), skipping most of the decode work
+    """
+    if sniff_image_format(data[:16]) is None:
+        raise ImageValidationError("Unsupported file type, expected an image", status_code=415)
+
+    image = Image.open(BytesIO(data))
+    width, height = image.size
+    if width * height > max_pixels:
+        raise ImageValidationError(f"Image has {width * height} pixels, more than the {max_pixels} allowed", status_code=413)
+
+    image.info["original_size"] = (width, height)
+    if target_side and image.format == "JPEG" and max(width, height) > target_side:
+        scale = target_side / max(width, height)
+        image.draft("RGB", (round(width * scale), round(height * scale)))
+        logger.debug("Decoding JPEG in draft mode at %s instead of %s", image.size, (width, height))
+    return image
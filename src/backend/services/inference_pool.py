@@ -0,0 +1,270 @@
+import asyncio
+import multiprocessing
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+from PIL import Image
+
+from core.config import settings
+from core.logging_config import get_logger
+from core.metrics import QUEUE_WAIT, Gauge, apply_observations, collect_observations, registry
+from services.batching import MicroBatcher
+from services.card_number import CardNumberExtractor
+
+
+logger = get_logger(__name__)
+
+# Per-worker state: one extractor per thread (thread pool) or per process (process pool)
+_worker_state = threading.local()
+
+# Extractors loaded before serve.py forks the serving processes; thread workers take one each instead of loading their own
+_preloaded_extractors: list[CardNumberExtractor] = []
+
+
+class InferencePoolSaturatedError(RuntimeError):
+    """Raised when the inference pool has no free worker or queue slot"""
+
+
+def preload_extractors(count: int) -> None:
+    """
+    Load `count` extractors in the current process, for the thread workers of processes forked from it.
+    Forked processes share the models' memory pages with this one until they write to them.
+    """
+    logger.info("Preloading %d OCR model(s) for forked workers", count)
+    _preloaded_extractors.extend(CardNumberExtractor.from_settings(settings) for _ in range(count))
+
+
+def _init_worker(warm_up_image: str | None, barrier) -> None:
+    """Build the OCR model owned by the current worker and optionally run a first inference"""
+    logger.info("Loading OCR model for inference worker")
+    _worker_state.barrier = barrier
+    try:
+        if _preloaded_extractors:
+            _worker_state.extractor = _preloaded_extractors.pop()
+        else:
+            _worker_state.extractor = CardNumberExtractor.from_settings(settings)
+        if warm_up_image:
+            logger.info("Warming up inference worker on %s", warm_up_image)
+            with Image.open(warm_up_image) as image:
+                _worker_state.extractor.warm_up(image)
+    except Exception:
+        # Release the workers already waiting for this one
+        barrier.abort()
+        raise
+
+
+def _extract_card_number_from_strip(image, split_groups: bool) -> tuple[str | None, list | None, float | None]:
+    """Recognition-only job executed inside a worker"""
+    return _worker_state.extractor.extract_card_number_from_strip(image, split_groups)
+
+
+def _wait_for_all_workers() -> None:
+    """
+    Startup job submitted once per worker. Each call blocks on a shared barrier,
+    so all of them return only once every worker has finished initialising.
+    """
+    _worker_state.barrier.wait()
+
+
+def _run_job(fn, submitted_at: float, *args):
+    """
+    Run a job inside a worker. Metrics observed during the job are collected
+    and returned, so they reach the serving process in process pool mode too.
+    """
+    queue_wait = time.time() - submitted_at
+    with collect_observations() as observations:
+        result = fn(*args)
+    return result, queue_wait, observations
+
+
+def _extract_card_number(image) -> tuple[str | None, list | None, float | None]:
+    """Job executed inside a worker"""
+    return _worker_state.extractor.extract_card_number(image)
+
+
+def _extract_card_numbers(images: list) -> list[tuple[str | None, list | None, float | None]]:
+    """Batched job executed inside a worker"""
+    return _worker_state.extractor.extract_card_numbers(images)
+
+
+def _extract_all_card_numbers(image) -> list[tuple[str, list, float]]:
+    """Multi-card job executed inside a worker"""
+    return _worker_state.extractor.extract_all_card_numbers(image)
+
+
+def _read_frame(image) -> tuple[str | None, list | None, list[float] | None]:
+    """Stream frame job executed inside a worker"""
+    return _worker_state.extractor.read_frame(image)
+
+
+class InferencePool:
+    """Runs OCR jobs off the event loop on a bounded pool of workers"""
+
+    def __init__(self, executor_type: str = "thread", max_workers: int = 1, max_queue_size: int = 8,
+                 batch_max_size: int = 1, batch_max_wait_ms: float = 5.0, warm_up_image: str | None = None):
+        self.executor_type = executor_type
+        self.warm_up_image = warm_up_image
+        self.max_workers = max(1, max_workers)
+        self.max_queue_size = max(0, max_queue_size)
+        self.batch_max_size = max(1, batch_max_size)
+        self.batch_max_wait_ms = batch_max_wait_ms
+        self._executor: Executor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._batcher: MicroBatcher | None = None
+        self._pending = 0
+        # Interactive jobs running or queued; background jobs wait for none to be left
+        self._interactive = 0
+        self._interactive_idle: asyncio.Event | None = None
+        self.ready = False
+        self.load_error: str | None = None
+
+    @property
+    def capacity(self) -> int:
+        """Number of jobs allowed in flight: running plus queued"""
+        return self.max_workers + self.max_queue_size
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def start(self) -> None:
+        if self._executor is not None:
+            return
+        logger.info("Starting %s inference pool with %d worker(s) and queue size %d",
+                    self.executor_type, self.max_workers, self.max_queue_size)
+        if self.executor_type == "process":
+            # Spawn keeps the Paddle runtime of the parent out of the children
+            mp_context = multiprocessing.get_context("spawn")
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=mp_context,
+                initializer=_init_worker,
+                initargs=(self.warm_up_image, mp_context.Barrier(self.max_workers)),
+            )
+        else:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="inference",
+                initializer=_init_worker,
+                initargs=(self.warm_up_image, threading.Barrier(self.max_workers)),
+            )
+        self._slots = asyncio.Semaphore(self.capacity)
+        self._interactive_idle = asyncio.Event()
+        self._interactive_idle.set()
+
+        if self.batch_max_size > 1:
+            logger.info("Micro-batching up to %d images, waiting at most %s ms", self.batch_max_size, self.batch_max_wait_ms)
+            self._batcher = MicroBatcher(
+                lambda images: self.run(_extract_card_numbers, images, block=True),
+                max_batch_size=self.batch_max_size,
+                max_wait_ms=self.batch_max_wait_ms,
+                max_in_flight=self.max_workers,
+                max_queue_size=self.capacity * self.batch_max_size,
+            )
+            self._batcher.start()
+
+    async def load(self) -> None:
+        """Start every worker, load its model and run the warm-up inference, then mark the pool ready"""
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.gather(*[
+                loop.run_in_executor(self._executor, _wait_for_all_workers)
+                for _ in range(self.max_workers)
+            ])
+        except Exception as e:
+            self.load_error = str(e)
+            logger.error("Failed to load inference workers: %s", e, exc_info=True)
+            return
+        self.ready = True
+        logger.info("Inference pool is ready")
+
+    def shutdown(self) -> None:
+        if self._executor is None:
+            return
+        logger.info("Shutting down inference pool")
+        self.ready = False
+        if self._batcher is not None:
+            self._batcher.stop()
+            self._batcher = None
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        self._executor = None
+
+    async def run(self, fn, *args, block: bool = False):
+        """
+        Run `fn(*args)` in a worker.
+        Fails fast when the pool is saturated unless `block` is set, in which case it waits for a slot.
+        """
+        if self._executor is None:
+            raise RuntimeError("Inference pool is not started")
+        if not block and self._slots.locked():
+            raise InferencePoolSaturatedError(f"Inference pool is saturated ({self._pending} jobs in flight)")
+
+        async with self._slots:
+            self._interactive += 1
+            self._interactive_idle.clear()
+            try:
+                return await self._submit(fn, *args, queue="pool")
+            finally:
+                self._interactive -= 1
+                if not self._interactive:
+                    self._interactive_idle.set()
+
+    async def run_background(self, fn, *args):
+        """
+        Run `fn(*args)` in a worker at background priority: it is only submitted while no interactive job
+        is running or queued, so offline work delays a request by at most the background jobs already started.
+        Background jobs do not take queue slots, so they never make interactive requests fail with 503.
+        """
+        if self._executor is None:
+            raise RuntimeError("Inference pool is not started")
+        while self._interactive:
+            await self._interactive_idle.wait()
+        return await self._submit(fn, *args, queue="background")
+
+    async def _submit(self, fn, *args, queue: str):
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result, queue_wait, observations = await loop.run_in_executor(self._executor, _run_job, fn, time.time(), *args)
+        finally:
+            self._pending -= 1
+
+        QUEUE_WAIT.observe(queue_wait, queue=queue)
+        apply_observations(observations)
+        return result
+
+    async def extract_card_number(self, image, block: bool = False) -> tuple[str | None, list | None, float | None]:
+        if self._batcher is None:
+            return await self.run(_extract_card_number, image, block=block)
+        try:
+            return await self._batcher.submit(image, block=block)
+        except asyncio.QueueFull:
+            raise InferencePoolSaturatedError("Micro-batching queue is full")
+
+    async def extract_card_number_background(self, image) -> tuple[str | None, list | None, float | None]:
+        """Full extraction at background priority, for offline jobs"""
+        return await self.run_background(_extract_card_number, image)
+
+    async def extract_card_number_from_strip(self, image, split_groups: bool = False,
+                                             block: bool = False) -> tuple[str | None, list | None, float | None]:
+        return await self.run(_extract_card_number_from_strip, image, split_groups, block=block)
+
+    async def extract_all_card_numbers(self, image, block: bool = False) -> list[tuple[str, list, float]]:
+        return await self.run(_extract_all_card_numbers, image, block=block)
+
+    async def read_frame(self, image, block: bool = False) -> tuple[str | None, list | None, list[float] | None]:
+        return await self.run(_read_frame, image, block=block)
+
+
+# Create a singleton instance
+inference_pool = InferencePool(
+    executor_type=settings.inference_executor,
+    max_workers=settings.inference_workers,
+    max_queue_size=settings.inference_max_queue,
+    batch_max_size=settings.batch_max_size,
+    batch_max_wait_ms=settings.batch_max_wait_ms,
+    warm_up_image=settings.warm_up_image if settings.warm_up else None,
+)
+
+registry.register(Gauge("card_extractor_inference_pending", "Jobs running or queued on the inference pool", lambda: inference_pool.pending))
@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    total INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    job_id TEXT NOT NULL REFERENCES jobs(id),
+    seq INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    path TEXT,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result BLOB,
+    error TEXT,
+    finished_at REAL,
+    finish_order INTEGER,
+    owner TEXT,
+    lease_until REAL,
+    PRIMARY KEY (job_id, seq)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status, job_id, seq);
+CREATE INDEX IF NOT EXISTS items_finish_order ON items (job_id, finish_order);
+"""
+
+# Columns added after the first version of the schema, created on stores that lack them
+_ADDED_COLUMNS = {"owner": "TEXT", "lease_until": "REAL"}
+
+# Next number in a job's completion order; evaluated inside the statement that finishes the item
+_NEXT_FINISH_ORDER = "(SELECT COALESCE(MAX(finish_order), 0) + 1 FROM items WHERE job_id = ?)"
+
+
+class JobStore:
+    """
+    SQLite persistence of offline extraction jobs and their items, so that jobs survive a restart.
+    Item statuses: pending (waiting or to be retried), running, done (read, with or without a card number), failed.
+
+    Several processes (e.g. `serve.py --workers N`) may share one store file: every state change is a single
+    statement or an immediate transaction, and a running item is leased to the store that claimed it. The lease
+    is renewed while the item runs; once it expires, e.g. because its process died, any store may claim the item again.
+    """
+
+    def __init__(self, path: str, lease_seconds: float = 60):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"  # Identifies this store's leases
+        # Writers of other processes hold the database lock briefly; wait for them rather than fail
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(items)")}
+        for column, column_type in _ADDED_COLUMNS.items():
+            if column not in columns:
+                try:
+                    self._conn.execute(f"ALTER TABLE items ADD COLUMN {column} {column_type}")
+                except sqlite3.OperationalError:
+                    # Added by another process in the meantime
+                    pass
+        # One connection is shared by this process's threads
+        self._lock = threading.Lock()
+
+    def close(self) -> None:
+        # A call of a cancelled task may still be running in its thread
+        with self._lock:
+            self._conn.close()
+
+    def create_job(self, source: str, items: list[tuple[str, str | None, str | None]], job_id: str | None = None) -> str:
+        """
+        Store a new job. Its pending items can be claimed, by any process sharing the store, as soon as this returns.
+
+        Args:
+            source: What the job was submitted from, e.g. "manifest" or the archive name
+            items: (name, path, error) per image; items with an error are failed from the start
+            job_id: ID to store the job under, e.g. the one its files were already put under; a new one by default
+
+        Returns:
+            Job ID
+        """
+        job_id = job_id or uuid.uuid4().hex
+        now = time.time()
+        rows = []
+        finish_order = 0
+        for seq, (name, path, error) in enumerate(items):
+            # The job is new, so its completion order starts here
+            if error:
+                finish_order += 1
+            rows.append((job_id, seq, name, path, "failed" if error else "pending", error, now if error else None,
+                         finish_order if error else None))
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("INSERT INTO jobs (id, source, created_at, total) VALUES (?, ?, ?, ?)", (job_id, source, now, len(items)))
+                self._conn.executemany(
+                    "INSERT INTO items (job_id, seq, name, path, status, error, finished_at, finish_order) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return job_id
+
+    def get_job(self, job_id: str) -> dict | None:
+        """Job with its item counts by status"""
+        with self._lock:
+            job = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM items WHERE job_id = ? GROUP BY status", (job_id,)).fetchall())
+        return {**dict(job), **{status: counts.get(status, 0) for status in ("pending", "running", "done", "failed")}}
+
+    def claim_next(self) -> dict | None:
+        """
+        Lease the oldest pending item, jobs in submission order, to this store, mark it running and return it.
+        Running items whose lease expired, or that predate leases, are claimed again.
+        """
+        now = time.time()
+        with self._lock:
+            item = self._conn.execute(
+                "UPDATE items SET status = 'running', attempts = attempts + 1, owner = ?, lease_until = ? "
+                "WHERE rowid = (SELECT items.rowid FROM items JOIN jobs ON jobs.id = items.job_id "
+                "WHERE items.status = 'pending' OR (items.status = 'running' AND COALESCE(items.lease_until, 0) < ?) "
+                "ORDER BY jobs.created_at, items.seq LIMIT 1) RETURNING *",
+                (self.owner, now + self.lease_seconds, now)
+            ).fetchone()
+        return dict(item) if item is not None else None
+
+    def renew_leases(self) -> int:
+        """Extend the leases of the items this store is running; returns their number"""
+        with self._lock:
+            return self._conn.execute("UPDATE items SET lease_until = ? WHERE status = 'running' AND owner = ?",
+                                      (time.time() + self.lease_seconds, self.owner)).rowcount
+
+    def finish_item(self, job_id: str, seq: int, result: bytes | None = None, error: str | None = None) -> bool:
+        """
+        Store the outcome of an item this store is running: done with an (encrypted) result, or failed with an error.
+        Returns False when the item's lease was lost to another store, which then owns the outcome.
+        """
+        with self._lock:
+            return self._conn.execute(
+                f"UPDATE items SET status = ?, result = ?, error = ?, finished_at = ?, finish_order = {_NEXT_FINISH_ORDER}, "
+                "owner = NULL, lease_until = NULL WHERE job_id = ? AND seq = ? AND status = 'running' AND owner = ?",
+                ("failed" if error else "done", result, error, time.time(), job_id, job_id, seq, self.owner)
+            ).rowcount == 1
+
+    def retry_item(self, job_id: str, seq: int, error: str) -> None:
+        """Put a running item of this store back in the queue, keeping its last error"""
+        with self._lock:
+            self._conn.execute("UPDATE items SET status = 'pending', error = ?, owner = NULL, lease_until = NULL "
+                               "WHERE job_id = ? AND seq = ? AND status = 'running' AND owner = ?", (error, job_id, seq, self.owner))
+
+    def release_items(self) -> int:
+        """Put the items this store is running back in the queue, e.g. on shutdown; returns their number"""
+        with self._lock:
+            return self._conn.execute("UPDATE items SET status = 'pending', owner = NULL, lease_until = NULL "
+                                      "WHERE status = 'running' AND owner = ?", (self.owner,)).rowcount
+
+    def finished_items(self, job_id: str, after: int = 0, limit: int = 1000) -> list[dict]:
+        """Items of a job finished after the one numbered `after`, in completion order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, name, status, result, error, finish_order FROM items WHERE job_id = ? AND finish_order > ? "
+                "ORDER BY finish_order LIMIT ?", (job_id, after, limit)
+            ).fetchall()
+        return [dict(row) for row in rows]
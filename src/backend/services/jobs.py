@@ -0,0 +1,253 @@
+import asyncio
+import json
+import os
+import shutil
+import uuid
+from pathlib import Path
+from typing import BinaryIO
+
+from cryptography.fernet import Fernet
+
+from core.config import settings
+from core.logging_config import get_logger
+from core.metrics import JOB_ITEMS
+from services.archives import iter_archive
+from services.image_decoding import ImageValidationError, open_image, read_limited
+from services.inference_pool import inference_pool
+from services.job_store import JobStore
+
+
+logger = get_logger(__name__)
+
+# Seconds an idle worker waits before looking for items again; other processes sharing the store,
+# and expired leases, don't wake this process's workers
+POLL_INTERVAL = 5.0
+
+
+class JobSubmissionError(Exception):
+    """Raised when a job cannot be accepted; carries the HTTP status to answer with"""
+
+    def __init__(self, message: str, status_code: int = 400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class JobManager:
+    """
+    Runs offline extraction jobs: every image of a job is read on the inference pool at background priority,
+    retried on failure, and its result persisted, encrypted, in a SQLite store.
+
+    Store calls run in threads: while another process writes to the store they wait for its lock,
+    which must not hold up the requests of this process.
+    """
+
+    def __init__(self, jobs_dir: str, input_dir: str | None = None, concurrency: int = 2, max_attempts: int = 3,
+                 encryption_key: str | None = None, lease_seconds: float = 60):
+        self.jobs_dir = Path(jobs_dir)
+        self.input_dir = Path(input_dir).resolve() if input_dir else None  # Manifest paths must be under it
+        self.concurrency = max(1, concurrency)  # Images of all jobs being read at once
+        self.max_attempts = max(1, max_attempts)  # Reads of an image before it is marked failed
+        self.lease_seconds = lease_seconds  # How long a running item stays claimed by this process without renewal
+        self._encryption_key = encryption_key
+        self.store: JobStore | None = None
+        self._fernet: Fernet | None = None
+        self._workers: list[asyncio.Task] = []
+        self._heartbeat: asyncio.Task | None = None
+        self._wake: asyncio.Event | None = None
+
+    def start(self) -> None:
+        if self.store is not None:
+            return
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self._fernet = Fernet(self._load_key())
+        # Several server processes may share the store; items a dead process left running are claimed again once
+        # their lease expires
+        self.store = JobStore(str(self.jobs_dir / "jobs.sqlite3"), self.lease_seconds)
+        self._wake = asyncio.Event()
+        self._wake.set()
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+        self._heartbeat = asyncio.create_task(self._renew_leases())
+
+    async def stop(self) -> None:
+        tasks = self._workers + ([self._heartbeat] if self._heartbeat else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._workers, self._heartbeat = [], None
+        if self.store is not None:
+            # Items cancelled mid-read go back to the queue right away, for this or another process
+            released = await asyncio.to_thread(self.store.release_items)
+            if released:
+                logger.info("Released %d job item(s) interrupted by the shutdown", released)
+            await asyncio.to_thread(self.store.close)
+            self.store = None
+
+    def _load_key(self) -> bytes:
+        """
+        Results must stay readable across restarts, so without a configured key one is generated
+        once and kept next to the store, readable by the service user only.
+        """
+        if self._encryption_key:
+            return self._encryption_key.encode()
+        key_path = self.jobs_dir / "jobs.key"
+        if not key_path.exists():
+            # Written aside and linked into place, so that processes starting together all read one complete key
+            tmp_path = self.jobs_dir / f"jobs.key.{os.getpid()}"
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "wb") as f:
+                f.write(Fernet.generate_key())
+            try:
+                os.link(tmp_path, key_path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        return key_path.read_bytes().strip()
+
+    async def submit_manifest(self, paths: list[str]) -> str:
+        """Create a job reading images from local paths, which must lie under the configured input directory"""
+        if self.input_dir is None:
+            raise JobSubmissionError("Manifest jobs are disabled, set JOBS_INPUT_DIR to enable them", status_code=403)
+        if not paths:
+            raise JobSubmissionError("The manifest has no paths")
+        items = await asyncio.to_thread(self._manifest_items, paths)
+        job_id = await asyncio.to_thread(self.store.create_job, "manifest", items)
+        logger.info("Created job %s with %d image(s) from a manifest", job_id, len(items))
+        self._wake.set()
+        return job_id
+
+    def _manifest_items(self, paths: list[str]) -> list[tuple[str, str | None, str | None]]:
+        items = []
+        for path in paths:
+            resolved = (self.input_dir / path).resolve()
+            if not resolved.is_relative_to(self.input_dir):
+                raise JobSubmissionError(f"Path is outside the input directory: {path}", status_code=403)
+            items.append((path, str(resolved), None if resolved.is_file() else "File not found"))
+        return items
+
+    async def submit_archive(self, fileobj: BinaryIO, filename: str) -> str:
+        """Create a job from a zip/tar archive, unpacked to disk so that nothing is held in memory until it runs"""
+        # Archive items are resolved in the upload directory named after their job, which must be complete before
+        # the job is stored: another process may claim its items right away
+        job_id = uuid.uuid4().hex
+        upload_dir = self.jobs_dir / "uploads" / job_id
+        try:
+            items = await asyncio.to_thread(self._unpack_archive, fileobj, filename, upload_dir)
+            if not items:
+                raise JobSubmissionError("The archive has no files")
+            await asyncio.to_thread(self.store.create_job, filename, items, job_id)
+        except BaseException:
+            shutil.rmtree(upload_dir, ignore_errors=True)
+            raise
+        logger.info("Created job %s with %d image(s) from %s", job_id, len(items), filename)
+        self._wake.set()
+        return job_id
+
+    def _unpack_archive(self, fileobj: BinaryIO, filename: str, upload_dir: Path) -> list[tuple[str, str | None, str | None]]:
+        upload_dir.mkdir(parents=True)
+        items = []
+        for index, (member_name, data) in enumerate(iter_archive(fileobj, settings.max_upload_bytes)):
+            name = f"{filename}/{member_name}"
+            if data is None:
+                items.append((name, None, f"File is larger than {settings.max_upload_bytes} bytes"))
+                continue
+            # Members are stored under their index: archive names can't be trusted as paths
+            (upload_dir / f"{index:06d}").write_bytes(data)
+            items.append((name, f"{index:06d}", None))
+        return items
+
+    def _resolve(self, job_id: str, path: str) -> Path:
+        """Manifest items store absolute paths, archive items a file name in the job's upload directory"""
+        return Path(path) if os.path.isabs(path) else self.jobs_dir / "uploads" / job_id / path
+
+    async def _work(self) -> None:
+        while True:
+            item = await asyncio.to_thread(self.store.claim_next)
+            if item is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self._process(item)
+
+    async def _renew_leases(self) -> None:
+        """Keep the leases of running items while background reads wait behind interactive requests"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await asyncio.to_thread(self.store.renew_leases)
+
+    async def _process(self, item: dict) -> None:
+        job_id, seq = item["job_id"], item["seq"]
+        try:
+            data = await asyncio.to_thread(self._read_file, self._resolve(job_id, item["path"]))
+            image = open_image(data, settings.max_image_pixels, settings.preprocess_max_side)
+            card_number, bbox, confidence = await inference_pool.extract_card_number_background(image)
+        except (ImageValidationError, FileNotFoundError) as e:
+            # Retrying won't change the file
+            JOB_ITEMS.inc(result="failed")
+            await self._finish(job_id, seq, error=str(e))
+        except Exception as e:
+            if item["attempts"] < self.max_attempts:
+                logger.warning("Job %s item %d failed (attempt %d of %d), retrying: %s", job_id, seq, item["attempts"], self.max_attempts, e)
+                JOB_ITEMS.inc(result="retried")
+                await asyncio.to_thread(self.store.retry_item, job_id, seq, f"Error processing image: {str(e)}")
+                self._wake.set()
+            else:
+                logger.error("Job %s item %d failed after %d attempts: %s", job_id, seq, item["attempts"], e)
+                JOB_ITEMS.inc(result="failed")
+                await self._finish(job_id, seq, error=f"Error processing image: {str(e)}")
+        else:
+            JOB_ITEMS.inc(result="done" if card_number else "not_found")
+            result = [card_number, bbox, confidence] if card_number else None
+            await self._finish(job_id, seq, result=self._fernet.encrypt(json.dumps(result).encode()))
+        await self._cleanup_if_finished(job_id)
+
+    async def _finish(self, job_id: str, seq: int, result: bytes | None = None, error: str | None = None) -> None:
+        if not await asyncio.to_thread(self.store.finish_item, job_id, seq, result, error):
+            # The lease expired while the image was read and another process claimed it; its outcome is kept
+            logger.warning("Job %s item %d was claimed by another process before it finished here", job_id, seq)
+
+    @staticmethod
+    def _read_file(path: Path) -> bytes:
+        with open(path, "rb") as f:
+            return read_limited(f, settings.max_upload_bytes)
+
+    async def _cleanup_if_finished(self, job_id: str) -> None:
+        """Unpacked archives are only needed until every image of the job has been read"""
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job["pending"] == 0 and job["running"] == 0:
+            await asyncio.to_thread(shutil.rmtree, self.jobs_dir / "uploads" / job_id, ignore_errors=True)
+
+    async def get_job(self, job_id: str) -> dict | None:
+        """Job with its item counts and overall status: queued, running or completed"""
+        job = await asyncio.to_thread(self.store.get_job, job_id)
+        if job is None:
+            return None
+        if job["pending"] == 0 and job["running"] == 0:
+            job["status"] = "completed"
+        elif job["running"] or job["done"] or job["failed"]:
+            job["status"] = "running"
+        else:
+            job["status"] = "queued"
+        return job
+
+    async def results(self, job_id: str, after: int = 0, limit: int = 1000) -> list[dict]:
+        """Finished items after the cursor `after`, decrypted, each with its `cursor`"""
+        results = []
+        for item in await asyncio.to_thread(self.store.finished_items, job_id, after, limit):
+            result = json.loads(self._fernet.decrypt(item["result"])) if item["result"] is not None else None
+            results.append({"cursor": item["finish_order"], "name": item["name"], "result": result, "error": item["error"]})
+        return results
+
+
+# Create a singleton instance
+job_manager = JobManager(
+    jobs_dir=settings.jobs_dir,
+    input_dir=settings.jobs_input_dir,
+    concurrency=settings.jobs_concurrency,
+    max_attempts=settings.jobs_max_attempts,
+    encryption_key=settings.jobs_encryption_key,
+    lease_seconds=settings.jobs_lease_seconds,
+)
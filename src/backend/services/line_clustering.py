@@ -0,0 +1,163 @@
+import re
+from dataclasses import dataclass, field
+
+import numpy as np
+
+
+_DIGITS = re.compile(r"[0-9]+")
+
+
+@dataclass
+class CardCandidate:
+    """Card number read from consecutive OCR boxes of one text line"""
+    number: str
+    bbox: list[list[float]]
+    confidence: float
+    # Text and confidence of each box the number was read from, in reading order
+    groups: list[tuple[str, float]] = field(default_factory=list)
+    # Positions of those boxes in the OCR result
+    box_indices: list[int] = field(default_factory=list)
+
+
+def text_geometry(boxes: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Reading direction and text height of each box.
+
+    Args:
+        boxes: Box corners, shape (n, 4, 2), clockwise from the top-left one
+
+    Returns:
+        Unnormalised reading direction of each box, shape (n, 2), and box heights, shape (n,)
+    """
+    top = boxes[:, 1] - boxes[:, 0]
+    bottom = boxes[:, 2] - boxes[:, 3]
+    left = boxes[:, 3] - boxes[:, 0]
+    right = boxes[:, 2] - boxes[:, 1]
+    widths = (np.linalg.norm(top, axis=1) + np.linalg.norm(bottom, axis=1)) / 2
+    heights = (np.linalg.norm(left, axis=1) + np.linalg.norm(right, axis=1)) / 2
+
+    # Tall boxes hold vertical text, read top to bottom like the rotated crops fed to recognition
+    vertical = heights >= 1.5 * np.maximum(widths, 1.0)
+    direction = np.where(vertical[:, None], left + right, top + bottom)
+    text_height = np.where(vertical, widths, heights)
+    return direction, np.maximum(text_height, 1.0)
+
+
+def cluster_lines(boxes: np.ndarray, line_tolerance: float = 0.5, gap_tolerance: float = 3.0) -> list[np.ndarray]:
+    """
+    Group text boxes into lines with a sort-and-sweep across the dominant reading direction.
+
+    Args:
+        boxes: Box corners, shape (n, 4, 2), clockwise from the top-left one
+        line_tolerance: Largest offset across the reading direction between neighbouring
+            boxes of a line, as a fraction of the smaller box height
+        gap_tolerance: Largest gap along a line between consecutive boxes, as a multiple of
+            the taller box height; wider gaps start a new line (e.g. two cards side by side)
+
+    Returns:
+        Box indices of each line, in reading order
+    """
+    if len(boxes) == 0:
+        return []
+
+    axis, normal, heights = _reading_frame(boxes)
+    across = boxes.mean(axis=1) @ normal
+    corners_along = boxes @ axis
+    starts = corners_along.min(axis=1)
+    ends = corners_along.max(axis=1)
+
+    order = np.argsort(across, kind="stable")
+    sorted_heights = heights[order]
+    line_breaks = np.diff(across[order]) > line_tolerance * np.minimum(sorted_heights[1:], sorted_heights[:-1])
+
+    lines = []
+    for line in np.split(order, np.flatnonzero(line_breaks) + 1):
+        line = line[np.argsort(starts[line], kind="stable")]
+        gaps = starts[line[1:]] - np.maximum.accumulate(ends[line])[:-1]
+        gap_breaks = gaps > gap_tolerance * np.maximum(heights[line[1:]], heights[line[:-1]])
+        lines.extend(np.split(line, np.flatnonzero(gap_breaks) + 1))
+    return lines
+
+
+def find_card_candidates(ocr_result: list, lengths: tuple[int, ...] = (16,), line_tolerance: float = 0.5,
+                         gap_tolerance: float = 3.0) -> list[CardCandidate]:
+    """
+    Every card number that can be read from consecutive digit boxes of one line.
+
+    Args:
+        ocr_result: OCR output of one image, as [box, (text, confidence)] items
+        lengths: Accepted card number lengths
+        line_tolerance: See `cluster_lines`
+        gap_tolerance: See `cluster_lines`
+
+    Returns:
+        Candidates ranked by confidence, best first; each number appears once
+    """
+    if not ocr_result:
+        return []
+
+    boxes = np.asarray([box for box, _ in ocr_result], dtype=np.float64).reshape(-1, 4, 2)
+    texts = [text.replace(" ", "") for _, (text, _) in ocr_result]
+    confidences = [float(conf) for _, (_, conf) in ocr_result]
+    max_length = max(lengths)
+    axis, normal, _ = _reading_frame(boxes)
+    # Corners in reading coordinates, for candidate boxes aligned with the text
+    along = boxes @ axis
+    across = boxes @ normal
+
+    best: dict[str, CardCandidate] = {}
+    for line in cluster_lines(boxes, line_tolerance, gap_tolerance):
+        for start in range(len(line)):
+            digits = ""
+            for end in range(start, len(line)):
+                # Any other text on the line (names, dates) ends the run
+                if not _DIGITS.fullmatch(texts[line[end]]):
+                    break
+                digits += texts[line[end]]
+                if len(digits) > max_length:
+                    break
+                if len(digits) in lengths:
+                    run = line[start:end + 1]
+                    candidate = CardCandidate(
+                        number=digits,
+                        bbox=_aligned_box(along[run], across[run], axis, normal),
+                        confidence=_digit_weighted_mean([texts[i] for i in run], [confidences[i] for i in run]),
+                        groups=[(texts[i], confidences[i]) for i in run],
+                        box_indices=run.tolist(),
+                    )
+                    if candidate.number not in best or candidate.confidence > best[candidate.number].confidence:
+                        best[candidate.number] = candidate
+    return sorted(best.values(), key=lambda candidate: candidate.confidence, reverse=True)
+
+
+def select_disjoint(candidates: list[CardCandidate]) -> list[CardCandidate]:
+    """Keep the best candidates that share no OCR box with a better one, e.g. one per card on a page"""
+    used: set[int] = set()
+    selected = []
+    for candidate in candidates:
+        if used.isdisjoint(candidate.box_indices):
+            used.update(candidate.box_indices)
+            selected.append(candidate)
+    return selected
+
+
+def _reading_frame(boxes: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Dominant reading direction, its normal and the text height of each box"""
+    direction, heights = text_geometry(boxes)
+    # The summed direction weighs long boxes more, so short noise boxes barely tilt the axis
+    axis = direction.sum(axis=0)
+    norm = np.linalg.norm(axis)
+    axis = axis / norm if norm > 0 else np.array([1.0, 0.0])
+    return axis, np.array([-axis[1], axis[0]]), heights
+
+
+def _aligned_box(along: np.ndarray, across: np.ndarray, axis: np.ndarray, normal: np.ndarray) -> list[list[float]]:
+    """Box enclosing corners given in reading coordinates, back in image coordinates"""
+    a_min, a_max, c_min, c_max = along.min(), along.max(), across.min(), across.max()
+    corners = ((a_min, c_min), (a_max, c_min), (a_max, c_max), (a_min, c_max))
+    return [[float(a * axis[0] + c * normal[0]), float(a * axis[1] + c * normal[1])] for a, c in corners]
+
+
+def _digit_weighted_mean(texts: list[str], confidences: list[float]) -> float:
+    """Mean confidence where each box counts once per digit it contributes"""
+    return sum(len(text) * conf for text, conf in zip(texts, confidences)) / sum(len(text) for text in texts)
@@ -0,0 +1,146 @@
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+from core.logging_config import get_logger
+from services.detection_profiles import DetectionProfile
+
+
+logger = get_logger(__name__)
+
+# Likeliest characters kept per recognized character, for the Luhn repair of a misread digit
+REC_TOP_K = 3
+
+# For each character of a recognized text, its likeliest readings as (character, probability), best first
+Alternatives = list[list[tuple[str, float]]]
+
+
+def ctc_decode(probs: np.ndarray, characters: list[str], top_k: int = REC_TOP_K) -> tuple[str, float, Alternatives]:
+    """
+    Greedy CTC decoding of one crop: best class per time step, repeats merged and blanks dropped.
+
+    Args:
+        probs: Class probabilities per time step, shape (steps, classes), class 0 being the blank
+        characters: Character of each class
+        top_k: Readings kept per character
+
+    Returns:
+        Text, mean probability of its characters, and the `top_k` likeliest non-blank characters at
+        the time step of each character read, the first being the character read
+    """
+    best = probs.argmax(axis=1)
+    keep = best != 0
+    keep[1:] &= best[1:] != best[:-1]
+    if not keep.any():
+        return "", 0.0, []
+    steps = probs[keep]
+    ranked = np.argsort(-steps, axis=1)[:, :top_k + 1]
+    alternatives = [[(characters[i], float(step[i])) for i in order if i != 0][:top_k] for step, order in zip(steps, ranked)]
+    return "".join(characters[i] for i in best[keep]), float(steps.max(axis=1).mean()), alternatives
+
+
+class OcrBackend(ABC):
+    """Text detection, angle classification and recognition models behind `CardNumberExtractor`"""
+
+    use_angle_cls: bool
+    drop_score: float
+
+    @abstractmethod
+    def detect(self, image_np: np.ndarray, profile: DetectionProfile | None = None) -> np.ndarray | None:
+        """
+        Text boxes of an image, shape (n, 4, 2), corners clockwise from the top-left one.
+        `profile` sets the detection input size and box thresholds for this image, the backend's defaults otherwise.
+        """
+
+    @abstractmethod
+    def classify(self, crops: list[np.ndarray]) -> list[np.ndarray]:
+        """Text crops, turned upright when the classifier finds them upside down"""
+
+    @abstractmethod
+    def recognize(self, crops: list[np.ndarray]) -> list[tuple[str, float, Alternatives]]:
+        """
+        Text, confidence and per-character alternatives (see `ctc_decode`) of each crop.
+        Alternatives are empty when the recognition model doesn't give them.
+        """
+
+
+class PaddleOcrBackend(OcrBackend):
+    """PaddleOCR models on the Paddle inference runtime; model dirs default to the English models"""
+
+    def __init__(self, use_angle_cls: bool = True, det_model_dir: str | None = None, cls_model_dir: str | None = None,
+                 rec_model_dir: str | None = None):
+        # Imported here so that only inference workers pay for loading the Paddle runtime
+        from paddleocr import PaddleOCR
+        model_dirs = {"det_model_dir": det_model_dir, "cls_model_dir": cls_model_dir, "rec_model_dir": rec_model_dir}
+        self.ocr = PaddleOCR(use_angle_cls=use_angle_cls, lang='en', **{k: v for k, v in model_dirs.items() if v})
+        self.use_angle_cls = use_angle_cls
+        self.drop_score = self.ocr.drop_score
+
+        # Recognized texts come with their per-character alternatives when the model decodes with CTC
+        recognizer = self.ocr.text_recognizer
+        self._rec_alternatives = type(recognizer.postprocess_op).__name__ == "CTCLabelDecode"
+        if self._rec_alternatives:
+            recognizer.postprocess_op = _CtcAlternativesDecode(recognizer.postprocess_op)
+
+        # Detection settings live on the detector's resize and DB post-processing operators
+        detector = self.ocr.text_detector
+        self._det_resize = next(op for op in detector.preprocess_op if type(op).__name__ == "DetResizeForTest")
+        self._det_postprocess = detector.postprocess_op
+        self._det_defaults = DetectionProfile(
+            "default", max_side=None, limit_side_len=self._det_resize.limit_side_len, thresh=self._det_postprocess.thresh,
+            box_thresh=self._det_postprocess.box_thresh, unclip_ratio=self._det_postprocess.unclip_ratio)
+
+    def detect(self, image_np: np.ndarray, profile: DetectionProfile | None = None) -> np.ndarray | None:
+        # Each worker owns its backend, so the operators can be set per call
+        profile = profile or self._det_defaults
+        self._det_resize.limit_side_len = profile.limit_side_len
+        self._det_postprocess.thresh = profile.thresh
+        self._det_postprocess.box_thresh = profile.box_thresh
+        self._det_postprocess.unclip_ratio = profile.unclip_ratio
+        dt_boxes, _ = self.ocr.text_detector(image_np)
+        return dt_boxes
+
+    def classify(self, crops: list[np.ndarray]) -> list[np.ndarray]:
+        crops, _, _ = self.ocr.text_classifier(crops)
+        return crops
+
+    def recognize(self, crops: list[np.ndarray]) -> list[tuple[str, float, Alternatives]]:
+        rec_res, _ = self.ocr.text_recognizer(crops)
+        return [(text, conf, extra[0] if self._rec_alternatives else []) for text, conf, *extra in rec_res]
+
+
+class _CtcAlternativesDecode:
+    """PaddleOCR's CTC label decoding, with the per-character alternatives of each text added to its result"""
+
+    def __init__(self, decode):
+        self.decode = decode
+
+    def __call__(self, preds, *args, **kwargs):
+        texts = self.decode(preds, *args, **kwargs)
+        if isinstance(preds, (tuple, list)):
+            preds = preds[-1]
+        preds = np.asarray(preds)
+        # The recognizer stores each result as returned, so a third element reaches `recognize`
+        return [(text, conf, ctc_decode(probs, self.decode.character)[2]) for (text, conf, *_), probs in zip(texts, preds)]
+
+
+def create_ocr_backend(name: str, use_angle_cls: bool = True, det_model_dir: str | None = None,
+                       cls_model_dir: str | None = None, rec_model_dir: str | None = None, **options) -> OcrBackend:
+    """
+    Build an OCR backend.
+
+    Args:
+        name: `paddle` or `onnx`
+        use_angle_cls: Run the angle classifier on text crops before recognition
+        det_model_dir: Detection model directory
+        cls_model_dir: Angle classification model directory
+        rec_model_dir: Recognition model directory
+        **options: Backend specific settings, see `OnnxOcrBackend`
+    """
+    logger.info("Loading %s OCR backend (angle classification: %s)", name, use_angle_cls)
+    if name == "paddle":
+        return PaddleOcrBackend(use_angle_cls, det_model_dir, cls_model_dir, rec_model_dir)
+    if name == "onnx":
+        from services.onnx_backend import OnnxOcrBackend
+        return OnnxOcrBackend(use_angle_cls, det_model_dir, cls_model_dir, rec_model_dir, **options)
+    raise ValueError(f"Unknown OCR backend: {name}")
@@ -0,0 +1,222 @@
+import importlib.util
+import math
+import os
+import tempfile
+from pathlib import Path
+
+import cv2
+import numpy as np
+import pyclipper
+from shapely.geometry import Polygon
+
+from core.logging_config import get_logger
+from services.detection_profiles import DetectionProfile
+from services.ocr_backend import Alternatives, OcrBackend, ctc_decode
+
+
+logger = get_logger(__name__)
+
+# Name of the exported model inside each model directory, as written by paddle2onnx in the README
+MODEL_FILE = "inference.onnx"
+QUANTIZED_MODEL_FILE = "inference.int8.onnx"
+
+
+def quantize_model(model_path: str, output_path: str) -> None:
+    """Dynamic INT8 quantization of an ONNX model's weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Written next to the target and renamed, so concurrent workers never load a half-written file
+    fd, tmp_path = tempfile.mkstemp(suffix=".onnx", dir=os.path.dirname(output_path) or ".")
+    os.close(fd)
+    try:
+        quantize_dynamic(model_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def default_char_dict_path() -> str:
+    """English character dictionary shipped with the paddleocr package, located without importing Paddle"""
+    spec = importlib.util.find_spec("paddleocr")
+    if spec is None or spec.origin is None:
+        raise FileNotFoundError("No character dictionary given and paddleocr is not installed")
+    return str(Path(spec.origin).parent / "ppocr" / "utils" / "en_dict.txt")
+
+
+class OnnxOcrBackend(OcrBackend):
+    """
+    PP-OCR det/cls/rec models exported to ONNX, run with ONNX Runtime on CPU.
+    Pre- and post-processing follow PaddleOCR's defaults for the English models,
+    so results match the Paddle backend without importing the Paddle runtime.
+    """
+
+    def __init__(self, use_angle_cls: bool = True, det_model_dir: str | None = None, cls_model_dir: str | None = None,
+                 rec_model_dir: str | None = None, int8: bool = False, intra_op_threads: int = 0, inter_op_threads: int = 1,
+                 char_dict_path: str | None = None, det_limit_side_len: int = 960, det_db_thresh: float = 0.3,
+                 det_db_box_thresh: float = 0.6, det_db_unclip_ratio: float = 1.5, drop_score: float = 0.5,
+                 cls_thresh: float = 0.9, batch_size: int = 6):
+        """
+        Args:
+            use_angle_cls: Run the angle classifier on text crops before recognition
+            det_model_dir: Directory holding the exported detection model
+            cls_model_dir: Directory holding the exported angle classification model
+            rec_model_dir: Directory holding the exported recognition model
+            int8: Run dynamically quantized INT8 models, created next to the FP32 ones on first use
+            intra_op_threads: Threads used inside an operator; 0 lets ONNX Runtime use every core,
+                which oversubscribes the CPU when several workers run
+            inter_op_threads: Threads running independent operators in parallel
+            char_dict_path: Recognition character dictionary; defaults to PaddleOCR's English one
+            det_limit_side_len: Longest side of the image fed to detection
+            det_db_thresh: Probability above which a pixel is text
+            det_db_box_thresh: Lowest mean probability of a kept text box
+            det_db_unclip_ratio: How much detected text regions are expanded
+            drop_score: Recognized text below this confidence is dropped by the extractor
+            cls_thresh: Confidence above which a crop classified as upside down is rotated
+            batch_size: Crops per classification and recognition run
+        """
+        import onnxruntime as ort
+
+        if not det_model_dir or not rec_model_dir or (use_angle_cls and not cls_model_dir):
+            raise ValueError("The ONNX backend needs exported det, rec and (with angle classification) cls model dirs")
+
+        self.use_angle_cls = use_angle_cls
+        self.drop_score = drop_score
+        self.det_limit_side_len = det_limit_side_len
+        self.det_db_thresh = det_db_thresh
+        self.det_db_box_thresh = det_db_box_thresh
+        self.det_db_unclip_ratio = det_db_unclip_ratio
+        self.cls_thresh = cls_thresh
+        self.batch_size = batch_size
+
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+
+        def load(model_dir: str):
+            model_path = os.path.join(model_dir, MODEL_FILE)
+            if int8:
+                quantized_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE)
+                if not os.path.exists(quantized_path):
+                    logger.info("Quantizing %s to INT8", model_path)
+                    quantize_model(model_path, quantized_path)
+                model_path = quantized_path
+            return ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+
+        self.det_session = load(det_model_dir)
+        self.cls_session = load(cls_model_dir) if use_angle_cls else None
+        self.rec_session = load(rec_model_dir)
+
+        with open(char_dict_path or default_char_dict_path(), encoding="utf-8") as f:
+            # Index 0 is the CTC blank; the English models also predict a space
+            self.characters = ["blank"] + [line.rstrip("\r\n") for line in f] + [" "]
+
+    def detect(self, image_np: np.ndarray, profile: DetectionProfile | None = None) -> np.ndarray | None:
+        profile = profile or DetectionProfile("default", max_side=None, limit_side_len=self.det_limit_side_len,
+                                              thresh=self.det_db_thresh, box_thresh=self.det_db_box_thresh,
+                                              unclip_ratio=self.det_db_unclip_ratio)
+        height, width = image_np.shape[:2]
+        ratio = min(1.0, profile.limit_side_len / max(height, width))
+        resized_h = max(int(round(height * ratio / 32) * 32), 32)
+        resized_w = max(int(round(width * ratio / 32) * 32), 32)
+        resized = cv2.resize(image_np, (resized_w, resized_h)).astype(np.float32)
+        # Same normalisation as PaddleOCR's detection preprocessing (ImageNet mean and std)
+        resized = (resized / 255.0 - np.float32([0.485, 0.456, 0.406])) / np.float32([0.229, 0.224, 0.225])
+        batch = resized.transpose(2, 0, 1)[np.newaxis].astype(np.float32)
+
+        probability = self.det_session.run(None, {self.det_session.get_inputs()[0].name: batch})[0][0, 0]
+        boxes = self._boxes_from_bitmap(probability, probability > profile.thresh, width, height, profile.box_thresh, profile.unclip_ratio)
+        return np.array(boxes, dtype=np.float32) if boxes else None
+
+    def classify(self, crops: list[np.ndarray]) -> list[np.ndarray]:
+        crops = list(crops)
+        order = np.argsort([crop.shape[1] / crop.shape[0] for crop in crops])
+        for start in range(0, len(crops), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            batch = np.stack([self._resize_norm(crops[i], 192) for i in indices])
+            probabilities = self.cls_session.run(None, {self.cls_session.get_inputs()[0].name: batch})[0]
+            for i, probs in zip(indices, probabilities):
+                # Labels are 0 and 180 degrees
+                if probs.argmax() == 1 and probs[1] > self.cls_thresh:
+                    crops[i] = cv2.rotate(crops[i], cv2.ROTATE_180)
+        return crops
+
+    def recognize(self, crops: list[np.ndarray]) -> list[tuple[str, float, Alternatives]]:
+        results: list[tuple[str, float, Alternatives]] = [("", 0.0, [])] * len(crops)
+        # Sorting by aspect ratio keeps the padding of each batch small
+        ratios = [crop.shape[1] / crop.shape[0] for crop in crops]
+        order = np.argsort(ratios)
+        for start in range(0, len(crops), self.batch_size):
+            indices = order[start:start + self.batch_size]
+            max_ratio = max([320 / 48] + [ratios[i] for i in indices])
+            batch = np.stack([self._resize_norm(crops[i], int(48 * max_ratio)) for i in indices])
+            probabilities = self.rec_session.run(None, {self.rec_session.get_inputs()[0].name: batch})[0]
+            for i, probs in zip(indices, probabilities):
+                results[i] = ctc_decode(probs, self.characters)
+        return results
+
+    @staticmethod
+    def _resize_norm(crop: np.ndarray, target_width: int, target_height: int = 48) -> np.ndarray:
+        """Resize a crop to the model height keeping its aspect ratio, scale to [-1, 1] and pad on the right"""
+        height, width = crop.shape[:2]
+        resized_w = min(target_width, int(math.ceil(target_height * width / height)))
+        resized = cv2.resize(crop, (resized_w, target_height)).astype(np.float32)
+        resized = (resized.transpose(2, 0, 1) / 255.0 - 0.5) / 0.5
+        padded = np.zeros((3, target_height, target_width), dtype=np.float32)
+        padded[:, :, :resized_w] = resized
+        return padded
+
+    def _boxes_from_bitmap(self, probability: np.ndarray, bitmap: np.ndarray, dest_width: int, dest_height: int,
+                           box_thresh: float, unclip_ratio: float) -> list:
+        """DB post-processing: score each text region, expand it and scale it back to the input image"""
+        height, width = bitmap.shape
+        contours, _ = cv2.findContours((bitmap * 255).astype(np.uint8), cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+        boxes = []
+        for contour in contours[:1000]:
+            points, short_side = self._mini_box(contour)
+            if short_side < 3:
+                continue
+            if self._box_score(probability, points) < box_thresh:
+                continue
+
+            polygon = Polygon(points)
+            offset = pyclipper.PyclipperOffset()
+            offset.AddPath(points.tolist(), pyclipper.JT_ROUND, pyclipper.ET_CLOSEDPOLYGON)
+            expanded = offset.Execute(polygon.area * unclip_ratio / polygon.length)
+            if len(expanded) != 1:
+                continue
+            box, short_side = self._mini_box(np.array(expanded[0]).reshape(-1, 1, 2))
+            if short_side < 5:
+                continue
+
+            box[:, 0] = np.clip(np.round(box[:, 0] / width * dest_width), 0, dest_width)
+            box[:, 1] = np.clip(np.round(box[:, 1] / height * dest_height), 0, dest_height)
+            # Degenerate boxes cannot be cropped for recognition
+            if np.linalg.norm(box[0] - box[1]) <= 3 or np.linalg.norm(box[0] - box[3]) <= 3:
+                continue
+            boxes.append(box.astype(np.int32))
+        return boxes
+
+    @staticmethod
+    def _mini_box(contour: np.ndarray) -> tuple[np.ndarray, float]:
+        """Minimum-area rectangle of a contour, corners clockwise from the top-left one, and its short side"""
+        rect = cv2.minAreaRect(contour)
+        points = sorted(cv2.boxPoints(rect).tolist(), key=lambda p: p[0])
+        left = sorted(points[:2], key=lambda p: p[1])
+        right = sorted(points[2:], key=lambda p: p[1])
+        return np.array([left[0], right[0], right[1], left[1]], dtype=np.float32), min(rect[1])
+
+    @staticmethod
+    def _box_score(probability: np.ndarray, box: np.ndarray) -> float:
+        """Mean text probability inside a box"""
+        height, width = probability.shape
+        x_min = int(np.clip(np.floor(box[:, 0].min()), 0, width - 1))
+        x_max = int(np.clip(np.ceil(box[:, 0].max()), 0, width - 1))
+        y_min = int(np.clip(np.floor(box[:, 1].min()), 0, height - 1))
+        y_max = int(np.clip(np.ceil(box[:, 1].max()), 0, height - 1))
+        mask = np.zeros((y_max - y_min + 1, x_max - x_min + 1), dtype=np.uint8)
+        shifted = box - np.float32([x_min, y_min])
+        cv2.fillPoly(mask, shifted.reshape(1, -1, 2).astype(np.int32), 1)
+        return cv2.mean(probability[y_min:y_max + 1, x_min:x_max + 1], mask)[0]
@@ -0,0 +1,186 @@
+import re
+from itertools import accumulate
+from typing import Literal
+
+from core.logging_config import get_logger, mask_pan
+from core.metrics import VALIDATION, record
+
+
+logger = get_logger(__name__)
+
+LuhnPolicy = Literal["off", "reject", "repair"]
+
+# Printed digit grouping of the standard card formats
+LAYOUTS = (
+    (4, 4, 4, 4),     # Visa, Mastercard, Discover, JCB, UnionPay, Mir
+    (4, 6, 5),        # American Express
+    (4, 6, 4),        # Diners Club
+    (4, 3, 3, 3),     # 13-digit Visa
+    (4, 4, 4, 4, 3),  # 19-digit Visa, Maestro, UnionPay, Discover
+)
+PAN_LENGTHS = tuple(sorted({sum(layout) for layout in LAYOUTS}))
+
+# Whole card number in one OCR box, groups separated by a space, a dash or nothing
+_LAYOUT_PATTERNS = tuple(
+    re.compile(r"[ -]?".join(rf"(\d{{{size}}})" for size in layout))
+    for layout in LAYOUTS
+)
+# Group boundaries of the layouts of each length, as digit offsets from the start of the number
+_LAYOUT_BOUNDARIES = {
+    length: [frozenset(accumulate(layout[:-1])) for layout in LAYOUTS if sum(layout) == length]
+    for length in PAN_LENGTHS
+}
+
+# IIN prefix ranges (inclusive, compared on as many leading digits as the bounds have) and allowed lengths
+BRANDS = (
+    ("amex", ((34, 34), (37, 37)), (15,)),
+    ("diners", ((300, 305), (36, 36), (38, 39)), (14, 15, 16, 17, 18, 19)),
+    ("jcb", ((3528, 3589),), (16, 17, 18, 19)),
+    ("visa", ((4, 4),), (13, 16, 19)),
+    ("mastercard", ((51, 55), (2221, 2720)), (16,)),
+    ("mir", ((2200, 2204),), (16, 17, 18, 19)),
+    ("discover", ((6011, 6011), (644, 649), (65, 65)), (16, 17, 18, 19)),
+    ("unionpay", ((62, 62),), (16, 17, 18, 19)),
+    ("maestro", ((50, 50), (56, 69)), (12, 13, 14, 15, 16, 17, 18, 19)),
+)
+
+# Letters that OCR returns for digits in embossed and printed card fonts
+_HOMOGLYPHS = str.maketrans({"O": "0", "o": "0", "D": "0", "Q": "0", "I": "1", "l": "1", "|": "1",
+                             "Z": "2", "S": "5", "s": "5", "G": "6", "b": "6", "T": "7", "B": "8", "g": "9", "q": "9"})
+
+
+def normalize_digits(text: str) -> str:
+    """Replace letters read in place of digits, only in text that is mostly digits already"""
+    compact = text.replace(" ", "").replace("-", "")
+    if not compact:
+        return text
+    digits = sum(char.isdigit() for char in compact)
+    if digits / len(compact) < 0.75:
+        return text
+    return text.translate(_HOMOGLYPHS)
+
+
+def match_layout(text: str) -> str | None:
+    """Digits of a text that reads as a whole card number in one of the standard layouts"""
+    for pattern in _LAYOUT_PATTERNS:
+        match = pattern.fullmatch(text)
+        if match:
+            return "".join(match.groups())
+    return None
+
+
+def fits_layout(group_lengths: list[int]) -> bool:
+    """Whether digit groups split a number where a standard layout does (groups may merge layout groups)"""
+    offsets, total = set(), 0
+    for length in group_lengths[:-1]:
+        total += length
+        offsets.add(total)
+    total += group_lengths[-1] if group_lengths else 0
+    return any(offsets <= boundaries for boundaries in _LAYOUT_BOUNDARIES.get(total, ()))
+
+
+def luhn_valid(number: str) -> bool:
+    """Luhn (mod 10) checksum"""
+    total = 0
+    for position, char in enumerate(reversed(number)):
+        digit = int(char)
+        if position % 2:
+            digit = digit * 2 - 9 if digit > 4 else digit * 2
+        total += digit
+    return total % 10 == 0
+
+
+def detect_brand(number: str) -> str | None:
+    """Card brand from the IIN prefix"""
+    for brand, ranges, _ in BRANDS:
+        for low, high in ranges:
+            prefix = int(number[:len(str(low))])
+            if low <= prefix <= high:
+                return brand
+    return None
+
+
+def brand_length_valid(number: str) -> bool:
+    """Whether the length is allowed for the detected brand; unknown prefixes accept any standard length"""
+    brand = detect_brand(number)
+    for name, _, lengths in BRANDS:
+        if name == brand:
+            return len(number) in lengths
+    return len(number) in PAN_LENGTHS
+
+
+def repair(number: str, alternatives: list[list[tuple[str, float]]], margin: float = 2.0,
+           min_score: float = 0.02) -> str | None:
+    """
+    Fix a single misread digit so that the number passes the Luhn check.
+
+    Only the character the recognizer was least sure of may change: a checksum failure says that
+    some digit is wrong, not which one, and changing another digit would most likely turn a
+    rejected misread into a wrong number that looks valid.
+
+    Args:
+        number: Number that fails the check
+        alternatives: For each digit, the recognizer's top-k candidates as (digit, probability),
+            best first, the first being the digit read
+        margin: How many times likelier the best fix must be than the next one; ambiguous fixes are refused
+        min_score: Alternatives less likely than this are not tried
+
+    Returns:
+        The repaired number, or None when no single fix is clearly the right one
+    """
+    if len(alternatives) != len(number) or not all(alternatives):
+        return None
+    confidences = [options[0][1] for options in alternatives]
+    position = confidences.index(min(confidences))
+    if confidences.count(confidences[position]) > 1:
+        # No single least confident character
+        return None
+    fixes = []
+    for digit, score in alternatives[position][1:]:
+        if score < min_score or digit == number[position] or not digit.isdigit():
+            continue
+        fixed = number[:position] + digit + number[position + 1:]
+        if luhn_valid(fixed) and brand_length_valid(fixed):
+            fixes.append((score, fixed))
+    if not fixes:
+        return None
+    fixes.sort(reverse=True)
+    if len(fixes) > 1 and fixes[0][0] < margin * fixes[1][0]:
+        return None
+    return fixes[0][1]
+
+
+class CardNumberValidator:
+    """Checksum and brand validation of candidate card numbers"""
+
+    def __init__(self, policy: LuhnPolicy = "reject"):
+        self.policy = policy
+
+    def check(self, number: str, alternatives: list[list[tuple[str, float]]] | None = None) -> str | None:
+        """
+        Validate a candidate number.
+
+        Args:
+            number: Digits read by OCR
+            alternatives: Per-digit top-k candidates of the recognizer (see `repair`); without them
+                the `repair` policy rejects like `reject`
+
+        Returns:
+            The number, repaired if needed, or None when it is rejected
+        """
+        if self.policy == "off":
+            return number
+        if luhn_valid(number) and brand_length_valid(number):
+            record(VALIDATION, 1, result="valid")
+            return number
+
+        if self.policy == "repair" and alternatives is not None:
+            fixed = repair(number, alternatives)
+            if fixed is not None:
+                logger.info("Repaired misread card number %s to %s", mask_pan(number), mask_pan(fixed))
+                record(VALIDATION, 1, result="repaired")
+                return fixed
+
+        logger.debug("Rejecting card number %s that fails the Luhn or brand check", mask_pan(number))
+        record(VALIDATION, 1, result="rejected")
+        return None
@@ -0,0 +1,130 @@
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from core.logging_config import get_logger
+from core.metrics import IMAGE_PIXELS, record, timed_stage
+
+
+logger = get_logger(__name__)
+
+# Standard card size (width, height) used by CreditCardGenerator
+CARD_SIZE = (850, 540)
+CARD_ASPECT = CARD_SIZE[0] / CARD_SIZE[1]
+
+
+@dataclass
+class PreprocessedImage:
+    """Image handed to OCR together with the homography that maps its pixels back to the upload"""
+    image: np.ndarray
+    to_original: np.ndarray
+
+    def map_box(self, box: list) -> list[list[int]]:
+        """Map box points from preprocessed coordinates to original image coordinates"""
+        points = np.asarray(box, dtype=np.float32).reshape(-1, 1, 2)
+        mapped = cv2.perspectiveTransform(points, self.to_original.astype(np.float32))
+        return np.rint(mapped.reshape(-1, 2)).astype(int).tolist()
+
+
+def preprocess_image(image: Image.Image, max_side: int | None = None, detect_card: bool = False,
+                     min_card_area: float = 0.2) -> PreprocessedImage:
+    """
+    Prepare an upload for OCR.
+
+    Args:
+        image: Uploaded image
+        max_side: Longest side allowed after resizing; larger images are downscaled
+        detect_card: Look for the card rectangle and warp it to the standard card size
+        min_card_area: Smallest card area, as a fraction of the image, accepted as a card
+    """
+    # Size of the upload before any reduced decode, recorded by open_image()
+    original_width, original_height = image.info.get("original_size", image.size)
+
+    with timed_stage("decode"):
+        image.load()
+        if image.mode != 'RGB':
+            logger.debug("Converting image to RGB mode")
+            image = image.convert('RGB')
+
+    width, height = image.size
+    record(IMAGE_PIXELS, original_width * original_height)
+    if max_side and max(width, height) > max_side:
+        scale = max_side / max(width, height)
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        logger.debug("Downscaling image from %s to %s", image.size, new_size)
+        with timed_stage("resize"):
+            image = image.resize(new_size, Image.Resampling.BILINEAR, reducing_gap=2.0)
+
+    with timed_stage("to_array"):
+        image_np = np.array(image)
+    to_original = np.diag([original_width / image.width, original_height / image.height, 1.0])
+
+    if detect_card:
+        with timed_stage("card_detection"):
+            quad = find_card_quad(image_np, min_card_area)
+            if quad is not None:
+                logger.debug("Card rectangle found, cropping to card region")
+                image_np, to_card = warp_card(image_np, quad)
+                to_original = to_original @ np.linalg.inv(to_card)
+            else:
+                logger.debug("No card rectangle found, using the whole image")
+
+    return PreprocessedImage(image=image_np, to_original=to_original)
+
+
+def find_card_quad(image_np: np.ndarray, min_card_area: float = 0.2) -> np.ndarray | None:
+    """Find the largest card-shaped quadrilateral; returns its corners as tl, tr, br, bl or None"""
+    image_area = image_np.shape[0] * image_np.shape[1]
+    gray = cv2.cvtColor(image_np, cv2.COLOR_RGB2GRAY)
+    gray = cv2.GaussianBlur(gray, (5, 5), 0)
+    edges = cv2.Canny(gray, 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        area = cv2.contourArea(contour)
+        if area < min_card_area * image_area:
+            break
+        # A card filling the whole frame gains nothing from cropping
+        if area > 0.95 * image_area:
+            return None
+
+        approx = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(approx) != 4 or not cv2.isContourConvex(approx):
+            continue
+
+        quad = _order_corners(approx.reshape(4, 2).astype(np.float32))
+        width = np.linalg.norm(quad[1] - quad[0])
+        height = np.linalg.norm(quad[3] - quad[0])
+        aspect = max(width, height) / max(min(width, height), 1)
+        # Loose bounds leave room for perspective distortion
+        if 0.75 * CARD_ASPECT <= aspect <= 1.35 * CARD_ASPECT:
+            return quad
+    return None
+
+
+def warp_card(image_np: np.ndarray, quad: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Warp the card to the standard card size; returns the card image and the homography used"""
+    # Portrait cards are turned so that the long side is horizontal
+    if np.linalg.norm(quad[3] - quad[0]) > np.linalg.norm(quad[1] - quad[0]):
+        quad = np.roll(quad, -1, axis=0)
+
+    card_width, card_height = CARD_SIZE
+    target = np.float32([[0, 0], [card_width, 0], [card_width, card_height], [0, card_height]])
+    matrix = cv2.getPerspectiveTransform(quad, target)
+    card = cv2.warpPerspective(image_np, matrix, CARD_SIZE, flags=cv2.INTER_LINEAR)
+    return card, matrix
+
+
+def _order_corners(points: np.ndarray) -> np.ndarray:
+    """Order four points clockwise starting from the top-left one"""
+    sums = points.sum(axis=1)
+    diffs = np.diff(points, axis=1).ravel()
+    return np.float32([
+        points[np.argmin(sums)],   # top-left
+        points[np.argmin(diffs)],  # top-right
+        points[np.argmax(sums)],   # bottom-right
+        points[np.argmax(diffs)],  # bottom-left
+    ])
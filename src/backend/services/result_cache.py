@@ -0,0 +1,125 @@
+import hashlib
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from core.config import settings
+from core.logging_config import get_logger
+
+
+logger = get_logger(__name__)
+
+
+class CacheBackend(ABC):
+    """Storage for encrypted cache entries; implement it to share the cache between replicas"""
+
+    @abstractmethod
+    def get(self, key: str) -> bytes | None:
+        ...
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+
+class InMemoryCacheBackend(CacheBackend):
+    """In-process LRU with a per-entry time to live"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> bytes | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl_seconds: float) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class ResultCache:
+    """
+    Caches extraction results by a keyed hash of the uploaded bytes.
+    Entries are encrypted, so card numbers never sit in the backend in plaintext.
+    """
+
+    def __init__(self, backend: CacheBackend, ttl_seconds: float = 3600, encryption_key: str | None = None, enabled: bool = True):
+        self.backend = backend
+        self.ttl_seconds = ttl_seconds
+        self.enabled = enabled
+        if encryption_key is None:
+            # A random key keeps entries private to this process; replicas sharing a backend need a common key
+            encryption_key = Fernet.generate_key().decode()
+        self._fernet = Fernet(encryption_key.encode())
+        self._hash_key = hashlib.sha256(b"result-cache-key" + encryption_key.encode()).digest()
+        self.hits = 0
+        self.misses = 0
+
+    def key_for(self, data: bytes, variant: str = "") -> str:
+        """Cache key of an upload; `variant` separates results of different extraction modes"""
+        digest = hashlib.blake2b(data, key=self._hash_key, digest_size=32)
+        digest.update(variant.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str) -> list | None:
+        """Cached result; tuples come back as lists"""
+        token = self.backend.get(key)
+        if token is None:
+            self.misses += 1
+            return None
+        try:
+            payload = json.loads(self._fernet.decrypt(token))
+        except InvalidToken:
+            logger.warning("Discarding cache entry that cannot be decrypted")
+            self.misses += 1
+            return None
+        self.hits += 1
+        return payload
+
+    def set(self, key: str, result: tuple | list) -> None:
+        """Store a JSON-serialisable result: one (card_number, bbox, confidence) or a list of them"""
+        self.backend.set(key, self._fernet.encrypt(json.dumps(result).encode()), self.ttl_seconds)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self.backend),
+        }
+
+
+# Create a singleton instance
+result_cache = ResultCache(
+    InMemoryCacheBackend(settings.cache_max_entries),
+    ttl_seconds=settings.cache_ttl_seconds,
+    encryption_key=settings.cache_encryption_key,
+    enabled=settings.cache_enabled,
+)
@@ -0,0 +1,127 @@
+import asyncio
+
+import pytest
+
+from services.batching import MicroBatcher
+
+
+class Recorder:
+    """run_batch that records every batch and echoes its images, after an optional delay"""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.batches: list[list] = []
+
+    async def __call__(self, images: list) -> list:
+        self.batches.append(images)
+        await asyncio.sleep(self.delay)
+        return [f"read {image}" for image in images]
+
+
+def run(coroutine_function):
+    """Run a test coroutine on a fresh event loop"""
+    return asyncio.run(coroutine_function())
+
+
+def test_full_batch_is_dispatched_without_waiting():
+    recorder = Recorder()
+
+    async def scenario():
+        batcher = MicroBatcher(recorder, max_batch_size=3, max_wait_ms=10_000, max_in_flight=1, max_queue_size=10)
+        batcher.start()
+        results = await asyncio.wait_for(asyncio.gather(*(batcher.submit(i) for i in range(3))), 1)
+        batcher.stop()
+        return results
+
+    assert run(scenario) == ["read 0", "read 1", "read 2"]
+    assert recorder.batches == [[0, 1, 2]]
+
+
+def test_partial_batch_is_dispatched_at_the_deadline():
+    recorder = Recorder()
+
+    async def scenario():
+        batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=50, max_in_flight=1, max_queue_size=10)
+        batcher.start()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        results = await asyncio.gather(batcher.submit("a"), batcher.submit("b"))
+        batcher.stop()
+        return results, loop.time() - started
+
+    results, elapsed = run(scenario)
+    assert results == ["read a", "read b"]
+    assert recorder.batches == [["a", "b"]]
+    assert 0.04 <= elapsed < 1
+
+
+def test_requests_pile_up_while_batches_run():
+    recorder = Recorder(delay=0.1)
+
+    async def scenario():
+        batcher = MicroBatcher(recorder, max_batch_size=8, max_wait_ms=0, max_in_flight=1, max_queue_size=10)
+        batcher.start()
+        first = asyncio.ensure_future(batcher.submit(0))
+        await asyncio.sleep(0.02)
+        # The only slot is busy, so these wait for it together
+        rest = await asyncio.gather(*(batcher.submit(i) for i in range(1, 4)))
+        batcher.stop()
+        return [await first, *rest]
+
+    assert run(scenario) == ["read 0", "read 1", "read 2", "read 3"]
+    assert recorder.batches == [[0], [1, 2, 3]]
+
+
+def test_batch_errors_reach_every_request():
+    async def failing(images):
+        raise ValueError("Model crashed")
+
+    async def scenario():
+        batcher = MicroBatcher(failing, max_batch_size=2, max_wait_ms=10, max_in_flight=1, max_queue_size=10)
+        batcher.start()
+        results = await asyncio.gather(batcher.submit(1), batcher.submit(2), return_exceptions=True)
+        batcher.stop()
+        return results
+
+    results = run(scenario)
+    assert len(results) == 2
+    assert all(isinstance(result, ValueError) and str(result) == "Model crashed" for result in results)
+
+
+def test_full_queue_is_refused():
+    async def scenario():
+        batcher = MicroBatcher(Recorder(delay=10), max_batch_size=1, max_wait_ms=0, max_in_flight=1, max_queue_size=1)
+        batcher.start()
+        running = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.02)
+        # The only slot is busy and "b" fills the queue
+        queued = asyncio.ensure_future(batcher.submit("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(asyncio.QueueFull):
+            await batcher.submit("c")
+        batcher.stop()
+        with pytest.raises(RuntimeError):
+            await queued
+        running.cancel()
+
+    run(scenario)
+
+
+def test_stop_fails_queued_requests():
+    recorder = Recorder(delay=10)
+
+    async def scenario():
+        batcher = MicroBatcher(recorder, max_batch_size=1, max_wait_ms=0, max_in_flight=1, max_queue_size=10)
+        batcher.start()
+        running = asyncio.ensure_future(batcher.submit("a"))
+        await asyncio.sleep(0.02)
+        queued = [asyncio.ensure_future(batcher.submit(image)) for image in ("b", "c")]
+        await asyncio.sleep(0.02)
+        batcher.stop()
+        results = await asyncio.wait_for(asyncio.gather(*queued, return_exceptions=True), 1)
+        running.cancel()
+        return results
+
+    results = run(scenario)
+    assert all(isinstance(result, RuntimeError) and str(result) == "Micro-batcher is stopped" for result in results)
+    assert recorder.batches == [["a"]]
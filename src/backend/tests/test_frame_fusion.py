@@ -0,0 +1,105 @@
+from PIL import Image, ImageDraw
+
+from services.frame_fusion import DuplicateFrameFilter, FrameFusion, dhash
+
+
+def frame(offset: int = 0, size: tuple[int, int] = (320, 200)) -> Image.Image:
+    """Gradient frame with a dark block, shifted right by `offset` pixels"""
+    image = Image.linear_gradient("L").resize(size).rotate(90).convert("RGB")
+    ImageDraw.Draw(image).rectangle((60 + offset, 60, 160 + offset, 140), fill=(0, 0, 0))
+    return image
+
+
+def test_dhash_ignores_small_changes():
+    image = frame()
+    assert dhash(image) == dhash(image.resize((640, 400)))
+    assert 0 < dhash(image) < 1 << 64
+    assert dhash(image) != dhash(frame(offset=120))
+
+
+def test_duplicate_filter_compares_with_the_last_frame_read():
+    duplicates = DuplicateFrameFilter(max_distance=4)
+    first = dhash(frame())
+    moved = dhash(frame(offset=120))
+    # Nothing was read yet, so a frame that was skipped doesn't make the next one a duplicate
+    assert not duplicates.is_duplicate(first)
+    assert not duplicates.is_duplicate(first)
+
+    duplicates.remember(first)
+    assert duplicates.is_duplicate(first)
+    assert duplicates.is_duplicate(first ^ 0b1111)
+    assert not duplicates.is_duplicate(first ^ 0b11111)
+    assert not duplicates.is_duplicate(moved)
+
+
+def test_fusion_votes_digit_by_digit():
+    fusion = FrameFusion()
+    assert fusion.number is None and fusion.confidence is None and fusion.bbox is None
+    fusion.add("4111111111111111", [[0, 0]], [0.9] * 16)
+    fusion.add("4111111111111171", [[1, 1]], [0.9] * 14 + [0.4, 0.9])
+    fusion.add("4111111111111111", [[2, 2]], [0.9] * 16)
+    assert fusion.number == "4111111111111111"
+    # The frame that read a 7 counts as zero for that digit
+    assert abs(fusion.confidence - (0.9 * 47 + 0) / 48) < 1e-9
+
+
+def test_fusion_votes_within_the_most_read_length():
+    fusion = FrameFusion()
+    fusion.add("411111111111111", [[0, 0]], [1.0] * 15)
+    fusion.add("4111111111111111", [[1, 1]], [0.5] * 16)
+    fusion.add("4111111111111111", [[2, 2]], [0.5] * 16)
+    assert fusion.number == "4111111111111111"
+
+
+def test_fusion_is_stable_after_consecutive_valid_readings():
+    fusion = FrameFusion(stable_frames=3)
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    assert not fusion.stable
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    assert fusion.stable
+
+
+def test_fusion_needs_a_luhn_valid_number():
+    fusion = FrameFusion(stable_frames=2)
+    for _ in range(3):
+        fusion.add("4111111111111112", [], [0.9] * 16)
+    assert not fusion.stable
+
+
+def test_repeated_frames_extend_the_streak():
+    fusion = FrameFusion(stable_frames=3)
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    fusion.repeat()
+    fusion.repeat()
+    assert fusion.stable
+    # Repeats don't vote
+    assert abs(fusion.confidence - 0.9) < 1e-9
+
+
+def test_repeats_of_a_frame_without_digits_do_not_count():
+    fusion = FrameFusion(stable_frames=3)
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    fusion.add_miss()
+    fusion.repeat()
+    fusion.repeat()
+    assert not fusion.stable
+    fusion.add("4111111111111111", [], [0.9] * 16)
+    fusion.repeat()
+    assert fusion.stable
+
+
+def test_fusion_bbox_of_the_fused_number():
+    fusion = FrameFusion()
+    fusion.add("4111111111111111", [[0, 0]], [0.9] * 16)
+    fusion.add("4111111111111171", [[1, 1]], [0.5] * 16)
+    assert fusion.bbox == [[0, 0]]
+
+
+def test_fusion_bbox_falls_back_to_the_latest_reading():
+    fusion = FrameFusion()
+    fusion.add("4111111111111171", [[0, 0]], [0.9] * 14 + [0.9, 0.1])
+    fusion.add("4111111111111117", [[1, 1]], [0.9] * 14 + [0.1, 0.9])
+    # No frame read the fused number exactly
+    assert fusion.number == "4111111111111177"
+    assert fusion.bbox == [[1, 1]]
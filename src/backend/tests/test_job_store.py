@@ -0,0 +1,139 @@
+import sqlite3
+import time
+
+import pytest
+
+from services.job_store import JobStore
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    return str(tmp_path / "jobs.db")
+
+
+@pytest.fixture
+def store(store_path):
+    store = JobStore(store_path)
+    yield store
+    store.close()
+
+
+def test_create_job_counts_items(store):
+    job_id = store.create_job("manifest", [("a.jpg", "/a.jpg", None), ("b.jpg", None, "Not found")])
+    job = store.get_job(job_id)
+    assert job["source"] == "manifest" and job["total"] == 2
+    assert (job["pending"], job["running"], job["done"], job["failed"]) == (1, 0, 0, 1)
+    assert store.get_job("missing") is None
+
+
+def test_create_job_under_a_given_id(store):
+    assert store.create_job("cards.zip", [("a.jpg", "/a.jpg", None)], job_id="abc") == "abc"
+    assert store.get_job("abc")["total"] == 1
+
+
+def test_claims_follow_submission_order(store):
+    first = store.create_job("manifest", [("a.jpg", "/a.jpg", None), ("b.jpg", "/b.jpg", None)])
+    time.sleep(0.01)
+    second = store.create_job("manifest", [("c.jpg", "/c.jpg", None)])
+    claimed = [store.claim_next() for _ in range(4)]
+    assert [(item["job_id"], item["name"]) for item in claimed[:3]] == [(first, "a.jpg"), (first, "b.jpg"), (second, "c.jpg")]
+    assert claimed[3] is None
+    assert claimed[0]["status"] == "running" and claimed[0]["attempts"] == 1 and claimed[0]["owner"] == store.owner
+
+
+def test_finished_items_in_completion_order(store):
+    job_id = store.create_job("manifest", [("a.jpg", None, "Not found"), ("b.jpg", "/b.jpg", None), ("c.jpg", "/c.jpg", None)])
+    b, c = store.claim_next(), store.claim_next()
+    assert store.finish_item(job_id, c["seq"], result=b"c")
+    assert store.finish_item(job_id, b["seq"], error="Unreadable")
+
+    finished = store.finished_items(job_id)
+    assert [(item["name"], item["status"], item["finish_order"]) for item in finished] == [
+        ("a.jpg", "failed", 1), ("c.jpg", "done", 2), ("b.jpg", "failed", 3)]
+    assert finished[1]["result"] == b"c" and finished[2]["error"] == "Unreadable"
+    # The last finish_order seen is the cursor for the next page
+    assert [item["name"] for item in store.finished_items(job_id, after=1, limit=1)] == ["c.jpg"]
+    assert store.finished_items(job_id, after=3) == []
+
+
+def test_stores_sharing_a_file_never_claim_the_same_item(store_path):
+    stores = [JobStore(store_path) for _ in range(3)]
+    try:
+        job_id = stores[0].create_job("manifest", [(f"{seq}.jpg", f"/{seq}.jpg", None) for seq in range(9)])
+        claimed = []
+        while (item := stores[len(claimed) % 3].claim_next()) is not None:
+            claimed.append(item["seq"])
+        assert sorted(claimed) == list(range(9))
+        assert stores[1].get_job(job_id)["running"] == 9
+    finally:
+        for other in stores:
+            other.close()
+
+
+def test_expired_lease_is_claimed_again(store_path):
+    crashed = JobStore(store_path, lease_seconds=0.05)
+    survivor = JobStore(store_path)
+    try:
+        job_id = crashed.create_job("manifest", [("a.jpg", "/a.jpg", None)])
+        assert crashed.claim_next()["seq"] == 0
+        assert survivor.claim_next() is None
+        time.sleep(0.1)
+
+        item = survivor.claim_next()
+        assert item["owner"] == survivor.owner and item["attempts"] == 2
+        # The store that lost the lease can't overwrite the outcome
+        assert not crashed.finish_item(job_id, 0, result=b"late")
+        assert survivor.finish_item(job_id, 0, result=b"ok")
+        assert survivor.finished_items(job_id)[0]["result"] == b"ok"
+    finally:
+        crashed.close()
+        survivor.close()
+
+
+def test_renewed_lease_is_kept(store_path):
+    owner = JobStore(store_path, lease_seconds=0.2)
+    other = JobStore(store_path)
+    try:
+        owner.create_job("manifest", [("a.jpg", "/a.jpg", None)])
+        owner.claim_next()
+        time.sleep(0.15)
+        assert owner.renew_leases() == 1
+        time.sleep(0.1)
+        assert other.claim_next() is None
+    finally:
+        owner.close()
+        other.close()
+
+
+def test_retry_and_release_put_items_back(store):
+    job_id = store.create_job("manifest", [("a.jpg", "/a.jpg", None), ("b.jpg", "/b.jpg", None)])
+    a, b = store.claim_next(), store.claim_next()
+    store.retry_item(job_id, a["seq"], "Timed out")
+    assert store.release_items() == 1
+    assert store.get_job(job_id)["pending"] == 2
+
+    retried = store.claim_next()
+    assert retried["seq"] == a["seq"] and retried["attempts"] == 2 and retried["error"] == "Timed out"
+    assert store.claim_next()["seq"] == b["seq"]
+
+
+def test_old_store_gains_lease_columns(store_path):
+    conn = sqlite3.connect(store_path)
+    conn.executescript("""
+        CREATE TABLE jobs (id TEXT PRIMARY KEY, source TEXT NOT NULL, created_at REAL NOT NULL, total INTEGER NOT NULL);
+        CREATE TABLE items (job_id TEXT NOT NULL REFERENCES jobs(id), seq INTEGER NOT NULL, name TEXT NOT NULL, path TEXT,
+            status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, result BLOB, error TEXT, finished_at REAL,
+            finish_order INTEGER, PRIMARY KEY (job_id, seq));
+        INSERT INTO jobs VALUES ('old', 'manifest', 0, 1);
+        INSERT INTO items (job_id, seq, name, path, status, attempts) VALUES ('old', 0, 'a.jpg', '/a.jpg', 'running', 1);
+    """)
+    conn.close()
+
+    store = JobStore(store_path)
+    try:
+        # A running item from before leases existed belongs to no live store
+        item = store.claim_next()
+        assert item["job_id"] == "old" and item["owner"] == store.owner
+        assert store.finish_item("old", 0, result=b"ok")
+    finally:
+        store.close()
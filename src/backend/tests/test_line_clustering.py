@@ -0,0 +1,100 @@
+import numpy as np
+
+from services.line_clustering import CardCandidate, cluster_lines, find_card_candidates, select_disjoint, text_geometry
+
+
+def box(x: float, y: float, width: float = 80, height: float = 20) -> list[list[float]]:
+    """Axis-aligned box corners, clockwise from the top-left one"""
+    return [[x, y], [x + width, y], [x + width, y + height], [x, y + height]]
+
+
+def item(text: str, x: float, y: float, confidence: float = 0.9, width: float = 80) -> list:
+    return [box(x, y, width), (text, confidence)]
+
+
+def card_line(number: str, x: float, y: float, confidence: float = 0.9) -> list:
+    """One OCR item per group of four digits, 100 px apart"""
+    return [item(number[i:i + 4], x + i * 25, y, confidence) for i in range(0, len(number), 4)]
+
+
+def test_text_geometry_of_horizontal_and_vertical_boxes():
+    boxes = np.asarray([box(0, 0, 80, 20), box(0, 0, 20, 80)], dtype=np.float64)
+    direction, heights = text_geometry(boxes)
+    assert direction[0][0] > 0 and direction[0][1] == 0
+    # Vertical text reads top to bottom and its height is the box width
+    assert direction[1][0] == 0 and direction[1][1] > 0
+    assert heights.tolist() == [20, 20]
+
+
+def test_cluster_lines_in_reading_order():
+    boxes = np.asarray([box(200, 102), box(0, 100), box(100, 98), box(0, 200)], dtype=np.float64)
+    lines = cluster_lines(boxes)
+    assert [line.tolist() for line in lines] == [[1, 2, 0], [3]]
+
+
+def test_cluster_lines_splits_wide_gaps():
+    # Two cards side by side: the gap is far wider than three text heights
+    boxes = np.asarray([box(0, 0), box(100, 0), box(400, 0), box(500, 0)], dtype=np.float64)
+    lines = cluster_lines(boxes)
+    assert [line.tolist() for line in lines] == [[0, 1], [2, 3]]
+    assert len(cluster_lines(boxes, gap_tolerance=20.0)) == 1
+
+
+def test_cluster_lines_follows_rotated_text():
+    angle = np.deg2rad(30)
+    rotation = np.array([[np.cos(angle), -np.sin(angle)], [np.sin(angle), np.cos(angle)]])
+    boxes = np.asarray([box(0, 0), box(100, 0), box(200, 0), box(0, 60)], dtype=np.float64) @ rotation.T
+    lines = cluster_lines(boxes)
+    assert [line.tolist() for line in lines] == [[0, 1, 2], [3]]
+
+
+def test_cluster_lines_without_boxes():
+    assert cluster_lines(np.zeros((0, 4, 2))) == []
+
+
+def test_find_card_candidates_joins_groups():
+    ocr_result = card_line("4111111111111111", 0, 100) + [item("JOHN DOE", 0, 200)]
+    candidates = find_card_candidates(ocr_result)
+    assert [candidate.number for candidate in candidates] == ["4111111111111111"]
+    candidate = candidates[0]
+    assert candidate.box_indices == [0, 1, 2, 3]
+    assert [text for text, _ in candidate.groups] == ["4111", "1111", "1111", "1111"]
+    assert candidate.bbox[0] == [0.0, 100.0] and candidate.bbox[2] == [380.0, 120.0]
+
+
+def test_find_card_candidates_stops_at_other_text():
+    ocr_result = card_line("41111111", 0, 100) + [item("12/28", 200, 100)] + card_line("11111111", 300, 100)
+    assert find_card_candidates(ocr_result, gap_tolerance=20.0) == []
+
+
+def test_find_card_candidates_accepts_other_lengths():
+    ocr_result = [item("3782", 0, 0), item("822463", 100, 0, width=120), item("10005", 240, 0, width=100)]
+    assert find_card_candidates(ocr_result) == []
+    assert [candidate.number for candidate in find_card_candidates(ocr_result, lengths=(15, 16))] == ["378282246310005"]
+
+
+def test_find_card_candidates_weighs_confidence_by_digits():
+    ocr_result = [item("41111111", 0, 0, 0.5, width=160), item("1111", 180, 0, 1.0), item("1111", 280, 0, 1.0)]
+    candidates = find_card_candidates(ocr_result)
+    assert len(candidates) == 1
+    assert abs(candidates[0].confidence - 0.75) < 1e-9
+
+
+def test_find_card_candidates_ranks_and_deduplicates():
+    ocr_result = [*card_line("4111111111111111", 0, 0, 0.6), *card_line("5500000000000004", 0, 100, 0.9),
+                  *card_line("4111111111111111", 0, 200, 0.8)]
+    candidates = find_card_candidates(ocr_result)
+    assert [candidate.number for candidate in candidates] == ["5500000000000004", "4111111111111111"]
+    # The better read of the repeated number is kept
+    assert candidates[1].box_indices == [8, 9, 10, 11]
+
+
+def test_find_card_candidates_without_result():
+    assert find_card_candidates([]) == []
+
+
+def test_select_disjoint_keeps_one_candidate_per_box():
+    first = CardCandidate("4111111111111111", [], 0.9, box_indices=[0, 1, 2, 3])
+    overlapping = CardCandidate("1111111111111111", [], 0.8, box_indices=[1, 2, 3, 4])
+    separate = CardCandidate("5500000000000004", [], 0.7, box_indices=[5, 6, 7, 8])
+    assert select_disjoint([first, overlapping, separate]) == [first, separate]
@@ -0,0 +1,127 @@
+import pytest
+
+from services.postprocessing import (
+    CardNumberValidator, brand_length_valid, detect_brand, fits_layout, luhn_valid, match_layout, normalize_digits, repair,
+)
+
+
+def alternatives_for(number: str, position: int, options: list[tuple[str, float]], confidence: float = 0.95) -> list:
+    """Top-k candidates of a read: every digit read with `confidence`, except `position`"""
+    alternatives = [[(digit, confidence)] for digit in number]
+    alternatives[position] = options
+    return alternatives
+
+
+@pytest.mark.parametrize("number", ["4111111111111111", "5500000000000004", "378282246310005", "30569309025904", "4222222222222"])
+def test_luhn_valid(number):
+    assert luhn_valid(number)
+
+
+@pytest.mark.parametrize("number", ["4111111111111112", "5500000000000005", "378282246310006"])
+def test_luhn_rejects_single_digit_errors(number):
+    assert not luhn_valid(number)
+
+
+def test_normalize_digits_only_touches_mostly_digit_text():
+    assert normalize_digits("4111 l111 1O11 1111") == "4111 1111 1011 1111"
+    assert normalize_digits("VALID THRU") == "VALID THRU"
+
+
+@pytest.mark.parametrize("text, digits", [
+    ("4111 1111 1111 1111", "4111111111111111"),
+    ("4111-1111-1111-1111", "4111111111111111"),
+    ("4111111111111111", "4111111111111111"),
+    ("3782 822463 10005", "378282246310005"),
+    ("3056 930902 5904", "30569309025904"),
+    ("4111 1111 1111 1111 110", "4111111111111111110"),
+])
+def test_match_layout(text, digits):
+    assert match_layout(text) == digits
+
+
+@pytest.mark.parametrize("text", ["4111 1111 1111 111", "41111 111 1111 1111", "12/28", "4111 1111 1111 1111 1"])
+def test_match_layout_rejects_other_groupings(text):
+    assert match_layout(text) is None
+
+
+def test_fits_layout():
+    assert fits_layout([4, 4, 4, 4])
+    # Merged groups still split where the layout does
+    assert fits_layout([8, 4, 4])
+    assert fits_layout([4, 6, 5])
+    assert not fits_layout([3, 5, 4, 4])
+    assert not fits_layout([4, 4, 4])
+
+
+@pytest.mark.parametrize("number, brand", [
+    ("4111111111111111", "visa"),
+    ("5500000000000004", "mastercard"),
+    ("2221000000000009", "mastercard"),
+    ("378282246310005", "amex"),
+    ("30569309025904", "diners"),
+    ("6011111111111117", "discover"),
+    ("3530111333300000", "jcb"),
+    ("6200000000000005", "unionpay"),
+    ("9999999999999995", None),
+])
+def test_detect_brand(number, brand):
+    assert detect_brand(number) == brand
+
+
+def test_brand_length_valid():
+    assert brand_length_valid("378282246310005")
+    # A 16-digit number with an Amex prefix can't be a real card
+    assert not brand_length_valid("3782822463100055")
+    assert brand_length_valid("4222222222222")
+    assert not brand_length_valid("55000000000000047")
+
+
+def test_repair_fixes_the_least_confident_digit():
+    alternatives = alternatives_for("4111111111111171", 14, [("7", 0.5), ("1", 0.4), ("4", 0.05)])
+    assert repair("4111111111111171", alternatives) == "4111111111111111"
+
+
+def test_repair_leaves_other_digits_alone():
+    # The least confident digit has no alternative that passes the check, and no other digit may change
+    alternatives = alternatives_for("4111111111111171", 3, [("1", 0.5), ("7", 0.4)])
+    assert repair("4111111111111171", alternatives) is None
+
+
+def test_repair_needs_a_single_least_confident_digit():
+    alternatives = alternatives_for("4111111111111171", 14, [("7", 0.5), ("1", 0.4)])
+    alternatives[3] = [("1", 0.5), ("7", 0.4)]
+    assert repair("4111111111111171", alternatives) is None
+
+
+def test_repair_ignores_unlikely_alternatives():
+    alternatives = alternatives_for("4111111111111171", 14, [("7", 0.5), ("1", 0.01)])
+    assert repair("4111111111111171", alternatives) is None
+    assert repair("4111111111111171", alternatives, min_score=0.005) == "4111111111111111"
+
+
+def test_repair_needs_alternatives_for_every_digit():
+    assert repair("4111111111111171", []) is None
+    assert repair("4111111111111171", alternatives_for("411111111111117", 14, [("7", 0.5), ("1", 0.4)])) is None
+
+
+def test_validator_off_accepts_anything():
+    assert CardNumberValidator("off").check("4111111111111112") == "4111111111111112"
+
+
+def test_validator_reject_drops_invalid_numbers():
+    validator = CardNumberValidator("reject")
+    alternatives = alternatives_for("4111111111111171", 14, [("7", 0.5), ("1", 0.4)])
+    assert validator.check("4111111111111111") == "4111111111111111"
+    assert validator.check("4111111111111171", alternatives) is None
+    assert validator.check("3782822463100055") is None
+
+
+def test_validator_repair_needs_alternatives():
+    validator = CardNumberValidator("repair")
+    alternatives = alternatives_for("4111111111111171", 14, [("7", 0.5), ("1", 0.4)])
+    assert validator.check("4111111111111171") is None
+    assert validator.check("4111111111111171", alternatives) == "4111111111111111"
+
+
+def test_validator_defaults_to_reject():
+    assert CardNumberValidator().policy == "reject"